@@ -1,98 +1,404 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List
-from sqlalchemy.orm import Session
-from app.models.pydantic_models import Customer, CustomerCreate, VersionedResponse
-from app.repositories.customer_repository import CustomerRepository
-from app.database import get_db
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Literal, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.pydantic_models import (
+    Customer, CustomerCreate, CustomerPatch, VersionedResponse, BatchCreateResult, BatchItemResult, CustomerChangesPage,
+    CustomerBatchGet, BatchGetItem, BatchGetResult
+)
+from app.repositories.customer_repository import AsyncCustomerRepository, StaleVersionError, search_sort_key
+from app.repositories.cached_customer_repository import CachedCustomerRepository
+from app.database import get_db, get_read_db
+from app.core.config import settings
 from app.core.logging import logger
-from app.utils.telemetry import increment_customer_created, increment_customer_updated, increment_customer_deleted
-from opentelemetry import trace
+from app.utils.telemetry import (
+    StageTimedRoute, increment_customer_created, increment_customer_updated, increment_customer_deleted, route_span
+)
+from app.utils.pagination import encode_cursor, decode_cursor, encode_keyset_cursor, decode_keyset_cursor
+from app.utils.cache import get_customer_cache
+from app.utils.export import EXPORT_FORMATS
+from app.utils.responses import respond
+from app.utils.etags import format_etag, is_not_modified, list_etag, parse_if_match
+from app.utils.changes import change_notifier
 
-router = APIRouter()
-tracer = trace.get_tracer(__name__)
+router = APIRouter(route_class=StageTimedRoute)
 
-def get_repository(db: Session = Depends(get_db)):
-    return CustomerRepository(db)
+async def get_repository(
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    cache=Depends(get_customer_cache),
+    x_read_consistency: Optional[str] = Header(None),
+):
+    repo = AsyncCustomerRepository(db, read_db)
+    if cache is not None:
+        # A client asking for primary consistency must not be answered from a possibly stale
+        # cache entry, but its writes still have to invalidate
+        return CachedCustomerRepository(repo, cache, bypass_reads=x_read_consistency == "primary")
+    return repo
 
 @router.post("/customers", response_model=VersionedResponse[Customer], status_code=201)
 async def create_customer(
     customer: CustomerCreate,
-    repo: CustomerRepository = Depends(get_repository)
+    repo: AsyncCustomerRepository = Depends(get_repository)
 ):
-    with tracer.start_as_current_span("create_customer"):
+    with route_span("create_customer"):
         logger.info("Creating new customer", privacy_level="MEDIUM")
         try:
-            new_customer = repo.create(customer)
+            new_customer = await repo.create(customer)
             increment_customer_created()
             logger.info("Customer created successfully", privacy_level="LOW", customer_id=new_customer.id)
-            return VersionedResponse(data=new_customer)
+            return respond(VersionedResponse(data=new_customer), status_code=201)
+        except IntegrityError:
+            logger.warning("Customer email already in use", privacy_level="MEDIUM")
+            raise HTTPException(status_code=409, detail="Email already in use")
         except Exception as e:
             logger.error("Error creating customer", privacy_level="HIGH", error=str(e))
             raise HTTPException(status_code=500, detail="Error creating customer")
 
+def _parse_batch_body(body: bytes, content_type: str) -> list:
+    # Returns the raw items; NDJSON lines that are not valid JSON come back as JSONDecodeError
+    if "ndjson" in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(e)
+        return items
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array")
+    return items
+
+@router.post(
+    "/customers:batch",
+    response_model=VersionedResponse[BatchCreateResult],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/CustomerCreate"}}},
+                "application/x-ndjson": {"schema": {"type": "string", "description": "One CustomerCreate JSON object per line"}},
+            },
+        }
+    },
+)
+async def batch_create_customers(
+    request: Request,
+    upsert: bool = Query(False, description="Update existing customers with the same email instead of reporting a conflict"),
+    repo: AsyncCustomerRepository = Depends(get_repository)
+):
+    with route_span("batch_create_customers"):
+        try:
+            raw_items = _parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+        if len(raw_items) > settings.MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.MAX_BATCH_SIZE} items")
+        logger.info("Creating customers in batch", privacy_level="LOW", count=len(raw_items), upsert=upsert)
+
+        items: List[Optional[BatchItemResult]] = [None] * len(raw_items)
+        valid, valid_indexes = [], []
+        for index, raw_item in enumerate(raw_items):
+            if isinstance(raw_item, json.JSONDecodeError):
+                items[index] = BatchItemResult(index=index, status="invalid", errors=[{"type": "json_invalid", "msg": str(raw_item)}])
+                continue
+            try:
+                valid.append(CustomerCreate.model_validate(raw_item))
+                valid_indexes.append(index)
+            except ValidationError as e:
+                items[index] = BatchItemResult(index=index, status="invalid", errors=json.loads(e.json(include_url=False)))
+
+        try:
+            outcomes = await repo.bulk_create(valid, upsert=upsert, chunk_size=settings.BATCH_CHUNK_SIZE)
+        except Exception as e:
+            logger.error("Error creating customers in batch", privacy_level="HIGH", error=str(e))
+            raise HTTPException(status_code=500, detail="Error creating customers")
+        for index, (status, customer_id) in zip(valid_indexes, outcomes):
+            items[index] = BatchItemResult(index=index, status=status, id=customer_id)
+
+        counts = {status: 0 for status in ("created", "updated", "conflict", "invalid")}
+        for item in items:
+            counts[item.status] += 1
+        if counts["created"]:
+            increment_customer_created(counts["created"])
+        if counts["updated"]:
+            increment_customer_updated(counts["updated"])
+        logger.info("Batch create finished", privacy_level="LOW", **counts)
+        return respond(VersionedResponse(data=BatchCreateResult(
+            created=counts["created"],
+            updated=counts["updated"],
+            conflicts=counts["conflict"],
+            invalid=counts["invalid"],
+            items=items,
+        )))
+
+@router.post("/customers:batchGet", response_model=VersionedResponse[BatchGetResult])
+async def batch_get_customers(
+    lookup: CustomerBatchGet,
+    repo: AsyncCustomerRepository = Depends(get_repository)
+):
+    with route_span("batch_get_customers"):
+        if len(lookup.ids) + len(lookup.emails) > settings.MAX_BATCH_GET_SIZE:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.MAX_BATCH_GET_SIZE} lookups")
+        logger.info("Fetching customers in batch", privacy_level="LOW", ids=len(lookup.ids), emails=len(lookup.emails))
+        items = []
+        if lookup.ids:
+            customers = await repo.get_by_ids(lookup.ids, chunk_size=settings.BATCH_CHUNK_SIZE)
+            items.extend(
+                BatchGetItem(id=customer_id, status="found" if customer else "not_found", data=customer)
+                for customer_id, customer in zip(lookup.ids, customers)
+            )
+        if lookup.emails:
+            customers = await repo.get_by_emails(lookup.emails, chunk_size=settings.BATCH_CHUNK_SIZE)
+            items.extend(
+                BatchGetItem(email=email, status="found" if customer else "not_found", data=customer)
+                for email, customer in zip(lookup.emails, customers)
+            )
+        found = sum(item.data is not None for item in items)
+        return respond(VersionedResponse(data=BatchGetResult(found=found, not_found=len(items) - found, items=items)))
+
+def _respond_with_etag(customers: List[Customer], next_cursor: Optional[str], if_none_match: Optional[str], response: Response):
+    # The tag is computed from ids and versions, so a 304 skips serializing the page
+    etag = list_etag(customers, next_cursor)
+    if is_not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return respond(VersionedResponse(data=customers, next_cursor=next_cursor), response=response)
+
 @router.get("/customers", response_model=VersionedResponse[List[Customer]])
 async def get_all_customers(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1),
-    repo: CustomerRepository = Depends(get_repository)
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    repo: AsyncCustomerRepository = Depends(get_repository)
 ):
-    with tracer.start_as_current_span("get_all_customers"):
+    with route_span("get_all_customers"):
         logger.info("Fetching all customers", privacy_level="LOW")
-        customers = repo.get_all()
-        return VersionedResponse(data=customers)
+        after_id = None
+        if cursor is not None:
+            try:
+                after_id = decode_cursor(cursor)
+            except ValueError:
+                logger.warning("Invalid pagination cursor", privacy_level="LOW")
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            skip = 0
+        # Fetch one extra row to find out whether another page exists
+        customers = await repo.get_all(skip=skip, limit=limit + 1, after_id=after_id)
+        next_cursor = encode_cursor(customers[limit - 1].id) if len(customers) > limit else None
+        return _respond_with_etag(customers[:limit], next_cursor, if_none_match, response)
+
+@router.get("/customers/search", response_model=VersionedResponse[List[Customer]])
+async def search_customers(
+    response: Response,
+    family_name: Optional[str] = Query(None, min_length=1, max_length=50),
+    surname: Optional[str] = Query(None, min_length=1, max_length=50),
+    prefix_match: bool = Query(False, description="Match names starting with the given values instead of equal to them"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    repo: AsyncCustomerRepository = Depends(get_repository)
+):
+    with route_span("search_customers"):
+        if family_name is None and surname is None:
+            raise HTTPException(status_code=400, detail="family_name or surname is required")
+        logger.info("Searching customers", privacy_level="MEDIUM", family_name=family_name, surname=surname, prefix_match=prefix_match)
+        after = None
+        if cursor is not None:
+            try:
+                after = decode_keyset_cursor(cursor, 3)
+            except ValueError:
+                logger.warning("Invalid pagination cursor", privacy_level="LOW")
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        customers = await repo.search(
+            family_name=family_name, surname=surname, prefix_match=prefix_match, limit=limit + 1, after=after
+        )
+        next_cursor = None
+        if len(customers) > limit:
+            next_cursor = encode_keyset_cursor(search_sort_key(customers[limit - 1], by_family_name=family_name is not None))
+        return _respond_with_etag(customers[:limit], next_cursor, if_none_match, response)
+
+async def _wait_for_changes(repo, since: int, limit: int, wait: float):
+    # Long poll: re-check when a write commits in this worker, and at least every poll
+    # interval for writes made by other workers
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    changes = await repo.changes_since(since, limit)
+    while not changes and loop.time() < deadline:
+        await change_notifier.wait(min(deadline - loop.time(), settings.CHANGES_POLL_INTERVAL_SECONDS))
+        changes = await repo.changes_since(since, limit)
+    return changes
+
+async def _change_events(request: Request, repo, since: int, limit: int):
+    # Server-sent events: one event per change, with the seq as event id so a reconnecting
+    # client resumes from Last-Event-ID. A comment line keeps idle connections open.
+    while not await request.is_disconnected():
+        changes = await _wait_for_changes(repo, since, limit, settings.CHANGES_MAX_WAIT_SECONDS)
+        if not changes:
+            yield b": keep-alive\n\n"
+            continue
+        yield "".join(
+            f"id: {change.seq}\nevent: {change.operation}\ndata: {change.model_dump_json()}\n\n" for change in changes
+        ).encode()
+        since = changes[-1].seq
+
+@router.get(
+    "/customers/changes",
+    response_model=VersionedResponse[CustomerChangesPage],
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def get_customer_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Return changes after this seq (next_since of the previous page)"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    wait: float = Query(0, ge=0, le=settings.CHANGES_MAX_WAIT_SECONDS, description="Seconds to hold the request open when there are no changes yet"),
+    last_event_id: Optional[str] = Header(None),
+    repo: AsyncCustomerRepository = Depends(get_repository)
+):
+    with route_span("get_customer_changes"):
+        if "text/event-stream" in request.headers.get("accept", ""):
+            if last_event_id is not None and last_event_id.isdigit():
+                since = int(last_event_id)
+            logger.info("Streaming customer changes", privacy_level="LOW", since=since)
+            return StreamingResponse(
+                _change_events(request, repo, since, limit),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        logger.info("Fetching customer changes", privacy_level="LOW", since=since, wait=wait)
+        changes = await _wait_for_changes(repo, since, limit, wait)
+        next_since = changes[-1].seq if changes else since
+        return respond(VersionedResponse(data=CustomerChangesPage(changes=changes, next_since=next_since)))
+
+@router.get("/customers/export", response_class=StreamingResponse)
+async def export_customers(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    repo: AsyncCustomerRepository = Depends(get_repository)
+):
+    with route_span("export_customers"):
+        logger.info("Exporting customers", privacy_level="LOW", format=export_format)
+        serializer, media_type = EXPORT_FORMATS[export_format]
+        return StreamingResponse(
+            serializer(repo.stream_all(settings.EXPORT_CHUNK_SIZE)),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="customers.{export_format}"'},
+        )
 
 @router.get("/customers/{customer_id}", response_model=VersionedResponse[Customer])
 async def get_customer(
     customer_id: str,
-    repo: CustomerRepository = Depends(get_repository)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    repo: AsyncCustomerRepository = Depends(get_repository)
 ):
-    with tracer.start_as_current_span("get_customer"):
+    with route_span("get_customer"):
         logger.info("Fetching customer", privacy_level="MEDIUM", customer_id=customer_id)
-        customer = repo.get_by_id(customer_id)
+        if if_none_match is not None:
+            # Pollers usually hold the current version: answer from the version column alone
+            version = await repo.get_version(customer_id)
+            if version is not None and is_not_modified(if_none_match, format_etag(version)):
+                return Response(status_code=304, headers={"ETag": format_etag(version)})
+        customer = await repo.get_by_id(customer_id)
         if not customer:
             logger.warning("Customer not found", privacy_level="MEDIUM", customer_id=customer_id)
             raise HTTPException(status_code=404, detail="Customer not found")
-        return VersionedResponse(data=customer)
+        response.headers["ETag"] = format_etag(customer.version)
+        return respond(VersionedResponse(data=customer), response=response)
 
 @router.get("/customers/email/{email}", response_model=VersionedResponse[Customer])
 async def get_customer_by_email(
     email: str,
-    repo: CustomerRepository = Depends(get_repository)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    repo: AsyncCustomerRepository = Depends(get_repository)
 ):
-    with tracer.start_as_current_span("get_customer_by_email"):
+    with route_span("get_customer_by_email"):
         logger.info("Fetching customer by email", privacy_level="MEDIUM", email=email)
-        customer = repo.get_by_email(email)
+        customer = await repo.get_by_email(email)
         if not customer:
             logger.warning("Customer not found", privacy_level="MEDIUM", email=email)
             raise HTTPException(status_code=404, detail="Customer not found")
-        return VersionedResponse(data=customer)
+        etag = format_etag(customer.version)
+        if is_not_modified(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return respond(VersionedResponse(data=customer), response=response)
 
 @router.put("/customers/{customer_id}", response_model=VersionedResponse[Customer])
 async def update_customer(
     customer_id: str,
     customer_update: CustomerCreate,
-    repo: CustomerRepository = Depends(get_repository)
+    response: Response,
+    repo: AsyncCustomerRepository = Depends(get_repository)
 ):
-    with tracer.start_as_current_span("update_customer"):
+    with route_span("update_customer"):
         logger.info("Updating customer", privacy_level="MEDIUM", customer_id=customer_id)
-        updated_customer = repo.update(customer_id, customer_update)
+        try:
+            updated_customer = await repo.update(customer_id, customer_update)
+        except IntegrityError:
+            logger.warning("Customer email already in use", privacy_level="MEDIUM", customer_id=customer_id)
+            raise HTTPException(status_code=409, detail="Email already in use")
         if not updated_customer:
             logger.warning("Customer not found for update", privacy_level="MEDIUM", customer_id=customer_id)
             raise HTTPException(status_code=404, detail="Customer not found")
         increment_customer_updated()
         logger.info("Customer updated successfully", privacy_level="LOW", customer_id=customer_id)
-        return VersionedResponse(data=updated_customer)
+        response.headers["ETag"] = format_etag(updated_customer.version)
+        return respond(VersionedResponse(data=updated_customer), response=response)
+
+@router.patch("/customers/{customer_id}", response_model=VersionedResponse[Customer])
+async def patch_customer(
+    customer_id: str,
+    changes: CustomerPatch,
+    response: Response,
+    if_match: Optional[str] = Header(None, description="ETag of the version being modified; 412 if it is no longer current"),
+    repo: AsyncCustomerRepository = Depends(get_repository)
+):
+    with route_span("patch_customer"):
+        fields = changes.model_dump(exclude_unset=True)
+        logger.info("Patching customer", privacy_level="MEDIUM", customer_id=customer_id, fields=sorted(fields))
+        expected_versions = None
+        if if_match is not None:
+            try:
+                expected_versions = parse_if_match(if_match)
+            except ValueError:
+                raise HTTPException(status_code=412, detail="If-Match does not match the current version")
+        try:
+            patched = await repo.patch(customer_id, fields, expected_versions=expected_versions)
+        except StaleVersionError:
+            logger.warning("Customer version conflict", privacy_level="MEDIUM", customer_id=customer_id)
+            raise HTTPException(status_code=412, detail="Customer was modified by another request; fetch it and retry")
+        except IntegrityError:
+            logger.warning("Customer email already in use", privacy_level="MEDIUM", customer_id=customer_id)
+            raise HTTPException(status_code=409, detail="Email already in use")
+        if not patched:
+            if if_match is not None:
+                raise HTTPException(status_code=412, detail="If-Match does not match the current version")
+            logger.warning("Customer not found for patch", privacy_level="MEDIUM", customer_id=customer_id)
+            raise HTTPException(status_code=404, detail="Customer not found")
+        if fields:
+            increment_customer_updated()
+        response.headers["ETag"] = format_etag(patched.version)
+        return respond(VersionedResponse(data=patched), response=response)
 
 @router.delete("/customers/{customer_id}", response_model=VersionedResponse[dict])
 async def delete_customer(
     customer_id: str,
-    repo: CustomerRepository = Depends(get_repository)
+    repo: AsyncCustomerRepository = Depends(get_repository)
 ):
-    with tracer.start_as_current_span("delete_customer"):
+    with route_span("delete_customer"):
         logger.info("Deleting customer", privacy_level="MEDIUM", customer_id=customer_id)
-        if not repo.delete(customer_id):
+        if not await repo.delete(customer_id):
             logger.warning("Customer not found for deletion", privacy_level="MEDIUM", customer_id=customer_id)
             raise HTTPException(status_code=404, detail="Customer not found")
         increment_customer_deleted()
         logger.info("Customer deleted successfully", privacy_level="LOW", customer_id=customer_id)
-        return VersionedResponse(data={"message": "Customer deleted successfully"})
\ No newline at end of file
+        return respond(VersionedResponse(data={"message": "Customer deleted successfully"}))
\ No newline at end of file
@@ -1,9 +1,17 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError, jwt
+from jose.exceptions import JWTClaimsError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.utils.telemetry import observe_auth_latency
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
@@ -12,6 +20,12 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# HMAC key schedule computed once; each verification works on a copy
+_signing_key = hmac.new(SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+# sha256(token) -> (username, exp) for tokens that already passed verification
+_verified_tokens: "OrderedDict[bytes, tuple]" = OrderedDict()
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -19,17 +33,85 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _decode_jose(token: str) -> dict:
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def _decode_hmac(token: str) -> dict:
+    # Stdlib HS256 verification against the precomputed key. Checks alg, signature, exp, nbf and
+    # that sub is a string, as python-jose does; aud / iss / jti are not checked (our tokens have none)
+    try:
+        header_segment, payload_segment, signature_segment = token.split(".")
+        header = json.loads(_b64decode(header_segment))
+        if header.get("alg") != ALGORITHM:
+            raise JWTError("The specified alg value is not allowed")
+        mac = _signing_key.copy()
+        mac.update(f"{header_segment}.{payload_segment}".encode())
+        if not hmac.compare_digest(mac.digest(), _b64decode(signature_segment)):
+            raise JWTError("Signature verification failed")
+        payload = json.loads(_b64decode(payload_segment))
+        if not isinstance(payload, dict):
+            raise JWTError("Invalid payload")
+        now = time.time()
+        exp = payload.get("exp")
+        if exp is not None and exp <= now:
+            raise ExpiredSignatureError("Signature has expired")
+        nbf = payload.get("nbf")
+        if nbf is not None and nbf > now:
+            raise JWTClaimsError("The token is not yet valid (nbf)")
+        if "sub" in payload and not isinstance(payload["sub"], str):
+            raise JWTClaimsError("Subject must be a string.")
+        return payload
+    except (ValueError, TypeError, AttributeError) as e:
+        raise JWTError(str(e))
+
+_decode = _decode_hmac if settings.JWT_BACKEND == "hmac" else _decode_jose
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _remember_token(digest: bytes, username: str, exp):
+    if settings.AUTH_CACHE_MAX_ENTRIES <= 0 or not isinstance(exp, (int, float)):
+        return
+    _verified_tokens[digest] = (username, exp)
+    _verified_tokens.move_to_end(digest)
+    while len(_verified_tokens) > settings.AUTH_CACHE_MAX_ENTRIES:
+        _verified_tokens.popitem(last=False)
+
+async def verify_token(token: str = Depends(oauth2_scheme)):
+    started = time.perf_counter()
+    digest = _token_digest(token)
+    cached = _verified_tokens.get(digest)
+    if cached is not None:
+        username, exp = cached
+        if exp > time.time():
+            observe_auth_latency("cache_hit", time.perf_counter() - started)
+            return username
+        del _verified_tokens[digest]
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        return username
+        payload = _decode(token)
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        observe_auth_latency("rejected", time.perf_counter() - started)
+        raise _credentials_exception()
+    username: str = payload.get("sub")
+    if username is None:
+        observe_auth_latency("rejected", time.perf_counter() - started)
+        raise _credentials_exception()
+    _remember_token(digest, username, payload.get("exp"))
+    observe_auth_latency("verified", time.perf_counter() - started)
+    return username
+
+async def verify_admin(username: str = Depends(verify_token)):
+    if username not in settings.ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return username
@@ -1,5 +1,5 @@
-from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional, Tuple
 
 class Settings(BaseSettings):
     # Application settings
@@ -9,13 +9,126 @@ class Settings(BaseSettings):
 
     # Database settings
     DATABASE_URL: str = "sqlite:///./customer_service.db"
+    # Derived from DATABASE_URL (aiosqlite / asyncpg) when not set
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Read replicas (sync-style URLs, mapped like DATABASE_URL) for list, search and lookup
+    # queries, used round-robin. Writes, and reads after a write in the same request, use the primary.
+    DB_REPLICA_URLS: list[str] = []
+    # A replica whose read fails is skipped for this long; its reads fall back to the primary
+    DB_REPLICA_EJECT_SECONDS: float = 30.0
+
+    # Connection pool settings (ignored for in-memory SQLite)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds, -1 disables recycling
+    # Extra SELECT 1 round trip per checkout; pool_recycle already retires stale connections
+    DB_POOL_PRE_PING: bool = False
+
+    # SQLite tuning, applied to every new connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456  # 256MB
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # Customer read cache: "memory" (per process), "redis" (shared) or "none".
+    # With several workers or pods, use "redis" so writes invalidate every reader;
+    # python -m app.server turns "memory" into "none" when it starts more than one worker.
+    # Lookups use it only while reading the primary, so with DB_REPLICA_URLS set only requests that
+    # have written use it; "X-Read-Consistency: primary" lookups bypass it. Writes always invalidate.
+    # To invalidate the old email key, PUT / PATCH need the email the row had before the write: one
+    # UPDATE ... RETURNING on PostgreSQL; on SQLite a SELECT then the UPDATE, in one BEGIN IMMEDIATE
+    # transaction so no other writer gets in between.
+    CACHE_BACKEND: str = "memory"
+    CACHE_TTL_SECONDS: int = 30
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    # Connections per worker; concurrent cache calls beyond this wait for a free one
+    CACHE_REDIS_MAX_CONNECTIONS: int = 8
+
+    # Share one database query between concurrent lookups of the same id or email
+    COALESCE_LOOKUPS: bool = True
+
+    # Pagination settings
+    DEFAULT_PAGE_SIZE: int = 100
+    MAX_PAGE_SIZE: int = 500
+
+    # Fast read path: build customers from stored rows without re-running validators and
+    # return pre-encoded JSON instead of re-validating against response_model
+    FAST_RESPONSES: bool = False
+
+    # Batch endpoint settings
+    MAX_BATCH_SIZE: int = 50000
+    BATCH_CHUNK_SIZE: int = 500
+    # Ids plus emails accepted by /customers:batchGet; lookups run in BATCH_CHUNK_SIZE chunks
+    MAX_BATCH_GET_SIZE: int = 1000
+
+    # Change feed (/customers/changes): longest long-poll a client may ask for, and how often a
+    # waiting request re-checks the log for writes made by other workers
+    CHANGES_MAX_WAIT_SECONDS: float = 30.0
+    CHANGES_POLL_INTERVAL_SECONDS: float = 1.0
+    # PostgreSQL only: writers take one advisory lock from their change-log insert until commit, so
+    # seq order is commit order and a reader never skips a change that commits late. This serializes
+    # that tail of every customer write (the insert and the commit round trip) across the cluster.
+    # Turn it off to trade that for possible gaps in the feed (benchmarks.bench_write_concurrency).
+    CHANGES_SERIALIZE_WRITERS: bool = True
+
+    # Rows fetched per server-side cursor round trip in /customers/export
+    EXPORT_CHUNK_SIZE: int = 1000
+
+    # Production server (python -m app.server)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # Fixed worker count; when unset it is derived from the cgroup CPU quota
+    SERVER_WORKERS: Optional[int] = None
+    SERVER_WORKERS_PER_CPU: float = 1.0
+    SERVER_MAX_WORKERS: int = 16
+    # "auto" picks uvloop / httptools when installed, otherwise asyncio / h11
+    SERVER_LOOP: str = "auto"
+    SERVER_HTTP: str = "auto"
+    # Keep idle connections open longer than the load balancer does, so it never reuses a closed one
+    SERVER_KEEPALIVE_SECONDS: int = 65
+    SERVER_BACKLOG: int = 2048
+    # Time given to in-flight requests after SIGTERM before connections are closed
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+    # Shared metrics directory for multi-worker runs; a temporary one is created when unset
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None
+
+    # Metrics settings
+    # Per-stage histograms: database vs ORM-to-model conversion per repository method,
+    # and response encoding per route
+    METRICS_STAGE_TIMING: bool = True
+    METRICS_STAGE_BUCKETS: Tuple[float, ...] = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5
+    )
 
     # OpenTelemetry settings
     OTEL_SERVICE_NAME: str = "customer-service"
+    OTEL_TRACES_ENABLED: bool = True
     OTEL_EXPORTER_OTLP_ENDPOINT: str = "http://my-otel-collector-opentelemetry-collector:4317"
+    # Fraction of new traces to keep; requests with a sampled/unsampled parent follow the parent
+    OTEL_TRACES_SAMPLER_RATIO: float = 1.0
+    # Tail-style overrides: also keep traces that end in an error or take at least this long.
+    # Turning either on records every span and decides when the request's root span ends.
+    OTEL_TRACES_KEEP_ERRORS: bool = False
+    OTEL_TRACES_KEEP_SLOW_MS: Optional[float] = None
+    # BatchSpanProcessor queue and export batching
+    OTEL_BSP_MAX_QUEUE_SIZE: int = 2048
+    OTEL_BSP_MAX_EXPORT_BATCH_SIZE: int = 512
+    OTEL_BSP_SCHEDULE_DELAY_MS: float = 5000
+    OTEL_BSP_EXPORT_TIMEOUT_MS: float = 30000
+    # Span sources: per-route manual spans (nested inside the FastAPI server span), the ASGI
+    # "http receive"/"http send" spans, and one span per SQL statement
+    OTEL_MANUAL_SPANS: bool = True
+    OTEL_ASGI_INTERNAL_SPANS: bool = True
+    OTEL_INSTRUMENT_SQLALCHEMY: bool = True
 
     # Logging settings
     LOG_LEVEL: str = "INFO"
+    # Emit log records from a background QueueListener thread instead of the request path
+    LOG_ASYNC: bool = True
+    # "text" or "json" (one object per line with privacy_level, trace/span ids and masked fields)
+    LOG_FORMAT: str = "text"
 
     # Cors settings
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost", "http://localhost:8080", "https://localhost", "https://localhost:8080"]
@@ -23,13 +136,25 @@ class Settings(BaseSettings):
     # Security settings
     SECRET_KEY: str = "your-secret-key-here"  # In production, we have to use an actual key
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # "jose" (python-jose) or "hmac" (stdlib HS256 with a precomputed key)
+    JWT_BACKEND: str = "jose"
+    # Verified tokens remembered until their exp; 0 disables the cache
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    # Token subjects allowed on /admin routes; nobody by default
+    ADMIN_USERS: list[str] = []
+
+    # Profiling settings
+    # /admin/profile and the X-Profile request header; nothing is sampled until one is used
+    PROFILING_ENABLED: bool = True
+    PROFILE_MAX_SECONDS: float = 60
+    PROFILE_INTERVAL_MS: float = 5
+    # Per-request profiles kept in memory for /admin/profiles/{id}
+    PROFILE_KEEP_RECENT: int = 20
 
     # Optional: Cloud provider settings (for future use)
     CLOUD_PROVIDER: Optional[str] = None
     CLOUD_REGION: Optional[str] = None
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
 settings = Settings()
\ No newline at end of file
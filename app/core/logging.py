@@ -1,10 +1,26 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from app.core.config import settings
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from opentelemetry import trace
+from app.core.config import Settings, settings
 import re
 
-def setup_logging():
+# Mask email addresses
+EMAIL_PATTERN = re.compile(r'([\w\.-]+)@([\w\.-]+)')
+# Mask phone numbers (assuming a simple format like 1234567890, haven't included country codes)
+PHONE_PATTERN = re.compile(r'\b\d{10}\b')
+
+_listener = None
+_installed_handlers = []
+
+def setup_logging(config: Settings = settings):
+    # Idempotent: handlers from a previous call are removed before new ones are added
+    global _listener
+    stop_logging()
+
     # Create logs directory if it doesn't exist
     logs_dir = "logs"
     if not os.path.exists(logs_dir):
@@ -12,11 +28,15 @@ def setup_logging():
 
     # Set up root logger
     root_logger = logging.getLogger()
-    root_logger.setLevel(settings.LOG_LEVEL)
+    root_logger.setLevel(config.LOG_LEVEL)
 
     # Create formatters
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if config.LOG_FORMAT == "json":
+        file_formatter = JsonFormatter()
+        console_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        console_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
     # File Handler
     file_handler = RotatingFileHandler(
@@ -25,56 +45,144 @@ def setup_logging():
         backupCount=5
     )
     file_handler.setFormatter(file_formatter)
-    file_handler.setLevel(settings.LOG_LEVEL)
+    file_handler.setLevel(config.LOG_LEVEL)
 
     # Console Handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(console_formatter)
-    console_handler.setLevel(settings.LOG_LEVEL)
-
-    # Add handlers to root logger
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    console_handler.setLevel(config.LOG_LEVEL)
+
+    if config.LOG_ASYNC:
+        # Request coroutines only enqueue records; masking, formatting and I/O
+        # happen on the listener's background thread
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        caller_handlers = [DeferredQueueHandler(log_queue)]
+    else:
+        caller_handlers = [file_handler, console_handler]
+
+    for handler in caller_handlers:
+        if config.LOG_FORMAT == "json":
+            # The span is only current in the calling thread, so capture ids before queueing
+            handler.addFilter(TraceContextFilter())
+        # Add handlers to root logger
+        root_logger.addHandler(handler)
+        _installed_handlers.append(handler)
 
     return PrivacyAwareLogger(root_logger)
 
+def stop_logging():
+    # Detaches our handlers and flushes queued records; safe to call more than once
+    global _listener
+    root_logger = logging.getLogger()
+    while _installed_handlers:
+        handler = _installed_handlers.pop()
+        root_logger.removeHandler(handler)
+        handler.close()
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # QueueHandler.prepare() would render the message in the calling thread.
+        # Records are consumed in-process, so hand them over as they are.
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
 class PrivacyAwareLogger:
     def __init__(self, logger):
         self.logger = logger
 
     def info(self, message: str, privacy_level: str = "LOW", **kwargs):
-        self._log("INFO", message, privacy_level, **kwargs)
+        self._log(logging.INFO, message, privacy_level, kwargs)
 
     def warning(self, message: str, privacy_level: str = "LOW", **kwargs):
-        self._log("WARNING", message, privacy_level, **kwargs)
+        self._log(logging.WARNING, message, privacy_level, kwargs)
 
     def error(self, message: str, privacy_level: str = "LOW", **kwargs):
-        self._log("ERROR", message, privacy_level, **kwargs)
-
-    def _log(self, level: str, message: str, privacy_level: str, **kwargs):
-        masked_kwargs = {k: self._mask_sensitive_data(v) for k, v in kwargs.items()}
-        log_message = f"{message} [Privacy: {privacy_level}] {masked_kwargs}"
-        getattr(self.logger, level.lower())(log_message)
-
-
-    def _mask_sensitive_data(self, data):
-        if isinstance(data, str):
-            # Mask email addresses
-            data = re.sub(r'([\w\.-]+)@([\w\.-]+)', '****@****', data)
-
-            # Mask phone numbers (assuming a simple format like 1234567890, haven't included country codes)
-            data = re.sub(r'\b\d{10}\b', '*' * 10, data)
-
-
-        elif isinstance(data, dict):
-            # Recursively mask dictionary values
-            return {k: self._mask_sensitive_data(v) for k, v in data.items()}
-
-        elif isinstance(data, list):
-            # Recursively mask list items
-            return [self._mask_sensitive_data(item) for item in data]
-
-        return data
-
-# Create a global instance of PrivacyAwareLogger
-logger = setup_logging()
\ No newline at end of file
+        self._log(logging.ERROR, message, privacy_level, kwargs)
+
+    def _log(self, level: int, message: str, privacy_level: str, kwargs: dict):
+        # Disabled levels cost one integer comparison: no masking, no formatting
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, PrivacyMessage(message, privacy_level, kwargs))
+
+class PrivacyMessage:
+    # Masked and rendered on first use, i.e. by whichever handler emits the record
+    __slots__ = ("message", "privacy_level", "kwargs", "_masked", "_rendered")
+
+    def __init__(self, message: str, privacy_level: str, kwargs: dict):
+        self.message = message
+        self.privacy_level = privacy_level
+        self.kwargs = kwargs
+        self._masked = None
+        self._rendered = None
+
+    def masked_fields(self) -> dict:
+        if self._masked is None:
+            self._masked = {k: mask_sensitive_data(v) for k, v in self.kwargs.items()}
+        return self._masked
+
+    def __str__(self):
+        if self._rendered is None:
+            self._rendered = f"{self.message} [Privacy: {self.privacy_level}] {self.masked_fields()}"
+        return self._rendered
+
+class TraceContextFilter(logging.Filter):
+    def filter(self, record):
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, "032x")
+            record.span_id = format(span_context.span_id, "016x")
+        return True
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line; PrivacyMessage fields are emitted as data, not parsed back out of text
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, PrivacyMessage):
+            entry["message"] = record.msg.message
+            entry["privacy_level"] = record.msg.privacy_level
+            if record.msg.kwargs:
+                entry["fields"] = record.msg.masked_fields()
+        else:
+            entry["message"] = record.getMessage()
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = record.span_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def mask_sensitive_data(data):
+    if isinstance(data, str):
+        data = EMAIL_PATTERN.sub('****@****', data)
+        data = PHONE_PATTERN.sub('*' * 10, data)
+
+    elif isinstance(data, dict):
+        # Recursively mask dictionary values
+        return {k: mask_sensitive_data(v) for k, v in data.items()}
+
+    elif isinstance(data, list):
+        # Recursively mask list items
+        return [mask_sensitive_data(item) for item in data]
+
+    return data
+
+# Global PrivacyAwareLogger; handlers are installed by setup_logging() at application startup
+logger = PrivacyAwareLogger(logging.getLogger())
@@ -1,23 +1,159 @@
-from sqlalchemy import create_engine
+import itertools
+import time
+from typing import List, Optional
+from fastapi import Depends, Header
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.utils.telemetry import observe_pool_checkout, instrument_pool, increment_replica_ejection
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def async_database_url(url: str) -> str:
+    # Map the sync driver URL onto its asyncio driver: aiosqlite locally, asyncpg for Postgres
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    if url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url[len("postgres:"):]
+    return url
+
+
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+
+class InstrumentedQueuePool(QueuePool):
+    def connect(self):
+        with observe_pool_checkout(self.logging_name):
+            return super().connect()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def connect(self):
+        with observe_pool_checkout(self.logging_name):
+            return super().connect()
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.split("://", 1)[1] in ("", "/"))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+
+def _engine_options(url: str, poolclass, pool_name: str) -> dict:
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_logging_name": pool_name,
+    }
+    if not _is_memory_sqlite(url):
+        options.update(
+            poolclass=poolclass,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def create_db_engine(url: str, pool_name: str = "primary"):
+    options = _engine_options(url, InstrumentedQueuePool, pool_name)
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    db_engine = create_engine(url, **options)
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    instrument_pool(db_engine, pool_name)
+    return db_engine
+
+
+def create_async_db_engine(url: str, pool_name: str = "primary_async"):
+    db_engine = create_async_engine(url, **_engine_options(url, InstrumentedAsyncQueuePool, pool_name))
+    if _is_sqlite(url):
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    instrument_pool(db_engine.sync_engine, pool_name)
+    return db_engine
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_db_engine(SQLALCHEMY_ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class Replica:
+    def __init__(self, url: str, name: str):
+        self.name = name
+        self.engine = create_async_db_engine(async_database_url(url), pool_name=name)
+        # Sessions know their replica, so a failed read can eject it
+        self.sessionmaker = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False, info={"replica": self})
+        self.ejected_until = 0.0
+        self.pool = None
+
+
+class ReplicaPool:
+    # Round-robin over the replicas that are not ejected. An ejected replica gets another
+    # try once eject_seconds have passed; with none available, reads use the primary.
+    def __init__(self, replicas: List[Replica], eject_seconds: float, clock=time.monotonic):
+        self.replicas = replicas
+        for replica in replicas:
+            replica.pool = self
+        self.eject_seconds = eject_seconds
+        self._clock = clock
+        self._next = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        now = self._clock()
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._next) % len(self.replicas)]
+            if replica.ejected_until <= now:
+                return replica
+        return None
+
+    def eject(self, replica: Replica):
+        replica.ejected_until = self._clock() + self.eject_seconds
+        increment_replica_ejection(replica.name)
+
+
+read_replicas = ReplicaPool(
+    [Replica(url, f"replica{i}_async") for i, url in enumerate(settings.DB_REPLICA_URLS)],
+    settings.DB_REPLICA_EJECT_SECONDS,
+)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db(db=Depends(get_db), x_read_consistency: Optional[str] = Header(None)):
+    # A replica session for read-only queries. "X-Read-Consistency: primary" reads from the
+    # primary instead, for clients that need to see a write they just made.
+    replica = read_replicas.choose() if x_read_consistency != "primary" else None
+    if replica is None:
         yield db
-    finally:
-        db.close()
+        return
+    async with replica.sessionmaker() as read_db:
+        yield read_db
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from app.migrations import run_migrations
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
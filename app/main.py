@@ -1,28 +1,22 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import os
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from app.api import customers
-from app.core.config import settings
-from app.core.logging import logger
-from app.utils.telemetry import setup_telemetry
+from app.core import config
+from app.core.config import Settings
+from app.core.logging import logger, setup_logging, stop_logging
+from app.utils.telemetry import setup_telemetry, start_tracing, stop_tracing, release_metrics
 from app.database import init_db
-from app.core.auth import create_access_token, verify_token
+from app.core.auth import create_access_token, verify_admin, verify_token
+from app.utils.profiling import RequestProfileMiddleware, profile_worker, recent_profiles
 
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.PROJECT_VERSION,
-    description="A cloud-native customer service API"
-)
+router = APIRouter()
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(verify_admin)])
 
-# Initialize database
-init_db()
-
-# Setup telemetry
-setup_telemetry(app)
-
-# Include routers
-app.include_router(customers.router, prefix=settings.API_V1_STR, dependencies=[Depends(verify_token)])
-
-@app.post("/token")
+@router.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     logger.info("Login attempt", privacy_level="MEDIUM", username=form_data.username)
     # In a real application, you would verify the username and password against a database
@@ -37,24 +31,100 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     logger.info("Successful login", privacy_level="MEDIUM", username=form_data.username)
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/")
-async def root():
+@router.get("/")
+async def root(request: Request):
     logger.info("Root endpoint accessed", privacy_level="LOW")
     return {
         "message": "Welcome to the Customer Service API",
-        "version": settings.PROJECT_VERSION,
+        "version": request.app.version,
         "docs_url": "/docs"
     }
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     logger.info("Health check endpoint accessed", privacy_level="LOW")
     return {"status": "healthy"}
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting up Customer Service API", privacy_level="LOW")
+def _profile_response(sampler, profile_format: str, name: str):
+    if profile_format == "collapsed":
+        return PlainTextResponse(sampler.collapsed())
+    return JSONResponse(sampler.speedscope(name))
+
+@admin_router.get("/profile")
+async def profile_worker_stacks(
+    seconds: float = Query(10, gt=0, le=config.settings.PROFILE_MAX_SECONDS),
+    format: Literal["collapsed", "speedscope"] = "collapsed",
+    interval_ms: Optional[float] = Query(None, gt=0),
+):
+    # Samples every thread of the worker that serves this request, then returns the stacks
+    logger.info("Profiling worker", privacy_level="LOW", seconds=seconds)
+    interval = (interval_ms or config.settings.PROFILE_INTERVAL_MS) / 1000
+    sampler = await profile_worker(seconds, interval)
+    return _profile_response(sampler, format, f"worker {os.getpid()}")
+
+@admin_router.get("/profiles/{profile_id}")
+async def request_profile(profile_id: str, format: Literal["collapsed", "speedscope"] = "speedscope"):
+    # Profiles taken for requests sent with an X-Profile header, by their X-Profile-Id
+    entry = recent_profiles.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    name, sampler = entry
+    return _profile_response(sampler, format, name)
+
+# Settings create_app applies to the app it builds. Everything else (database engines and replicas,
+# the customer cache, auth, route limits, metrics, OTEL_MANUAL_SPANS) is read from
+# app.core.config.settings when the modules are imported.
+APP_SETTINGS = frozenset({
+    "PROJECT_NAME", "PROJECT_VERSION", "API_V1_STR", "PROFILING_ENABLED",
+    "LOG_LEVEL", "LOG_ASYNC", "LOG_FORMAT",
+    "OTEL_SERVICE_NAME", "OTEL_TRACES_ENABLED", "OTEL_EXPORTER_OTLP_ENDPOINT", "OTEL_TRACES_SAMPLER_RATIO",
+    "OTEL_TRACES_KEEP_ERRORS", "OTEL_TRACES_KEEP_SLOW_MS", "OTEL_BSP_MAX_QUEUE_SIZE", "OTEL_BSP_MAX_EXPORT_BATCH_SIZE",
+    "OTEL_BSP_SCHEDULE_DELAY_MS", "OTEL_BSP_EXPORT_TIMEOUT_MS", "OTEL_ASGI_INTERNAL_SPANS", "OTEL_INSTRUMENT_SQLALCHEMY",
+})
+
+def _unapplied_settings(settings: Settings) -> list:
+    current = config.settings.model_dump()
+    return sorted(name for name, value in settings.model_dump().items() if name not in APP_SETTINGS and value != current[name])
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    # Building the app has no I/O; logging, the database and tracing start in the lifespan handler
+    settings = settings or config.settings
+    unapplied = _unapplied_settings(settings)
+    if unapplied:
+        raise ValueError(
+            f"create_app() cannot apply {', '.join(unapplied)}; set them in the environment before importing app.main"
+        )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        setup_logging(settings)
+        init_db()
+        tracer_provider = start_tracing(settings)
+        logger.info("Starting up Customer Service API", privacy_level="LOW")
+        try:
+            yield
+        finally:
+            logger.info("Shutting down Customer Service API", privacy_level="LOW")
+            stop_tracing(tracer_provider)
+            release_metrics()
+            stop_logging()
+
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        version=settings.PROJECT_VERSION,
+        description="A cloud-native customer service API",
+        lifespan=lifespan,
+    )
+
+    # Setup telemetry
+    setup_telemetry(app, settings)
+
+    # Include routers
+    app.include_router(customers.router, prefix=settings.API_V1_STR, dependencies=[Depends(verify_token)])
+    app.include_router(router)
+    if settings.PROFILING_ENABLED:
+        app.include_router(admin_router)
+        app.add_middleware(RequestProfileMiddleware)
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    logger.info("Shutting down Customer Service API", privacy_level="LOW")
\ No newline at end of file
+app = create_app()
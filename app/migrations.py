@@ -0,0 +1,152 @@
+from sqlalchemy import MetaData, func, inspect, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import Session
+from app.core.logging import logger
+from app.models.database import CustomerModel, name_keys, normalize_email
+
+# Schema changes that create_all() cannot make on an existing table. Every step checks
+# the live schema first, so running them on each startup is safe. Workers start at the
+# same time and may race each other here; losing a race is not an error.
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _add_missing_columns(db_engine, table, columns):
+    existing = {column["name"] for column in inspect(db_engine).get_columns(table.name)}
+    for column in columns:
+        if column.name in existing:
+            continue
+        definition = CreateColumn(column).compile(dialect=db_engine.dialect)
+        try:
+            with db_engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+        except DBAPIError:
+            if column.name not in {c["name"] for c in inspect(db_engine).get_columns(table.name)}:
+                raise
+
+
+def _set_collation(db_engine, table, columns, collation: str):
+    # Columns added before their collation was declared keep the database default. PostgreSQL
+    # only; changing it rebuilds the indexes on the column.
+    if db_engine.dialect.name != "postgresql":
+        return
+    with db_engine.begin() as conn:
+        current = dict(conn.execute(
+            text(
+                "SELECT column_name, collation_name FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table"
+            ),
+            {"table": table.name},
+        ).all())
+        for column in columns:
+            if current.get(column.name) != collation:
+                definition = column.type.dialect_impl(db_engine.dialect).compile(dialect=db_engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE {definition}"))
+
+
+def _drop_invalid_index(conn, name: str):
+    # A CONCURRENTLY build that fails (e.g. on a duplicate) leaves an invalid index behind,
+    # which checkfirst would take for a finished one
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def _create_missing_indexes(db_engine, table, skip=()):
+    concurrently = db_engine.dialect.name == "postgresql"
+    if concurrently:
+        # Build without blocking writes to the table. CONCURRENTLY cannot run inside a
+        # transaction, and only the copies used here get it, not the ones create_all() uses.
+        table = table.to_metadata(MetaData())
+        for index in table.indexes:
+            index.dialect_kwargs["postgresql_concurrently"] = True
+    for index in table.indexes:
+        if index.name in skip:
+            continue
+        try:
+            if concurrently:
+                with db_engine.connect() as conn:
+                    conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+                    _drop_invalid_index(conn, index.name)
+                    index.create(bind=conn, checkfirst=True)
+            else:
+                with db_engine.begin() as conn:
+                    index.create(bind=conn, checkfirst=True)
+        except DBAPIError:
+            if index.name not in {i["name"] for i in inspect(db_engine).get_indexes(table.name)}:
+                raise
+
+
+def _backfill(db_engine, pending, columns, compute, batch_size: int) -> int:
+    # One short transaction per batch, so a large table never holds a long write lock. Batches
+    # walk the primary key, so each one starts where the last ended instead of re-scanning.
+    updated = 0
+    last_id = ""
+    with Session(db_engine) as session:
+        while True:
+            rows = session.execute(
+                select(CustomerModel.id, *columns)
+                .where(CustomerModel.id > last_id, pending.is_(None))
+                .order_by(CustomerModel.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            session.execute(update(CustomerModel), [{"id": row.id, **compute(row)} for row in rows])
+            session.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+
+
+def backfill_name_keys(db_engine, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    return _backfill(db_engine, CustomerModel.family_name_key, [CustomerModel.name], lambda row: name_keys(row.name), batch_size)
+
+
+def backfill_normalized_emails(db_engine, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    return _backfill(
+        db_engine, CustomerModel.email_normalized, [CustomerModel.email],
+        lambda row: {"email_normalized": normalize_email(row.email)}, batch_size,
+    )
+
+
+def count_duplicate_emails(db_engine) -> int:
+    duplicates = (
+        select(CustomerModel.email_normalized)
+        .group_by(CustomerModel.email_normalized)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    with db_engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(duplicates)).scalar()
+
+
+def run_migrations(db_engine, batch_size: int = BACKFILL_BATCH_SIZE):
+    table = CustomerModel.__table__
+    _add_missing_columns(db_engine, table, [table.c.family_name_key, table.c.surname_key, table.c.email_normalized, table.c.version])
+    # The search prefix range is only correct under code point order (see SEARCH_KEY_TYPE)
+    _set_collation(db_engine, table, [table.c.family_name_key, table.c.surname_key], "C")
+    backfill_name_keys(db_engine, batch_size)
+    backfill_normalized_emails(db_engine, batch_size)
+
+    skip = set()
+    duplicates = count_duplicate_emails(db_engine)
+    if duplicates:
+        # Rows that differ only in email case predate the index; they have to be merged by hand
+        logger.error(
+            "Customers share an email that differs only in case; not creating the unique email index",
+            privacy_level="LOW", duplicate_emails=duplicates,
+        )
+        skip.add("ix_customers_email_normalized")
+    _create_missing_indexes(db_engine, table, skip)
+
+
+if __name__ == "__main__":
+    # Run ahead of a deploy to keep large backfills out of worker startup
+    from app.database import engine
+    from app.core.logging import setup_logging
+    setup_logging()
+    run_migrations(engine)
@@ -1,2 +1,2 @@
-from .pydantic_models import Customer, CustomerCreate, CustomerName
-from .database import CustomerModel
\ No newline at end of file
+from .pydantic_models import Customer, CustomerCreate, CustomerName, CustomerPatch
+from .database import CustomerModel, CustomerChangeModel
\ No newline at end of file
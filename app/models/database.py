@@ -1,14 +1,55 @@
-from sqlalchemy import Column, String, JSON
+from sqlalchemy import Column, Integer, String, JSON, Index, text
 from app.database import Base
 import uuid
 
 def generate_uuid():
     return str(uuid.uuid4())
 
+def search_key(value: str) -> str:
+    return value.strip().casefold()
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def name_keys(name: dict) -> dict:
+    return {
+        "family_name_key": search_key(name.get("family_name") or ""),
+        "surname_key": search_key(name.get("surname") or ""),
+    }
+
+# Prefix searches scan [key, key + U+10FFFF), which holds every completion of key only under
+# code point order. SQLite's default BINARY collation is that order; PostgreSQL needs "C".
+SEARCH_KEY_TYPE = String().with_variant(String(collation="C"), "postgresql")
+
 class CustomerModel(Base):
     __tablename__ = "customers"
 
     id = Column(String, primary_key=True, default=generate_uuid)
     name = Column(JSON, nullable=False)
     email = Column(String, unique=True, nullable=False)
-    phone_number = Column(String, nullable=False)
\ No newline at end of file
+    # normalize_email(email): uniqueness and lookups ignore case, the stored email keeps it
+    email_normalized = Column(String, nullable=True)
+    phone_number = Column(String, nullable=False)
+    # Bumped by every write; clients send it back in If-Match to detect concurrent updates
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    # Case-folded copies of name fields for indexed search; written by the repository via name_keys()
+    family_name_key = Column(SEARCH_KEY_TYPE, nullable=True)
+    surname_key = Column(SEARCH_KEY_TYPE, nullable=True)
+
+    __table_args__ = (
+        Index("ix_customers_email_normalized", "email_normalized", unique=True),
+        Index("ix_customers_family_name_surname", "family_name_key", "surname_key", "id"),
+        Index("ix_customers_surname_family_name", "surname_key", "family_name_key", "id"),
+    )
+
+
+class CustomerChangeModel(Base):
+    # Append-only log of customer writes, one row per created, updated or deleted customer.
+    # Written in the same transaction as the write itself; seq only ever increases.
+    __tablename__ = "customer_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    customer_id = Column(String, nullable=False)
+    operation = Column(String, nullable=False)  # "create", "update" or "delete"
+    version = Column(Integer, nullable=True)  # None for deletes
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Generic, TypeVar
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
+from typing import Optional, Generic, TypeVar, List, Any
 
 T = TypeVar('T')
 
@@ -15,12 +15,76 @@ class CustomerCreate(BaseModel):
     email: EmailStr
     phone_number: str = Field(min_length=10)
 
+class CustomerPatch(BaseModel):
+    # Only the fields present in the request are written; name is replaced as a whole
+    name: Optional[CustomerName] = None
+    email: Optional[EmailStr] = None
+    phone_number: Optional[str] = Field(None, min_length=10)
+
+    @model_validator(mode="after")
+    def _no_nulls(self):
+        for field in self.model_fields_set:
+            if getattr(self, field) is None:
+                raise ValueError(f"{field} cannot be null")
+        return self
+
 class Customer(CustomerCreate):
     id: str
+    version: int = 1
+
+    model_config = ConfigDict(from_attributes=True)
 
-    class Config:
-        from_attributes = True
+    @classmethod
+    def construct_trusted(cls, id: str, name: dict, email: str, phone_number: str, version: int = 1) -> "Customer":
+        # For data that was validated when it was written: skips the validators,
+        # email validation in particular, which dominate read-path CPU
+        return cls.model_construct(
+            id=id, name=CustomerName.model_construct(**name), email=email, phone_number=phone_number, version=version
+        )
 
 class VersionedResponse(BaseModel, Generic[T]):
     api_version: str = "1.0"
-    data: T
\ No newline at end of file
+    data: T
+    next_cursor: Optional[str] = None
+
+class CustomerChange(BaseModel):
+    seq: int
+    customer_id: str
+    operation: str  # "create", "update" or "delete"
+    version: Optional[int] = None
+    # The customer as it is now, or None once it has been deleted
+    data: Optional[Customer] = None
+
+class CustomerChangesPage(BaseModel):
+    changes: List[CustomerChange]
+    # Pass back as ?since= to continue after the last change on this page
+    next_since: int
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: str  # "created", "updated", "conflict" or "invalid"
+    id: Optional[str] = None
+    errors: Optional[List[Any]] = None
+
+class BatchCreateResult(BaseModel):
+    created: int
+    updated: int
+    conflicts: int
+    invalid: int
+    items: List[BatchItemResult]
+
+class CustomerBatchGet(BaseModel):
+    ids: List[str] = []
+    emails: List[str] = []
+
+class BatchGetItem(BaseModel):
+    # One per requested id, then one per requested email, in request order
+    id: Optional[str] = None
+    email: Optional[str] = None
+    status: str  # "found" or "not_found"
+    data: Optional[Customer] = None
+
+class BatchGetResult(BaseModel):
+    found: int
+    not_found: int
+    items: List[BatchGetItem]
@@ -0,0 +1,174 @@
+import json
+from typing import AsyncIterator, List, Mapping, Optional, Sequence, Tuple
+from app.models.pydantic_models import Customer, CustomerChange, CustomerCreate
+from app.core.config import settings
+from app.models.database import normalize_email
+from app.repositories.customer_repository import AsyncCustomerRepository, StaleVersionError
+
+
+def _id_key(customer_id: str) -> str:
+    return f"customer:id:{customer_id}"
+
+
+def _email_key(email: str) -> str:
+    return f"customer:email:{normalize_email(email)}"
+
+
+def _from_cache(cached: str) -> Customer:
+    if settings.FAST_RESPONSES:
+        return Customer.construct_trusted(**json.loads(cached))
+    return Customer.model_validate_json(cached)
+
+
+class CachedCustomerRepository:
+    # Read-through cache for get_by_id / get_by_email. Entries hold the customer JSON
+    # and every write drops both the id key and the email key(s) of the affected row. Reads
+    # fill it with set_if_unchanged(), so a read that raced a write cannot bring the old row back.
+    # Lookups skip the cache while reads go to a replica: a lagging replica's row must not be
+    # stored, and without fills a cache read could never hit. With bypass_reads they skip it for
+    # the whole request. Writes always invalidate.
+    def __init__(self, repo: AsyncCustomerRepository, cache, bypass_reads: bool = False):
+        self.repo = repo
+        self.cache = cache
+        self.bypass_reads = bypass_reads
+
+    async def create(self, customer: CustomerCreate) -> Customer:
+        created = await self.repo.create(customer)
+        await self.cache.delete(_id_key(created.id), _email_key(created.email))
+        return created
+
+    async def bulk_create(self, customers: List[CustomerCreate], upsert: bool = False, chunk_size: int = 500) -> List[Tuple[str, Optional[str]]]:
+        results = await self.repo.bulk_create(customers, upsert=upsert, chunk_size=chunk_size)
+        keys = []
+        for customer, (status, customer_id) in zip(customers, results):
+            if status in ("created", "updated"):
+                keys.extend((_id_key(customer_id), _email_key(customer.email)))
+        if keys:
+            await self.cache.delete(*keys)
+        return results
+
+    async def get_all(self, skip: int = 0, limit: Optional[int] = None, after_id: Optional[str] = None) -> List[Customer]:
+        return await self.repo.get_all(skip=skip, limit=limit, after_id=after_id)
+
+    def stream_all(self, chunk_size: int = 1000) -> AsyncIterator[List[Mapping]]:
+        return self.repo.stream_all(chunk_size)
+
+    async def search(
+        self,
+        family_name: Optional[str] = None,
+        surname: Optional[str] = None,
+        prefix_match: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[str, str, str]] = None,
+    ) -> List[Customer]:
+        return await self.repo.search(family_name=family_name, surname=surname, prefix_match=prefix_match, limit=limit, after=after)
+
+    async def get_by_id(self, customer_id: str) -> Optional[Customer]:
+        if self._bypass():
+            return await self.repo.get_by_id(customer_id)
+        key = _id_key(customer_id)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return _from_cache(cached)
+        generation, = await self.cache.generations([key])
+        customer = await self.repo.get_by_id(customer_id)
+        if customer:
+            await self._store([(key, generation, customer)])
+        return customer
+
+    async def get_version(self, customer_id: str) -> Optional[int]:
+        if self._bypass():
+            return await self.repo.get_version(customer_id)
+        cached = await self.cache.get(_id_key(customer_id))
+        if cached is not None:
+            version = json.loads(cached).get("version")
+            if version is not None:
+                return version
+        return await self.repo.get_version(customer_id)
+
+    async def get_by_email(self, email: str) -> Optional[Customer]:
+        if self._bypass():
+            return await self.repo.get_by_email(email)
+        key = _email_key(email)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return _from_cache(cached)
+        generation, = await self.cache.generations([key])
+        customer = await self.repo.get_by_email(email)
+        if customer:
+            await self._store([(key, generation, customer)])
+        return customer
+
+    async def get_by_ids(self, customer_ids: Sequence[str], chunk_size: int = 500) -> List[Optional[Customer]]:
+        return await self._get_many(customer_ids, _id_key, self.repo.get_by_ids, chunk_size)
+
+    async def get_by_emails(self, emails: Sequence[str], chunk_size: int = 500) -> List[Optional[Customer]]:
+        return await self._get_many(emails, _email_key, self.repo.get_by_emails, chunk_size)
+
+    async def _get_many(self, keys: Sequence[str], cache_key, load, chunk_size: int) -> List[Optional[Customer]]:
+        # One multi-key cache read; only the misses go to the database, and are stored back in one write
+        if self._bypass():
+            return await load(list(keys), chunk_size=chunk_size)
+        cache_keys = [cache_key(key) for key in keys]
+        cached = await self.cache.get_many(cache_keys)
+        results = [None if value is None else _from_cache(value) for value in cached]
+        missing = {cache_key: key for key, cache_key, value in zip(keys, cache_keys, cached) if value is None}
+        if not missing:
+            return results
+        generations = dict(zip(missing, await self.cache.generations(list(missing))))
+        loaded = dict(zip(missing, await load(list(missing.values()), chunk_size=chunk_size)))
+        for index, key in enumerate(cache_keys):
+            if results[index] is None:
+                results[index] = loaded[key]
+        await self._store([(key, generations[key], customer) for key, customer in loaded.items() if customer is not None])
+        return results
+
+    async def update(self, customer_id: str, customer_update: CustomerCreate) -> Optional[Customer]:
+        # The write itself reports the row's previous email, so no read is needed to find its key
+        updated, old_email = await self.repo.update_with_previous_email(customer_id, customer_update)
+        keys = [_id_key(customer_id)]
+        if old_email:
+            keys.append(_email_key(old_email))
+        if updated and updated.email != old_email:
+            keys.append(_email_key(updated.email))
+        await self.cache.delete(*keys)
+        return updated
+
+    async def patch(self, customer_id: str, changes: dict, expected_versions: Optional[Sequence[int]] = None) -> Optional[Customer]:
+        try:
+            patched, old_email = await self.repo.patch_with_previous_email(customer_id, changes, expected_versions=expected_versions)
+        except StaleVersionError:
+            # Another writer got there first and dropped its keys; our id entry may be stale too
+            await self.cache.delete(_id_key(customer_id))
+            raise
+        keys = [_id_key(customer_id)]
+        if old_email:
+            keys.append(_email_key(old_email))
+        if patched and patched.email != old_email:
+            keys.append(_email_key(patched.email))
+        await self.cache.delete(*keys)
+        return patched
+
+    async def delete(self, customer_id: str) -> bool:
+        old_email = await self.repo.delete_returning_email(customer_id)
+        keys = [_id_key(customer_id)]
+        if old_email:
+            keys.append(_email_key(old_email))
+        await self.cache.delete(*keys)
+        return old_email is not None
+
+    async def changes_since(self, since: int, limit: int) -> List[CustomerChange]:
+        return await self.repo.changes_since(since, limit)
+
+    def _bypass(self) -> bool:
+        return self.bypass_reads or self.repo.read_db is not self.repo.db
+
+    async def _store(self, loaded: List[Tuple[str, object, Customer]]):
+        # (lookup key, its generation before the read, customer): every write that changes the
+        # row drops the lookup key, so a changed generation means the row may already be stale
+        entries = [
+            (key, generation, (_id_key(customer.id), _email_key(customer.email)), customer.model_dump_json())
+            for key, generation, customer in loaded
+        ]
+        if entries:
+            await self.cache.set_if_unchanged(entries)
@@ -1,45 +1,513 @@
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.models.database import CustomerModel
-from app.models.pydantic_models import Customer, CustomerCreate
-from typing import List, Optional
+from app.models.database import CustomerModel, CustomerChangeModel, generate_uuid, name_keys, normalize_email, search_key
+from app.models.pydantic_models import Customer, CustomerChange, CustomerCreate
+from app.core.config import settings
+from app.core.logging import logger
+from app.utils.changes import change_notifier
+from app.utils.singleflight import SingleFlight
+from app.utils.telemetry import repository_timer
+from typing import AsyncIterator, List, Mapping, Optional, Sequence, Tuple
+
+CUSTOMER_COLUMNS = (CustomerModel.id, CustomerModel.name, CustomerModel.email, CustomerModel.phone_number, CustomerModel.version)
+
+# Advisory lock key serializing change-log writers on PostgreSQL
+CHANGE_LOG_LOCK_ID = 0x63757374
+
+# Upper bound for a prefix range scan: sorts after every character a key can contain, given
+# the code point collation of the key columns (SEARCH_KEY_TYPE)
+PREFIX_RANGE_END = "\U0010ffff"
+
+class StaleVersionError(Exception):
+    # The row exists but its version is not one the caller expected
+    pass
+
+
+def to_customer(db_customer: CustomerModel) -> Customer:
+    if settings.FAST_RESPONSES:
+        return Customer.construct_trusted(
+            id=db_customer.id, name=db_customer.name, email=db_customer.email,
+            phone_number=db_customer.phone_number, version=db_customer.version,
+        )
+    return Customer.model_validate(db_customer)
+
+
+def _row_values(customer: CustomerCreate) -> dict:
+    values = customer.model_dump()
+    values.update(name_keys(values["name"]))
+    values["email_normalized"] = normalize_email(values["email"])
+    return values
+
+
+def _patch_values(changes: dict) -> dict:
+    values = dict(changes)
+    if "name" in values:
+        values.update(name_keys(values["name"]))
+    if "email" in values:
+        values["email_normalized"] = normalize_email(values["email"])
+    return values
+
+
+def search_sort_key(customer: Customer, by_family_name: bool) -> Tuple[str, str, str]:
+    # The position of a search result in CustomerRepository.search order, for keyset cursors
+    family_name, surname = search_key(customer.name.family_name), search_key(customer.name.surname)
+    if by_family_name:
+        return family_name, surname, customer.id
+    return surname, family_name, customer.id
+
 
 class CustomerRepository:
     def __init__(self, db: Session):
         self.db = db
 
     def create(self, customer: CustomerCreate) -> Customer:
-        db_customer = CustomerModel(**customer.dict())
-        self.db.add(db_customer)
-        self.db.commit()
-        self.db.refresh(db_customer)
-        return Customer.from_orm(db_customer)
+        with repository_timer("create") as timer:
+            db_customer = CustomerModel(id=generate_uuid(), **_row_values(customer))
+            self.db.add(db_customer)
+            self._record_changes([(db_customer.id, "create", 1)])
+            self.db.commit()
+            self.db.refresh(db_customer)
+            timer.convert()
+            return to_customer(db_customer)
+
+    def bulk_create(self, customers: List[CustomerCreate], upsert: bool = False, chunk_size: int = 500) -> List[Tuple[str, Optional[str]]]:
+        # One (status, id) pair per input: "created", "updated" (upsert on email) or "conflict".
+        # Repeats of an email within the batch (ignoring case) are conflicts with the id of the
+        # customer its first occurrence created, updated or conflicted with; each chunk is one transaction.
+        results: List[Optional[Tuple[str, Optional[str]]]] = [None] * len(customers)
+        first_by_email = {}
+        pending, repeats = [], []
+        for index, customer in enumerate(customers):
+            email = normalize_email(customer.email)
+            if email in first_by_email:
+                repeats.append((index, first_by_email[email]))
+            else:
+                first_by_email[email] = index
+                pending.append(index)
+        with repository_timer("bulk_create"):
+            for start in range(0, len(pending), chunk_size):
+                self._bulk_create_chunk(customers, pending[start:start + chunk_size], upsert, results)
+        for index, first in repeats:
+            results[index] = ("conflict", results[first][1])
+        return results
+
+    def _bulk_create_chunk(self, customers, indexes, upsert, results):
+        for attempt in range(2):
+            try:
+                emails = [normalize_email(customers[i].email) for i in indexes]
+                existing = {
+                    row.email_normalized: row for row in self.db.execute(
+                        select(CustomerModel.email_normalized, CustomerModel.id, CustomerModel.version)
+                        .where(CustomerModel.email_normalized.in_(emails))
+                    )
+                }
+                inserts, updates = [], []
+                for i in indexes:
+                    values = _row_values(customers[i])
+                    row = existing.get(values["email_normalized"])
+                    if row is None:
+                        values["id"] = generate_uuid()
+                        inserts.append(values)
+                        results[i] = ("created", values["id"])
+                    elif upsert:
+                        values.update(id=row.id, version=row.version + 1)
+                        updates.append(values)
+                        results[i] = ("updated", row.id)
+                    else:
+                        results[i] = ("conflict", row.id)
+                if inserts:
+                    self.db.execute(insert(CustomerModel), inserts)
+                if updates:
+                    self.db.execute(update(CustomerModel), updates)
+                self._record_changes(
+                    [(values["id"], "create", 1) for values in inserts]
+                    + [(values["id"], "update", values["version"]) for values in updates]
+                )
+                self.db.commit()
+                return
+            except IntegrityError:
+                # A concurrent writer inserted one of our emails; re-read and retry once
+                self.db.rollback()
+                if attempt:
+                    raise
 
-    def get_all(self) -> List[Customer]:
-        customers = self.db.query(CustomerModel).all()
-        return [Customer.from_orm(c) for c in customers]
+    def get_all(self, skip: int = 0, limit: Optional[int] = None, after_id: Optional[str] = None) -> List[Customer]:
+        # Ordered by primary key so that both OFFSET and keyset pages are stable
+        query = self.db.query(CustomerModel).order_by(CustomerModel.id)
+        if after_id is not None:
+            query = query.filter(CustomerModel.id > after_id)
+        if skip:
+            query = query.offset(skip)
+        if limit is not None:
+            query = query.limit(limit)
+        with repository_timer("get_all") as timer:
+            rows = query.all()
+            timer.convert()
+            return [to_customer(c) for c in rows]
+
+    def search(
+        self,
+        family_name: Optional[str] = None,
+        surname: Optional[str] = None,
+        prefix_match: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[str, str, str]] = None,
+    ) -> List[Customer]:
+        # Served from the (family_name_key, surname_key, id) index, or the (surname_key, ...)
+        # one when only a surname is given. Prefix matches are range scans on the same index.
+        query = self.db.query(CustomerModel)
+        for column, value in ((CustomerModel.family_name_key, family_name), (CustomerModel.surname_key, surname)):
+            if value is None:
+                continue
+            key = search_key(value)
+            if prefix_match:
+                query = query.filter(column >= key, column < key + PREFIX_RANGE_END)
+            else:
+                query = query.filter(column == key)
+        if family_name is not None:
+            order = (CustomerModel.family_name_key, CustomerModel.surname_key, CustomerModel.id)
+        else:
+            order = (CustomerModel.surname_key, CustomerModel.family_name_key, CustomerModel.id)
+        if after is not None:
+            query = query.filter(tuple_(*order) > tuple_(*after))
+        query = query.order_by(*order)
+        if limit is not None:
+            query = query.limit(limit)
+        with repository_timer("search") as timer:
+            rows = query.all()
+            timer.convert()
+            return [to_customer(c) for c in rows]
 
     def get_by_id(self, customer_id: str) -> Optional[Customer]:
-        customer = self.db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
-        return Customer.from_orm(customer) if customer else None
+        with repository_timer("get_by_id") as timer:
+            customer = self.db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
+            timer.convert()
+            return to_customer(customer) if customer else None
+
+    def get_version(self, customer_id: str) -> Optional[int]:
+        # For conditional GETs: reads one integer column, no JSON decoding or model building
+        with repository_timer("get_version"):
+            return self.db.execute(select(CustomerModel.version).where(CustomerModel.id == customer_id)).scalar()
 
     def get_by_email(self, email: str) -> Optional[Customer]:
-        customer = self.db.query(CustomerModel).filter(CustomerModel.email == email).first()
-        return Customer.from_orm(customer) if customer else None
+        with repository_timer("get_by_email") as timer:
+            customer = self.db.query(CustomerModel).filter(CustomerModel.email_normalized == normalize_email(email)).first()
+            timer.convert()
+            return to_customer(customer) if customer else None
+
+    def get_by_ids(self, customer_ids: Sequence[str], chunk_size: int = 500) -> List[Optional[Customer]]:
+        # In input order, None where no customer has the id
+        with repository_timer("get_by_ids") as timer:
+            rows = self._get_many(CustomerModel.id, list(dict.fromkeys(customer_ids)), chunk_size)
+            timer.convert()
+            found = {row.id: to_customer(row) for row in rows}
+        return [found.get(customer_id) for customer_id in customer_ids]
+
+    def get_by_emails(self, emails: Sequence[str], chunk_size: int = 500) -> List[Optional[Customer]]:
+        normalized = [normalize_email(email) for email in emails]
+        with repository_timer("get_by_emails") as timer:
+            rows = self._get_many(CustomerModel.email_normalized, list(dict.fromkeys(normalized)), chunk_size)
+            timer.convert()
+            found = {row.email_normalized: to_customer(row) for row in rows}
+        return [found.get(email) for email in normalized]
+
+    def _get_many(self, column, keys: List[str], chunk_size: int) -> List[CustomerModel]:
+        # One IN (...) query per chunk keeps the bound parameters under the backend's limit
+        # (999 on SQLite builds before 3.32, 32767 after; 65535 on Postgres)
+        rows = []
+        for start in range(0, len(keys), chunk_size):
+            rows.extend(self.db.query(CustomerModel).filter(column.in_(keys[start:start + chunk_size])).all())
+        return rows
 
     def update(self, customer_id: str, customer_update: CustomerCreate) -> Optional[Customer]:
-        db_customer = self.db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
-        if not db_customer:
-            return None
-        for key, value in customer_update.dict().items():
-            setattr(db_customer, key, value)
-        self.db.commit()
-        self.db.refresh(db_customer)
-        return Customer.from_orm(db_customer)
+        return self._update("update", customer_id, _row_values(customer_update))[0]
+
+    def update_with_previous_email(self, customer_id: str, customer_update: CustomerCreate) -> Tuple[Optional[Customer], Optional[str]]:
+        # Also returns the email the row had before this write, for cache invalidation
+        return self._update("update", customer_id, _row_values(customer_update), with_previous_email=True)
+
+    def patch(self, customer_id: str, changes: dict, expected_versions: Optional[Sequence[int]] = None) -> Optional[Customer]:
+        return self._patch(customer_id, changes, expected_versions)[0]
+
+    def patch_with_previous_email(
+        self, customer_id: str, changes: dict, expected_versions: Optional[Sequence[int]] = None
+    ) -> Tuple[Optional[Customer], Optional[str]]:
+        return self._patch(customer_id, changes, expected_versions, with_previous_email=True)
+
+    def _patch(self, customer_id: str, changes: dict, expected_versions: Optional[Sequence[int]], with_previous_email: bool = False):
+        # Writes only the given columns. With expected_versions, the row is updated only if its
+        # version is one of them, and StaleVersionError is raised when it is not.
+        if not changes:
+            customer = self.get_by_id(customer_id)
+            if customer and expected_versions is not None and customer.version not in expected_versions:
+                raise StaleVersionError(customer_id)
+            return customer, customer.email if customer else None
+        return self._update("patch", customer_id, _patch_values(changes), expected_versions, with_previous_email)
+
+    def _update(
+        self, method: str, customer_id: str, values: dict,
+        expected_versions: Optional[Sequence[int]] = None, with_previous_email: bool = False,
+    ) -> Tuple[Optional[Customer], Optional[str]]:
+        with repository_timer(method) as timer:
+            row, previous_email = self._update_returning(customer_id, values, expected_versions, with_previous_email)
+            if row is None:
+                self.db.rollback()
+                if expected_versions is not None and self.get_by_id(customer_id):
+                    raise StaleVersionError(customer_id)
+                return None, None
+            self._record_changes([(row.id, "update", row.version)])
+            self.db.commit()
+            timer.convert()
+            return to_customer(row), previous_email
+
+    def _update_returning(
+        self, customer_id: str, values: dict, expected_versions: Optional[Sequence[int]] = None, with_previous_email: bool = False,
+    ):
+        # One round trip with UPDATE ... RETURNING; backends without it re-read the row.
+        # Returns the row and, with with_previous_email, the email it had before the update.
+        statement = (
+            update(CustomerModel)
+            .where(CustomerModel.id == customer_id)
+            .values(**values, version=CustomerModel.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if expected_versions is not None:
+            statement = statement.where(CustomerModel.version.in_(expected_versions))
+        dialect = self.db.get_bind().dialect
+        previous_email = None
+        if with_previous_email:
+            if dialect.name == "postgresql":
+                # Subqueries in RETURNING read the statement's snapshot: the row before the update
+                previous = CustomerModel.__table__.alias("previous")
+                previous_column = select(previous.c.email).where(previous.c.id == customer_id).scalar_subquery()
+                row = self.db.execute(statement.returning(*CUSTOMER_COLUMNS, previous_column.label("previous_email"))).first()
+                return row, row.previous_email if row is not None else None
+            # Elsewhere (SQLite) RETURNING subqueries see the updated row, so read the email first
+            previous_email = self._email_for_update(customer_id)
+            if previous_email is None:
+                return None, None
+        if dialect.update_returning:
+            return self.db.execute(statement.returning(*CUSTOMER_COLUMNS)).first(), previous_email
+        if self.db.execute(statement).rowcount == 0:
+            return None, None
+        return self.db.execute(select(*CUSTOMER_COLUMNS).where(CustomerModel.id == customer_id)).first(), previous_email
+
+    def _email_for_update(self, customer_id: str) -> Optional[str]:
+        # Reads the email under the write lock, so no other writer can change it before this
+        # transaction's UPDATE / DELETE. The read and the write stay two statements.
+        statement = select(CustomerModel.email).where(CustomerModel.id == customer_id)
+        if self.db.get_bind().dialect.name == "sqlite":
+            # The sqlite3 driver only opens a transaction at the first write; open it now instead,
+            # taking the database write lock before the SELECT
+            self.db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            statement = statement.with_for_update()
+        return self.db.execute(statement).scalar()
 
     def delete(self, customer_id: str) -> bool:
-        db_customer = self.db.query(CustomerModel).filter(CustomerModel.id == customer_id).first()
-        if db_customer:
-            self.db.delete(db_customer)
+        with repository_timer("delete"):
+            result = self.db.execute(
+                delete(CustomerModel).where(CustomerModel.id == customer_id).execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                self.db.rollback()
+                return False
+            self._record_changes([(customer_id, "delete", None)])
             self.db.commit()
             return True
-        return False
\ No newline at end of file
+
+    def delete_returning_email(self, customer_id: str) -> Optional[str]:
+        # delete() that returns the deleted row's email, or None when there was no such row
+        with repository_timer("delete"):
+            statement = delete(CustomerModel).where(CustomerModel.id == customer_id).execution_options(synchronize_session=False)
+            if self.db.get_bind().dialect.delete_returning:
+                email = self.db.execute(statement.returning(CustomerModel.email)).scalar()
+            else:
+                email = self._email_for_update(customer_id)
+                if email is not None and self.db.execute(statement).rowcount == 0:
+                    email = None
+            if email is None:
+                self.db.rollback()
+                return None
+            self._record_changes([(customer_id, "delete", None)])
+            self.db.commit()
+            return email
+
+    def _record_changes(self, changes: List[Tuple[str, str, Optional[int]]]):
+        # Part of the caller's transaction: the change is visible exactly when the write is
+        if changes:
+            if settings.CHANGES_SERIALIZE_WRITERS and self.db.get_bind().dialect.name == "postgresql":
+                # seq values are drawn before commit, so two writers can commit out of order and a
+                # reader past the later seq would never see the earlier one. Holding this lock until
+                # commit makes seq order commit order. SQLite already allows one writer at a time.
+                self.db.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK_ID)))
+            self.db.execute(insert(CustomerChangeModel), [
+                {"customer_id": customer_id, "operation": operation, "version": version}
+                for customer_id, operation, version in changes
+            ])
+
+    def changes_since(self, since: int, limit: int) -> List[CustomerChange]:
+        # Range scan on the seq primary key, joined to the current rows by id: the cost follows
+        # the number of changes returned, not the table size
+        query = (
+            select(CustomerChangeModel, CustomerModel)
+            .outerjoin(CustomerModel, CustomerModel.id == CustomerChangeModel.customer_id)
+            .where(CustomerChangeModel.seq > since)
+            .order_by(CustomerChangeModel.seq)
+            .limit(limit)
+        )
+        with repository_timer("changes_since") as timer:
+            rows = self.db.execute(query).all()
+            # End the read transaction, so a caller polling on this session sees later commits
+            self.db.commit()
+            timer.convert()
+            return [
+                CustomerChange(
+                    seq=change.seq,
+                    customer_id=change.customer_id,
+                    operation=change.operation,
+                    version=change.version,
+                    data=to_customer(customer) if customer is not None else None,
+                )
+                for change, customer in rows
+            ]
+
+
+# Shared by all requests in this process
+lookups_by_id = SingleFlight("id")
+lookups_by_email = SingleFlight("email")
+
+
+class AsyncCustomerRepository:
+    # Runs the CustomerRepository queries through AsyncSession.run_sync, so every
+    # round trip is awaited on the async driver instead of blocking the event loop.
+    # Reads go to read_db (a replica session, when replicas are configured) until this
+    # repository writes; after that they use the primary, so a request sees its own writes.
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None):
+        self.db = db
+        self.read_db = read_db or db
+
+    async def _run(self, method: str, *args, session: Optional[AsyncSession] = None, **kwargs):
+        session = session or self.db
+        return await session.run_sync(lambda sync_session: getattr(CustomerRepository(sync_session), method)(*args, **kwargs))
+
+    async def _read(self, method: str, *args, **kwargs):
+        if self.read_db is self.db:
+            return await self._run(method, *args, **kwargs)
+        try:
+            return await self._run(method, *args, session=self.read_db, **kwargs)
+        except (OperationalError, InterfaceError) as e:
+            self._eject_replica(e)
+            return await self._run(method, *args, **kwargs)
+
+    def _eject_replica(self, error: Exception):
+        replica = self.read_db.info["replica"]
+        logger.warning("Read replica failed, reading from the primary", privacy_level="LOW", replica=replica.name, error=str(error))
+        replica.pool.eject(replica)
+        self.read_db = self.db
+
+    def _lookup_key(self, key: str):
+        # Replica and primary reads of the same key are not interchangeable
+        return key if self.read_db is self.db else ("replica", key)
+
+    def use_primary(self):
+        self.read_db = self.db
+
+    async def _write(self, method: str, *args, **kwargs):
+        self.use_primary()
+        try:
+            return await self._run(method, *args, **kwargs)
+        finally:
+            # Lookups issued after this write must not join a query that started before it
+            lookups_by_id.forget()
+            lookups_by_email.forget()
+            # Wake change-feed readers in this process once the write has committed
+            change_notifier.notify()
+
+    async def create(self, customer: CustomerCreate) -> Customer:
+        return await self._write("create", customer)
+
+    async def bulk_create(self, customers: List[CustomerCreate], upsert: bool = False, chunk_size: int = 500) -> List[Tuple[str, Optional[str]]]:
+        return await self._write("bulk_create", customers, upsert=upsert, chunk_size=chunk_size)
+
+    async def get_all(self, skip: int = 0, limit: Optional[int] = None, after_id: Optional[str] = None) -> List[Customer]:
+        return await self._read("get_all", skip=skip, limit=limit, after_id=after_id)
+
+    async def stream_all(self, chunk_size: int = 1000) -> AsyncIterator[List[Mapping]]:
+        # Server-side cursor: yields partitions of at most chunk_size plain row mappings,
+        # so memory stays bounded by the chunk size rather than the table size.
+        # A replica that fails is ejected as in _read, and the primary carries on after the
+        # last id already yielded, so no row is repeated or skipped.
+        after = None
+        if self.read_db is not self.db:
+            try:
+                async for partition in self._stream(self.read_db, chunk_size):
+                    after = partition[-1]["id"]
+                    yield partition
+                return
+            except (OperationalError, InterfaceError) as e:
+                self._eject_replica(e)
+        async for partition in self._stream(self.db, chunk_size, after):
+            yield partition
+
+    async def _stream(self, session: AsyncSession, chunk_size: int, after: Optional[str] = None) -> AsyncIterator[List[Mapping]]:
+        statement = select(*CUSTOMER_COLUMNS).order_by(CustomerModel.id).execution_options(yield_per=chunk_size)
+        if after is not None:
+            statement = statement.where(CustomerModel.id > after)
+        result = await session.stream(statement)
+        async for partition in result.mappings().partitions():
+            yield partition
+
+    async def search(
+        self,
+        family_name: Optional[str] = None,
+        surname: Optional[str] = None,
+        prefix_match: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[str, str, str]] = None,
+    ) -> List[Customer]:
+        return await self._read("search", family_name=family_name, surname=surname, prefix_match=prefix_match, limit=limit, after=after)
+
+    async def get_by_id(self, customer_id: str) -> Optional[Customer]:
+        if settings.COALESCE_LOOKUPS:
+            return await lookups_by_id.do(self._lookup_key(customer_id), lambda: self._read("get_by_id", customer_id))
+        return await self._read("get_by_id", customer_id)
+
+    async def get_version(self, customer_id: str) -> Optional[int]:
+        return await self._read("get_version", customer_id)
+
+    async def get_by_email(self, email: str) -> Optional[Customer]:
+        if settings.COALESCE_LOOKUPS:
+            return await lookups_by_email.do(self._lookup_key(normalize_email(email)), lambda: self._read("get_by_email", email))
+        return await self._read("get_by_email", email)
+
+    async def get_by_ids(self, customer_ids: Sequence[str], chunk_size: int = 500) -> List[Optional[Customer]]:
+        return await self._read("get_by_ids", customer_ids, chunk_size=chunk_size)
+
+    async def get_by_emails(self, emails: Sequence[str], chunk_size: int = 500) -> List[Optional[Customer]]:
+        return await self._read("get_by_emails", emails, chunk_size=chunk_size)
+
+    async def update(self, customer_id: str, customer_update: CustomerCreate) -> Optional[Customer]:
+        return await self._write("update", customer_id, customer_update)
+
+    async def patch(self, customer_id: str, changes: dict, expected_versions: Optional[Sequence[int]] = None) -> Optional[Customer]:
+        return await self._write("patch", customer_id, changes, expected_versions=expected_versions)
+
+    async def update_with_previous_email(self, customer_id: str, customer_update: CustomerCreate) -> Tuple[Optional[Customer], Optional[str]]:
+        return await self._write("update_with_previous_email", customer_id, customer_update)
+
+    async def patch_with_previous_email(
+        self, customer_id: str, changes: dict, expected_versions: Optional[Sequence[int]] = None
+    ) -> Tuple[Optional[Customer], Optional[str]]:
+        return await self._write("patch_with_previous_email", customer_id, changes, expected_versions=expected_versions)
+
+    async def delete(self, customer_id: str) -> bool:
+        return await self._write("delete", customer_id)
+
+    async def delete_returning_email(self, customer_id: str) -> Optional[str]:
+        return await self._write("delete_returning_email", customer_id)
+
+    async def changes_since(self, since: int, limit: int) -> List[CustomerChange]:
+        return await self._run("changes_since", since, limit)
@@ -0,0 +1,138 @@
+import argparse
+import glob
+import math
+import os
+import sys
+import tempfile
+from importlib.util import find_spec
+from typing import Optional
+import uvicorn
+from app.core.config import Settings, settings
+
+# Nothing here may import prometheus_client: workers only pick up multiprocess mode
+# if PROMETHEUS_MULTIPROC_DIR is set before the first import.
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def cpu_limit(cgroup_root: str = CGROUP_ROOT) -> float:
+    if hasattr(os, "sched_getaffinity"):
+        available = float(len(os.sched_getaffinity(0)))
+    else:
+        available = float(os.cpu_count() or 1)
+
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        quota, period = _read(os.path.join(cgroup_root, "cpu.max")).split()
+        if quota != "max":
+            return min(available, int(quota) / int(period))
+        return available
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1: quota is -1 when unlimited
+    try:
+        quota = int(_read(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us")))
+        period = int(_read(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us")))
+        if quota > 0 and period > 0:
+            return min(available, quota / period)
+    except (OSError, ValueError):
+        pass
+    return available
+
+
+def worker_count(config: Settings = settings, cpus: Optional[float] = None) -> int:
+    if config.SERVER_WORKERS:
+        return config.SERVER_WORKERS
+    cpus = cpu_limit() if cpus is None else cpus
+    # A fractional quota (e.g. 1.5 CPUs) rounds up; the workers are mostly waiting on I/O
+    workers = math.ceil(cpus * config.SERVER_WORKERS_PER_CPU)
+    return max(1, min(workers, config.SERVER_MAX_WORKERS))
+
+
+def event_loop(config: Settings = settings) -> str:
+    if config.SERVER_LOOP != "auto":
+        return config.SERVER_LOOP
+    return "uvloop" if find_spec("uvloop") else "asyncio"
+
+
+def http_protocol(config: Settings = settings) -> str:
+    if config.SERVER_HTTP != "auto":
+        return config.SERVER_HTTP
+    return "httptools" if find_spec("httptools") else "h11"
+
+
+def prepare_multiprocess_metrics(config: Settings = settings) -> str:
+    path = config.PROMETHEUS_MULTIPROC_DIR or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        # Files left by a previous run would be summed into the new one
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+    else:
+        path = tempfile.mkdtemp(prefix="prometheus-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def disable_per_process_cache(config: Settings = settings) -> bool:
+    # A "memory" cache in one worker keeps serving rows another worker has since changed,
+    # so several workers run without a cache unless it is shared ("redis")
+    if config.CACHE_BACKEND != "memory":
+        return False
+    os.environ["CACHE_BACKEND"] = "none"
+    print(
+        "Warning: CACHE_BACKEND=memory is per worker and would serve stale customers with several "
+        "workers; running with CACHE_BACKEND=none. Set CACHE_BACKEND=redis to keep a cache.",
+        file=sys.stderr, flush=True,
+    )
+    return True
+
+
+def server_options(config: Settings = settings, workers: Optional[int] = None) -> dict:
+    workers = worker_count(config) if workers is None else workers
+    return {
+        "host": config.SERVER_HOST,
+        "port": config.SERVER_PORT,
+        "workers": workers,
+        "loop": event_loop(config),
+        "http": http_protocol(config),
+        "backlog": config.SERVER_BACKLOG,
+        "timeout_keep_alive": config.SERVER_KEEPALIVE_SECONDS,
+        # Uvicorn stops accepting, waits for in-flight requests up to this long, then runs the
+        # lifespan shutdown, which flushes the BatchSpanProcessor
+        "timeout_graceful_shutdown": config.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        "proxy_headers": True,
+        "log_level": config.LOG_LEVEL.lower(),
+    }
+
+
+def main(argv=None, config: Settings = settings):
+    parser = argparse.ArgumentParser(description="Run the Customer Service API")
+    parser.add_argument("--reload", action="store_true", help="single worker that restarts on code changes (development)")
+    parser.add_argument("--workers", type=int, help="override SERVER_WORKERS")
+    args = parser.parse_args(argv)
+
+    if args.reload:
+        uvicorn.run("app.main:app", host=config.SERVER_HOST, port=config.SERVER_PORT, reload=True)
+        return
+
+    options = server_options(config, workers=args.workers)
+    if options["workers"] > 1:
+        prepare_multiprocess_metrics(config)
+        disable_per_process_cache(config)
+    print(
+        f"Starting {options['workers']} worker(s) on {options['host']}:{options['port']} "
+        f"(loop={options['loop']}, http={options['http']})",
+        flush=True,
+    )
+    uvicorn.run("app.main:app", **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+from app.core.config import settings
+from app.core.logging import logger
+from app.utils.telemetry import increment_cache_hit, increment_cache_miss, increment_cache_eviction
+
+
+# Both caches keep a generation per key that changes on every delete. A reader takes the
+# generation of its lookup key before going to the database and fills the cache with
+# set_if_unchanged(), so a row read before a concurrent write never lands after its invalidation.
+
+
+class LRUCache:
+    # In-process cache: least recently used entries are evicted once max_entries is reached
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        # Delete counter value at each key's last delete, bounded like the entries. Keys
+        # dropped from it report the newest dropped value, so their generation never goes back.
+        self._deleted_at = OrderedDict()
+        self._deletes = 0
+        self._forgotten = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                increment_cache_hit(self.name)
+                return value
+            del self._entries[key]
+        increment_cache_miss(self.name)
+        return None
+
+    async def set(self, key: str, value: str):
+        self._entries[key] = (value, self._clock() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            increment_cache_eviction(self.name)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, values: Dict[str, str]):
+        for key, value in values.items():
+            await self.set(key, value)
+
+    async def delete(self, *keys: str):
+        self._deletes += 1
+        for key in keys:
+            self._entries.pop(key, None)
+            self._deleted_at[key] = self._deletes
+            self._deleted_at.move_to_end(key)
+        while len(self._deleted_at) > self.max_entries:
+            self._forgotten = self._deleted_at.popitem(last=False)[1]
+
+    async def generations(self, keys: Sequence[str]) -> list:
+        return [self._deleted_at.get(key, self._forgotten) for key in keys]
+
+    async def set_if_unchanged(self, entries: Sequence[Tuple[str, object, Sequence[str], str]]):
+        # entries: (guard key, its generation from generations(), keys to set, value)
+        for guard, generation, keys, value in entries:
+            if self._deleted_at.get(guard, self._forgotten) == generation:
+                for key in keys:
+                    await self.set(key, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisError(Exception):
+    pass
+
+
+# KEYS: per entry, its guard's generation key then the keys to set. ARGV: the TTL, then per
+# entry the guard's expected generation ("" when unset), the value and the number of keys.
+_SET_IF_UNCHANGED = """
+local k, a = 1, 2
+while k <= #KEYS do
+    local count = tonumber(ARGV[a + 2])
+    if (redis.call('GET', KEYS[k]) or '') == ARGV[a] then
+        for j = 1, count do
+            redis.call('SET', KEYS[k + j], ARGV[a + 1], 'EX', ARGV[1])
+        end
+    end
+    k = k + 1 + count
+    a = a + 3
+end
+return 0
+"""
+
+
+def _generation_key(key: str) -> str:
+    return f"{key}:generation"
+
+
+class RedisCache:
+    # Minimal RESP client (GET / MGET / SET EX / DEL) over a small pool of connections per
+    # event loop, so concurrent requests don't wait on each other's round trips.
+    # Commands sent together are pipelined: written at once, replies read in order.
+    # Cache failures are logged and treated as misses so requests fall back to the database.
+    name = "redis"
+
+    def __init__(self, url: str, ttl_seconds: float, timeout: float = 1.0, max_connections: int = 8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._loop = None
+        self._slots = None
+        # (reader, writer) pairs not in use by any call
+        self._idle = []
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._call("GET", key)
+        if value is None:
+            increment_cache_miss(self.name)
+            return None
+        increment_cache_hit(self.name)
+        return value.decode()
+
+    async def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        if not keys:
+            return []
+        values = await self._call("MGET", *keys) or [None] * len(keys)
+        for value in values:
+            if value is None:
+                increment_cache_miss(self.name)
+            else:
+                increment_cache_hit(self.name)
+        return [None if value is None else value.decode() for value in values]
+
+    async def set(self, key: str, value: str):
+        await self._call("SET", key, value, "EX", max(1, int(self.ttl_seconds)))
+
+    async def set_many(self, values: Dict[str, str]):
+        # MSET has no expiry, so one SET EX per key in a single pipeline
+        ttl = max(1, int(self.ttl_seconds))
+        if values:
+            await self._pipeline([("SET", key, value, "EX", ttl) for key, value in values.items()])
+
+    async def delete(self, *keys: str):
+        # Generations outlive the entries, and any read that could still be filling them
+        if keys:
+            ttl = max(300, int(self.ttl_seconds))
+            commands = [("DEL", *keys)]
+            for key in keys:
+                commands.extend((("INCR", _generation_key(key)), ("EXPIRE", _generation_key(key), ttl)))
+            await self._pipeline(commands)
+
+    async def generations(self, keys: Sequence[str]) -> list:
+        values = await self._call("MGET", *[_generation_key(key) for key in keys]) or [None] * len(keys)
+        return ["" if value is None else value.decode() for value in values]
+
+    async def set_if_unchanged(self, entries: Sequence[Tuple[str, object, Sequence[str], str]]):
+        # One EVAL, so the generation check and the writes are atomic on the server
+        keys, args = [], [max(1, int(self.ttl_seconds))]
+        for guard, generation, entry_keys, value in entries:
+            keys.append(_generation_key(guard))
+            keys.extend(entry_keys)
+            args.extend((generation, value, len(entry_keys)))
+        if keys:
+            await self._call("EVAL", _SET_IF_UNCHANGED, len(keys), *keys, *args)
+
+    async def close(self):
+        # Idle connections only; a call still in progress returns its connection to the pool
+        while self._idle:
+            self._idle.pop()[1].close()
+
+    async def _call(self, *command):
+        replies = await self._pipeline([command])
+        return None if replies is None else replies[0]
+
+    async def _pipeline(self, commands):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams belong to the loop that opened them
+            self._loop, self._slots, self._idle = loop, asyncio.Semaphore(self.max_connections), []
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+
+            async def execute():
+                nonlocal connection
+                if connection is None:
+                    connection = await self._connect()
+                return await _send(connection, commands)
+
+            try:
+                replies = await asyncio.wait_for(execute(), self.timeout)
+            except (OSError, EOFError, RedisError, asyncio.TimeoutError) as e:
+                logger.warning("Customer cache unavailable", privacy_level="LOW", command=commands[0][0], error=str(e))
+                # Replies may still be in flight on this connection; never reuse it
+                if connection is not None:
+                    connection[1].close()
+                return None
+            self._idle.append(connection)
+            return replies
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.password:
+                await _send((reader, writer), [("AUTH", self.password)])
+            if self.db:
+                await _send((reader, writer), [("SELECT", self.db)])
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+
+async def _send(connection, commands):
+    reader, writer = connection
+    writer.write(b"".join(_encode_command(*command) for command in commands))
+    await writer.drain()
+    return [await _read_reply(reader) for _ in commands]
+
+
+def _encode_command(*parts) -> bytes:
+    chunks = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode()
+        chunks.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(chunks)
+
+
+async def _read_reply(reader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise EOFError("Redis connection closed")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload
+    if kind == b"-":
+        raise RedisError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply type {kind!r}")
+
+
+def build_cache():
+    if settings.CACHE_BACKEND == "memory":
+        return LRUCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(settings.CACHE_REDIS_URL, settings.CACHE_TTL_SECONDS, max_connections=settings.CACHE_REDIS_MAX_CONNECTIONS)
+    return None
+
+
+# Shared cache instance, None when caching is disabled
+customer_cache = build_cache()
+
+def get_customer_cache():
+    return customer_cache
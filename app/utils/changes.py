@@ -0,0 +1,27 @@
+import asyncio
+from typing import Optional
+
+
+class ChangeNotifier:
+    # Wakes change-feed readers waiting in this process as soon as a write commits here.
+    # Writes made by other workers are only seen by readers re-checking the log on a timer.
+    def __init__(self):
+        self._event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def notify(self):
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    async def wait(self, timeout: float):
+        loop = asyncio.get_running_loop()
+        if self._event is None or self._loop is not loop:
+            self._event, self._loop = asyncio.Event(), loop
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+change_notifier = ChangeNotifier()
@@ -0,0 +1,40 @@
+import hashlib
+from typing import List, Optional, Sequence
+
+
+def format_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def list_etag(customers: Sequence, next_cursor: Optional[str] = None) -> str:
+    # Every write bumps a customer's version, so ids, versions and the cursor determine the page body
+    digest = hashlib.blake2b(digest_size=16)
+    for customer in customers:
+        digest.update(f"{customer.id}:{customer.version}\n".encode())
+    digest.update((next_cursor or "").encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def is_not_modified(header: Optional[str], etag: str) -> bool:
+    # True when the client's copy is current. If-None-Match uses the weak comparison.
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def parse_if_match(header: str) -> Optional[List[int]]:
+    # The versions an If-Match header accepts; None for "*" (any current version).
+    # Raises ValueError for tags we never issue, which therefore cannot match.
+    header = header.strip()
+    if header == "*":
+        return None
+    versions = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        # Weak tags (W/"...") never match: If-Match uses the strong comparison
+        if len(tag) < 3 or tag[0] != '"' or tag[-1] != '"' or not tag[1:-1].isdigit():
+            raise ValueError("Unrecognized entity tag")
+        versions.append(int(tag[1:-1]))
+    return versions
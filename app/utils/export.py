@@ -0,0 +1,34 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Mapping
+
+CSV_COLUMNS = ["id", "prefix", "surname", "middle_name", "family_name", "suffix", "email", "phone_number"]
+NAME_FIELDS = ["prefix", "surname", "middle_name", "family_name", "suffix"]
+
+
+async def serialize_ndjson(partitions: AsyncIterator[List[Mapping]]) -> AsyncIterator[bytes]:
+    # One output chunk per fetched partition, so nothing larger than a partition is held
+    async for rows in partitions:
+        yield "".join(json.dumps(dict(row)) + "\n" for row in rows).encode()
+
+
+async def serialize_csv(partitions: AsyncIterator[List[Mapping]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for rows in partitions:
+        for row in rows:
+            name = row["name"] or {}
+            writer.writerow([row["id"], *(name.get(field) for field in NAME_FIELDS), row["email"], row["phone_number"]])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (serialize_ndjson, "application/x-ndjson"),
+    "csv": (serialize_csv, "text/csv"),
+}
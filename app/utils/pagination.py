@@ -0,0 +1,37 @@
+import base64
+import json
+from typing import Sequence, Tuple
+
+
+def encode_cursor(last_id: str) -> str:
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    # Raises ValueError for anything that is not a cursor we issued
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = payload["id"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(last_id, str):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+
+def encode_keyset_cursor(position: Sequence[str]) -> str:
+    payload = json.dumps({"after": list(position)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_keyset_cursor(cursor: str, size: int) -> Tuple[str, ...]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(position, list) or len(position) != size or not all(isinstance(v, str) for v in position):
+        raise ValueError("Invalid cursor")
+    return tuple(position)
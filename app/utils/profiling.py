@@ -0,0 +1,191 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Optional
+from fastapi import HTTPException
+from app.core.auth import verify_token
+from app.core.config import settings
+
+# Statistical profiler for a live worker: a background thread reads every thread's stack
+# through sys._current_frames() at a fixed interval. Nothing runs while no profile is taken.
+
+# One profile at a time per worker, for the admin endpoint and X-Profile requests alike
+_profiling = threading.Lock()
+_frame_names = {}
+
+
+def _frame_name(code) -> str:
+    name = _frame_names.get(code)
+    if name is None:
+        filename = code.co_filename
+        if "site-packages" + os.sep in filename:
+            filename = filename.rsplit("site-packages" + os.sep, 1)[1]
+        elif filename.startswith(os.getcwd() + os.sep):
+            filename = os.path.relpath(filename)
+        name = _frame_names[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return name
+
+
+def _stack(frame) -> tuple:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+class StackSampler:
+    # Samples all threads, or with thread_id only that thread. With task, a sample of the
+    # event loop thread is only kept while that task is the one running on it.
+    def __init__(self, interval: float, thread_id: Optional[int] = None, task: Optional[asyncio.Task] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.task = task
+        self.loop = task.get_loop() if task is not None else None
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = self.ended = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.ended = time.perf_counter()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop.wait(self.interval):
+            if self.task is not None and asyncio.current_task(self.loop) is not self.task:
+                continue
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own_id or (self.thread_id is not None and ident != self.thread_id):
+                    continue
+                if ident not in thread_names:
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.stacks[(thread_names.get(ident, str(ident)),) + _stack(frame)] += 1
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's folded format: "thread;outer;...;inner count", one line per stack
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str) -> dict:
+        # https://www.speedscope.app/file-format-schema.json, one sampled profile per thread.
+        # Identical stacks are merged into one weighted sample.
+        frames, frame_index, profiles = [], {}, {}
+        for stack, count in self.stacks.items():
+            thread, *names = stack
+            indexes = []
+            for frame_name in names:
+                if frame_name not in frame_index:
+                    frame_index[frame_name] = len(frames)
+                    frames.append({"name": frame_name})
+                indexes.append(frame_index[frame_name])
+            profile = profiles.setdefault(thread, {
+                "type": "sampled", "name": thread, "unit": "seconds",
+                "startValue": 0, "endValue": self.ended - self.started, "samples": [], "weights": [],
+            })
+            profile["samples"].append(indexes)
+            profile["weights"].append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": settings.PROJECT_NAME,
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+
+async def profile_worker(seconds: float, interval: float) -> StackSampler:
+    if not _profiling.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    sampler = StackSampler(interval)
+    try:
+        sampler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+        _profiling.release()
+    return sampler
+
+
+class RecentProfiles:
+    # Per-request profiles kept for retrieval by id, oldest dropped first
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def add(self, profile_id: str, name: str, sampler: StackSampler):
+        self._profiles[profile_id] = (name, sampler)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[tuple]:
+        return self._profiles.get(profile_id)
+
+
+recent_profiles = RecentProfiles(settings.PROFILE_KEEP_RECENT)
+
+
+class RequestProfileMiddleware:
+    # "X-Profile: 1" from an admin samples the event loop thread while this request's task
+    # runs, up to the start of the response, and answers with an X-Profile-Id to fetch the profile from /admin/profiles/{id}.
+    # Work the request hands to the threadpool is not sampled. Requests without the
+    # header only pay for the header scan.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(name == b"x-profile" for name, _ in scope["headers"]):
+            return await self.app(scope, receive, send)
+        if not await _is_admin(scope) or not _profiling.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        profile_id = uuid.uuid4().hex
+        sampler = StackSampler(
+            settings.PROFILE_INTERVAL_MS / 1000, thread_id=threading.get_ident(), task=asyncio.current_task()
+        )
+        finished = False
+
+        def finish():
+            # Stored before the response starts, so the X-Profile-Id is fetchable as soon as it is seen
+            nonlocal finished
+            if not finished:
+                finished = True
+                sampler.stop()
+                _profiling.release()
+                recent_profiles.add(profile_id, f"{scope['method']} {scope['path']}", sampler)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                finish()
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            sampler.start()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            finish()
+
+
+async def _is_admin(scope) -> bool:
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return await verify_token(token) in settings.ADMIN_USERS
+    except HTTPException:
+        return False
@@ -0,0 +1,23 @@
+from typing import Optional
+from fastapi import Response
+from pydantic import BaseModel
+from app.core.config import settings
+from app.utils.telemetry import mark_responded
+
+
+class PreEncodedJSONResponse(Response):
+    media_type = "application/json"
+
+
+def respond(payload: BaseModel, status_code: int = 200, response: Optional[Response] = None):
+    # With FAST_RESPONSES the envelope is encoded once by pydantic-core and returned as-is,
+    # which skips FastAPI's response_model re-validation and jsonable_encoder pass.
+    # The route's response_model still drives the OpenAPI schema.
+    # Headers set on the route's injected Response are kept in both modes.
+    mark_responded()
+    if settings.FAST_RESPONSES:
+        encoded = PreEncodedJSONResponse(payload.model_dump_json(), status_code=status_code)
+        if response is not None:
+            encoded.headers.update(response.headers)
+        return encoded
+    return payload
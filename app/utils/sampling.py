@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+from opentelemetry.sdk.trace.sampling import TraceIdRatioBased
+from opentelemetry.trace import StatusCode
+
+# Imported by start_tracing() only; keeps the SDK out of app startup when tracing is off.
+
+
+class TailSamplingProcessor(SpanProcessor):
+    # Holds the spans of each trace until its local root span (the request) ends, then passes
+    # the whole trace on if it errored, was slow, or falls inside the sampling ratio. Traces
+    # continued from a sampled remote parent are always kept; the ratio is for traces started here.
+    def __init__(
+        self,
+        delegate: SpanProcessor,
+        ratio: float = 1.0,
+        keep_errors: bool = True,
+        slow_ms: Optional[float] = None,
+        max_pending_traces: int = 10000,
+    ):
+        self._delegate = delegate
+        self._bound = TraceIdRatioBased.get_bound_for_rate(ratio)
+        self._keep_errors = keep_errors
+        self._slow_ns = None if slow_ms is None else int(slow_ms * 1_000_000)
+        self._max_pending_traces = max_pending_traces
+        self._pending: "OrderedDict[int, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span, parent_context=None):
+        self._delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan):
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            spans = self._pending.setdefault(trace_id, [])
+            spans.append(span)
+            if not is_local_root:
+                # Bounded even if a root span never ends
+                if len(self._pending) > self._max_pending_traces:
+                    self._pending.popitem(last=False)
+                return
+            del self._pending[trace_id]
+        if self._keep(trace_id, span, spans):
+            for kept in spans:
+                self._delegate.on_end(kept)
+
+    def _keep(self, trace_id: int, root: ReadableSpan, spans) -> bool:
+        # The caller already decided to sample this trace; dropping our part would break it up
+        if root.parent is not None and root.parent.is_remote and root.parent.trace_flags.sampled:
+            return True
+        if trace_id & TraceIdRatioBased.TRACE_ID_LIMIT < self._bound:
+            return True
+        if self._keep_errors and any(s.status.status_code is StatusCode.ERROR for s in spans):
+            return True
+        return self._slow_ns is not None and root.end_time - root.start_time >= self._slow_ns
+
+    def shutdown(self):
+        self._delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._delegate.force_flush(timeout_millis)
@@ -1,47 +1,283 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional
+from fastapi.routing import APIRoute
 from prometheus_fastapi_instrumentator import Instrumentator
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
 from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
-from app.database import engine
-from app.core.config import settings
+from app.core.config import Settings, settings
+
+_route_tracer = trace.get_tracer("app.api.customers")
 
 # Custom metrics
 CUSTOMER_CREATED = Counter('customer_created_total', 'Total number of customers created')
 CUSTOMER_UPDATED = Counter('customer_updated_total', 'Total number of customers updated')
 CUSTOMER_DELETED = Counter('customer_deleted_total', 'Total number of customers deleted')
 
+# Connection pool metrics
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    'db_pool_checkout_seconds', 'Time spent waiting to check a connection out of the pool', ['pool'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CONNECTIONS_IN_USE = Gauge(
+    'db_pool_connections_in_use', 'Connections currently checked out of the pool', ['pool'],
+    multiprocess_mode='livesum'
+)
+DB_REPLICA_EJECTIONS = Counter(
+    'db_replica_ejections_total', 'Read replicas taken out of rotation after a failed read', ['replica']
+)
+
+
+# Customer cache metrics
+CACHE_HITS = Counter('customer_cache_hits_total', 'Customer cache lookups served from the cache', ['cache'])
+CACHE_MISSES = Counter('customer_cache_misses_total', 'Customer cache lookups that fell through to the database', ['cache'])
+CACHE_EVICTIONS = Counter('customer_cache_evictions_total', 'Customer cache entries evicted to stay within the size bound', ['cache'])
+
+
+# Repository metrics
+LOOKUPS_COALESCED = Counter(
+    'customer_lookups_coalesced_total', 'Customer lookups answered by an identical lookup already in flight', ['lookup']
+)
+REPOSITORY_STAGE_SECONDS = Histogram(
+    'customer_repository_stage_seconds', 'CustomerRepository call time, split into database and ORM-to-model conversion',
+    ['method', 'stage'], buckets=settings.METRICS_STAGE_BUCKETS
+)
+RESPONSE_ENCODE_SECONDS = Histogram(
+    'customer_response_encode_seconds', 'Time from the route handing over its payload to the finished response',
+    ['method', 'route'], buckets=settings.METRICS_STAGE_BUCKETS
+)
+
+
+# Auth metrics
+AUTH_VERIFY_SECONDS = Histogram(
+    'auth_verify_seconds', 'Time spent verifying the bearer token per request', ['outcome'],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+
+
+_stage_children = {}
+_responded_at: ContextVar[Optional[list]] = ContextVar("responded_at", default=None)
+
+
+def _repository_stages(method: str):
+    stages = _stage_children.get(method)
+    if stages is None:
+        stages = _stage_children[method] = (
+            REPOSITORY_STAGE_SECONDS.labels(method=method, stage="db"),
+            REPOSITORY_STAGE_SECONDS.labels(method=method, stage="convert"),
+        )
+    return stages
+
+
+class RepositoryTimer:
+    # Times one repository call; convert() marks where the rows are back and
+    # conversion to Customer models starts. Calls that never convert are all database time.
+    __slots__ = ("method", "started", "converting")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.converting = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def convert(self):
+        self.converting = time.perf_counter()
+
+    def __exit__(self, *exc):
+        ended = time.perf_counter()
+        db, convert = _repository_stages(self.method)
+        if self.converting is None:
+            db.observe(ended - self.started)
+        else:
+            db.observe(self.converting - self.started)
+            convert.observe(ended - self.converting)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def convert(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def repository_timer(method: str):
+    if settings.METRICS_STAGE_TIMING:
+        return RepositoryTimer(method)
+    return _NO_TIMER
+
+
+def mark_responded():
+    # Called by respond(); the rest of the route handler is response validation and encoding
+    marks = _responded_at.get()
+    if marks is not None:
+        marks.append(time.perf_counter())
+
+
+class StageTimedRoute(APIRoute):
+    # Observes encoding time per route template. Routes that stream or return a
+    # Response without going through respond() are not observed.
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not settings.METRICS_STAGE_TIMING:
+            return handler
+        encode = RESPONSE_ENCODE_SECONDS.labels(method=",".join(sorted(self.methods)), route=self.path)
+
+        async def timed_handler(request):
+            marks = []
+            token = _responded_at.set(marks)
+            try:
+                response = await handler(request)
+            finally:
+                _responded_at.reset(token)
+            if marks:
+                encode.observe(time.perf_counter() - marks[-1])
+            return response
+
+        return timed_handler
+
+
+def setup_telemetry(app, config: Settings = settings):
+    # Middleware and routes have to be in place before the app starts serving
 
-def setup_telemetry(app):
     # Set up metrics
     instrumentator = Instrumentator()
 
     # Instrument the app and expose metrics
     instrumentator.instrument(app).expose(app)
 
-    # Set up tracing
-    trace.set_tracer_provider(TracerProvider())
-    otlp_exporter = OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)
-    span_processor = BatchSpanProcessor(otlp_exporter)
-    trace.get_tracer_provider().add_span_processor(span_processor)
+    # Instrument FastAPI; spans go through the proxy tracer until start_tracing() installs a provider
+    if config.OTEL_TRACES_ENABLED:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        exclude_spans = None if config.OTEL_ASGI_INTERNAL_SPANS else ["receive", "send"]
+        FastAPIInstrumentor.instrument_app(app, exclude_spans=exclude_spans)
+
+
+def build_tracer_provider(config: Settings, exporter):
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
+
+    processor = BatchSpanProcessor(
+        exporter,
+        max_queue_size=config.OTEL_BSP_MAX_QUEUE_SIZE,
+        max_export_batch_size=config.OTEL_BSP_MAX_EXPORT_BATCH_SIZE,
+        schedule_delay_millis=config.OTEL_BSP_SCHEDULE_DELAY_MS,
+        export_timeout_millis=config.OTEL_BSP_EXPORT_TIMEOUT_MS,
+    )
+    if config.OTEL_TRACES_KEEP_ERRORS or config.OTEL_TRACES_KEEP_SLOW_MS is not None:
+        # Outcome-based keeping needs every span recorded; the ratio is applied at the end instead
+        from app.utils.sampling import TailSamplingProcessor
+        sampler = ParentBased(ALWAYS_ON)
+        processor = TailSamplingProcessor(
+            processor,
+            ratio=config.OTEL_TRACES_SAMPLER_RATIO,
+            keep_errors=config.OTEL_TRACES_KEEP_ERRORS,
+            slow_ms=config.OTEL_TRACES_KEEP_SLOW_MS,
+        )
+    else:
+        sampler = ParentBased(TraceIdRatioBased(config.OTEL_TRACES_SAMPLER_RATIO))
+    tracer_provider = TracerProvider(sampler=sampler)
+    tracer_provider.add_span_processor(processor)
+    return tracer_provider
+
+
+def route_span(name: str):
+    # Manual per-route span, or nothing when OTEL_MANUAL_SPANS is off
+    if settings.OTEL_MANUAL_SPANS:
+        return _route_tracer.start_as_current_span(name)
+    return nullcontext()
 
-    # Instrument FastAPI
-    FastAPIInstrumentor.instrument_app(app)
+
+def start_tracing(config: Settings = settings):
+    # Runs at startup; the SDK and the gRPC exporter stack are only imported when tracing is enabled
+    if not config.OTEL_TRACES_ENABLED:
+        return None
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+    # Set up tracing
+    tracer_provider = build_tracer_provider(config, OTLPSpanExporter(endpoint=config.OTEL_EXPORTER_OTLP_ENDPOINT))
+    trace.set_tracer_provider(tracer_provider)
 
     # Instrument SQLAlchemy
-    SQLAlchemyInstrumentor().instrument(engine=engine)
+    if config.OTEL_INSTRUMENT_SQLALCHEMY:
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+        from app.database import engine, async_engine, read_replicas
+        replica_engines = [replica.engine.sync_engine for replica in read_replicas.replicas]
+        SQLAlchemyInstrumentor().instrument(engines=[engine, async_engine.sync_engine, *replica_engines])
+    return tracer_provider
+
+
+def stop_tracing(tracer_provider):
+    # Flushes spans still queued in the BatchSpanProcessor
+    if tracer_provider is not None:
+        tracer_provider.shutdown()
+
+
+def release_metrics():
+    # In multiprocess mode, drop this worker's live gauges so they stop counting towards the sum
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
+
 
+@contextmanager
+def observe_pool_checkout(pool_name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_POOL_CHECKOUT_SECONDS.labels(pool=pool_name).observe(time.perf_counter() - started)
 
-def increment_customer_created():
-    CUSTOMER_CREATED.inc()
 
+def instrument_pool(engine, pool_name: str):
+    in_use = DB_POOL_CONNECTIONS_IN_USE.labels(pool=pool_name)
+    event.listen(engine, "checkout", lambda *args: in_use.inc())
+    event.listen(engine, "checkin", lambda *args: in_use.dec())
 
-def increment_customer_updated():
-    CUSTOMER_UPDATED.inc()
+
+def increment_customer_created(count: int = 1):
+    CUSTOMER_CREATED.inc(count)
+
+
+def increment_customer_updated(count: int = 1):
+    CUSTOMER_UPDATED.inc(count)
 
 
 def increment_customer_deleted():
-    CUSTOMER_DELETED.inc()
\ No newline at end of file
+    CUSTOMER_DELETED.inc()
+
+
+def increment_replica_ejection(replica: str):
+    DB_REPLICA_EJECTIONS.labels(replica=replica).inc()
+
+
+def increment_cache_hit(cache: str):
+    CACHE_HITS.labels(cache=cache).inc()
+
+
+def increment_cache_miss(cache: str):
+    CACHE_MISSES.labels(cache=cache).inc()
+
+
+def increment_cache_eviction(cache: str):
+    CACHE_EVICTIONS.labels(cache=cache).inc()
+
+
+def increment_lookup_coalesced(lookup: str):
+    LOOKUPS_COALESCED.labels(lookup=lookup).inc()
+
+
+def observe_auth_latency(outcome: str, seconds: float):
+    AUTH_VERIFY_SECONDS.labels(outcome=outcome).observe(seconds)
@@ -0,0 +1,92 @@
+"""Per-call overhead of the PrivacyAwareLogger calls made in app/api/customers.py.
+
+Compares the previous behaviour (mask and format inline, write to file and
+console from the caller), the queued pipeline, and a disabled level.
+
+    python -m benchmarks.bench_logging --iterations 20000
+"""
+import argparse
+import logging
+import os
+import queue
+import re
+import tempfile
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app.core.logging import DeferredQueueHandler, PrivacyAwareLogger
+
+CALLS = [
+    ("info", "Fetching customer", "MEDIUM", {"customer_id": "3f1c2a9e-8d4b-4c6a-9f0e-1b2c3d4e5f60"}),
+    ("info", "Fetching customer by email", "MEDIUM", {"email": "jane.doe@example.com"}),
+    ("warning", "Customer not found", "MEDIUM", {"email": "jane.doe@example.com"}),
+    ("info", "Customer updated successfully", "LOW", {"customer_id": "3f1c2a9e-8d4b-4c6a-9f0e-1b2c3d4e5f60"}),
+]
+
+
+class EagerPrivacyLogger(PrivacyAwareLogger):
+    # The pre-queue implementation: masks with re.sub and formats before the level check
+    def _log(self, level, message, privacy_level, kwargs):
+        masked_kwargs = {k: self._mask(v) for k, v in kwargs.items()}
+        self.logger.log(level, f"{message} [Privacy: {privacy_level}] {masked_kwargs}")
+
+    def _mask(self, data):
+        if isinstance(data, str):
+            data = re.sub(r'([\w\.-]+)@([\w\.-]+)', '****@****', data)
+            data = re.sub(r'\b\d{10}\b', '*' * 10, data)
+        return data
+
+
+def handlers(logs_dir):
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler = RotatingFileHandler(os.path.join(logs_dir, "bench.log"), maxBytes=10485760, backupCount=1)
+    console_handler = logging.StreamHandler(open(os.devnull, "w"))
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+    return [file_handler, console_handler]
+
+
+def build_logger(name, level, attached_handlers):
+    std_logger = logging.getLogger(f"bench.{name}")
+    std_logger.propagate = False
+    std_logger.setLevel(level)
+    std_logger.handlers = attached_handlers
+    return std_logger
+
+
+def per_call_us(privacy_logger, iterations, calls=CALLS):
+    started = time.perf_counter()
+    for i in range(iterations):
+        method, message, privacy_level, kwargs = calls[i % len(calls)]
+        getattr(privacy_logger, method)(message, privacy_level=privacy_level, **kwargs)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as logs_dir:
+        eager = EagerPrivacyLogger(build_logger("eager", logging.INFO, handlers(logs_dir)))
+        print(f"{'inline, eager masking':>24}: {per_call_us(eager, args.iterations):8.2f} us/call")
+
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, *handlers(logs_dir), respect_handler_level=True)
+        listener.start()
+        queued = PrivacyAwareLogger(build_logger("queued", logging.INFO, [DeferredQueueHandler(log_queue)]))
+        caller_us = per_call_us(queued, args.iterations)
+        drain_started = time.perf_counter()
+        listener.stop()
+        print(f"{'queued, lazy masking':>24}: {caller_us:8.2f} us/call "
+              f"(listener drained the backlog in {time.perf_counter() - drain_started:.2f}s)")
+
+        disabled = PrivacyAwareLogger(build_logger("disabled", logging.WARNING, handlers(logs_dir)))
+        info_calls = [call for call in CALLS if call[0] == "info"]
+        print(f"{'disabled level':>24}: {per_call_us(disabled, args.iterations, info_calls):8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
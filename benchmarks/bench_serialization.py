@@ -0,0 +1,83 @@
+"""Per-request CPU of GET /customers with and without FAST_RESPONSES.
+
+The repository is replaced by a stub that converts in-memory CustomerModel rows,
+so the numbers isolate row conversion, validation and JSON encoding from
+database time.
+
+    python -m benchmarks.bench_serialization --iterations 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("MAX_PAGE_SIZE", "1000")
+
+import httpx
+
+from app.main import app
+from app.api.customers import get_repository
+from app.core.auth import create_access_token
+from app.core.config import settings
+from app.models.database import CustomerModel
+from app.repositories.customer_repository import to_customer
+
+SIZES = (1, 100, 1000)
+
+
+class StubRepository:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def get_all(self, skip=0, limit=None, after_id=None):
+        return [to_customer(row) for row in self.rows[:limit]]
+
+
+def make_rows(count):
+    return [
+        CustomerModel(
+            id=f"{i:08d}-0000-4000-8000-000000000000",
+            name={"prefix": "Ms", "surname": f"Bench{i}", "middle_name": "Q", "family_name": "Load", "suffix": None},
+            email=f"bench.{i}@example.com",
+            phone_number=f"{i:010d}",
+        )
+        for i in range(count)
+    ]
+
+
+async def cpu_per_request(count, iterations):
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bench'})}"}
+    stub = StubRepository(make_rows(count))
+    app.dependency_overrides[get_repository] = lambda: stub
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        url = f"/api/v1/customers?limit={count}"
+        for _ in range(10):
+            (await client.get(url, headers=headers)).raise_for_status()
+        started = time.process_time()
+        for _ in range(iterations):
+            (await client.get(url, headers=headers)).raise_for_status()
+        return (time.process_time() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'customers':>9}  {'default ms':>10}  {'fast ms':>8}  {'speedup':>7}")
+    try:
+        for count in SIZES:
+            settings.FAST_RESPONSES = False
+            default = asyncio.run(cpu_per_request(count, args.iterations))
+            settings.FAST_RESPONSES = True
+            fast = asyncio.run(cpu_per_request(count, args.iterations))
+            print(f"{count:>9}  {default * 1000:>10.3f}  {fast * 1000:>8.3f}  {default / fast:>6.2f}x")
+    finally:
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
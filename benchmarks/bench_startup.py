@@ -0,0 +1,81 @@
+"""Import-time cost of the application, from `python -X importtime`.
+
+Each run imports the app module in a fresh interpreter and records the
+cumulative import time of that module plus the wall time of the process.
+Reported figures are medians across runs.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --module app.main --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def parse_importtime(stderr: str) -> dict:
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, package = line[len("import time:"):].split("|")
+        name = package.strip()
+        timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def run_once(module: str) -> tuple:
+    env = {**os.environ, "OTEL_SDK_DISABLED": "true", "LOG_LEVEL": "WARNING"}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return time.perf_counter() - started, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="heaviest top-level packages to list")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    wall, module_cumulative = [], []
+    package_cumulative = defaultdict(list)
+    for _ in range(args.runs):
+        elapsed, timings = run_once(args.module)
+        wall.append(elapsed)
+        module_cumulative.append(timings[args.module][1])
+        for name, (_, cumulative) in timings.items():
+            # Nested imports are indented; only count each top-level package once
+            if "." not in name:
+                package_cumulative[name].append(cumulative)
+
+    heaviest = sorted(
+        ((name, statistics.median(values)) for name, values in package_cumulative.items()),
+        key=lambda item: item[1], reverse=True,
+    )[:args.top]
+    results = {
+        "module": args.module,
+        "runs": args.runs,
+        "wall_ms": round(statistics.median(wall) * 1000, 1),
+        "import_ms": round(statistics.median(module_cumulative) / 1000, 1),
+        "heaviest_packages_ms": {name: round(us / 1000, 1) for name, us in heaviest},
+    }
+    print(f"import {args.module}: {results['import_ms']} ms (process wall time {results['wall_ms']} ms)")
+    for name, ms in results["heaviest_packages_ms"].items():
+        print(f"  {name:<40} {ms:>8.1f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Per-request cost of tracing on GET /customers/{id} under each sampling setting.
+
+Every configuration runs in a fresh interpreter, because the FastAPI instrumentation is
+fixed when the app is created. Spans go to an in-memory exporter through the same
+build_tracer_provider() that start_tracing() uses, so the numbers cover span creation,
+sampling and batching but not the network export. The cache is off, so every request
+reaches the database.
+
+    python -m benchmarks.bench_tracing --requests 2000
+    python -m benchmarks.bench_tracing --configs off,all,ratio-0.1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CONFIGS = {
+    "off": {"OTEL_TRACES_ENABLED": "false"},
+    "all": {},
+    "no-manual-spans": {"OTEL_MANUAL_SPANS": "false"},
+    "no-asgi-internal": {"OTEL_ASGI_INTERNAL_SPANS": "false"},
+    "no-sqlalchemy": {"OTEL_INSTRUMENT_SQLALCHEMY": "false"},
+    "lean": {"OTEL_MANUAL_SPANS": "false", "OTEL_ASGI_INTERNAL_SPANS": "false", "OTEL_INSTRUMENT_SQLALCHEMY": "false"},
+    "ratio-0.1": {"OTEL_TRACES_SAMPLER_RATIO": "0.1"},
+    "tail-0.1": {"OTEL_TRACES_SAMPLER_RATIO": "0.1", "OTEL_TRACES_KEEP_ERRORS": "true", "OTEL_TRACES_KEEP_SLOW_MS": "100"},
+}
+
+
+def run_child(requests: int) -> dict:
+    import asyncio
+    import time
+    import httpx
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from app.main import app
+    from app.core.auth import create_access_token
+    from app.core.config import settings
+    from app.database import Base, engine, async_engine
+    from app.migrations import run_migrations
+    from app.utils.telemetry import build_tracer_provider
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    exporter = InMemorySpanExporter()
+    if settings.OTEL_TRACES_ENABLED:
+        provider = build_tracer_provider(settings, exporter)
+        trace.set_tracer_provider(provider)
+        if settings.OTEL_INSTRUMENT_SQLALCHEMY:
+            from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+            SQLAlchemyInstrumentor().instrument(engines=[engine, async_engine.sync_engine])
+
+    async def drive():
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bench'})}"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            customer = {"name": {"surname": "Trace", "family_name": "Bench"}, "email": "trace@example.com", "phone_number": "5550001111"}
+            created = await client.post("/api/v1/customers", json=customer, headers=headers)
+            url = f"/api/v1/customers/{created.json()['data']['id']}"
+            for _ in range(50):
+                (await client.get(url, headers=headers)).raise_for_status()
+            if settings.OTEL_TRACES_ENABLED:
+                trace.get_tracer_provider().force_flush()
+            exporter.clear()
+
+            timings = []
+            cpu_started = time.process_time()
+            for _ in range(requests):
+                started = time.perf_counter()
+                (await client.get(url, headers=headers)).raise_for_status()
+                timings.append((time.perf_counter() - started) * 1000)
+            cpu = time.process_time() - cpu_started
+            return timings, cpu
+
+    timings, cpu = asyncio.run(drive())
+    if settings.OTEL_TRACES_ENABLED:
+        trace.get_tracer_provider().force_flush()
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "cpu_ms_per_request": round(cpu / requests * 1000, 3),
+        "spans_per_request": round(len(exporter.get_finished_spans()) / requests, 2),
+    }
+
+
+def run_config(name: str, requests: int, directory: str) -> dict:
+    database = os.path.join(directory, f"{name}.db")
+    env = {
+        **os.environ, **CONFIGS[name],
+        "LOG_LEVEL": "WARNING", "CACHE_BACKEND": "none", "DATABASE_URL": f"sqlite:///{database}",
+    }
+    env.pop("OTEL_SDK_DISABLED", None)
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_tracing", "--child", "--requests", str(requests)],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"comma-separated subset of: {', '.join(CONFIGS)}")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.requests)))
+        return
+
+    results = {}
+    print(f"{'config':<18} {'p50 ms':>8} {'p95 ms':>8} {'cpu ms/req':>10} {'spans/req':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.configs.split(","):
+            result = results[name] = run_config(name, args.requests, directory)
+            print(f"{name:<18} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} "
+                  f"{result['cpu_ms_per_request']:>10.3f} {result['spans_per_request']:>9.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
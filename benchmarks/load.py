@@ -0,0 +1,392 @@
+"""Load test for the customer API.
+
+Seeds N customers, then drives every route in app/api/customers.py plus /token,
+either in-process (httpx ASGI transport) or against a locally launched uvicorn.
+Reports p50/p95/p99 latency and requests per second per route, writes the
+results as JSON and optionally compares them with a previous run.
+
+    python -m benchmarks.load --customers 1000 --requests 500 --concurrency 20
+    python -m benchmarks.load --customers 100000 --mode uvicorn --workers 2 --output results.json
+    python -m benchmarks.load --customers 100000 --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import httpx
+
+SEED_NAMESPACE = uuid.UUID("6f1d3c3e-5b0a-4d4c-9a57-2f1b4a9e7c10")
+SEED_CHUNK = 5000
+
+
+def seeded_id(i: int) -> str:
+    # Deterministic ids, so workloads can address any seeded row without loading them
+    return str(uuid.uuid5(SEED_NAMESPACE, str(i)))
+
+
+def seeded_email(i: int) -> str:
+    return f"seed.{i}@example.com"
+
+
+def seed(database_url: str, count: int, reseed: bool):
+    from sqlalchemy import create_engine, delete, func, insert, select
+    from app.database import Base
+    from app.migrations import run_migrations
+    from app.models.database import CustomerModel, name_keys, normalize_email
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    seeded = CustomerModel.email.like("seed.%")
+    with engine.begin() as conn:
+        existing = conn.execute(select(func.count()).select_from(CustomerModel).where(seeded)).scalar()
+        if existing == count and not reseed:
+            # Drop what earlier runs created so every run starts from the same table
+            conn.execute(delete(CustomerModel).where(~seeded))
+            print(f"reusing {count} seeded customers")
+            return
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(delete(CustomerModel))
+    # Raw inserts: the rows are known-good, so skip per-row model validation
+    for start in range(0, count, SEED_CHUNK):
+        rows = []
+        for i in range(start, min(start + SEED_CHUNK, count)):
+            name = {"prefix": None, "surname": f"Seed{i}", "middle_name": None,
+                    "family_name": f"Family{i % 1000}", "suffix": None}
+            rows.append({
+                "id": seeded_id(i),
+                "name": name,
+                "email": seeded_email(i),
+                "email_normalized": normalize_email(seeded_email(i)),
+                "phone_number": f"{i:010d}",
+                **name_keys(name),
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(CustomerModel), rows)
+    engine.dispose()
+    print(f"seeded {count} customers in {time.perf_counter() - started:.1f}s")
+
+
+def customer_body(tag: str, i: int, phone: Optional[str] = None) -> dict:
+    return {
+        "name": {"surname": f"Load{i}", "family_name": "Bench"},
+        "email": f"{tag}.{i}@example.com",
+        "phone_number": phone or f"{i % 10**10:010d}",
+    }
+
+
+@dataclass
+class Context:
+    customers: int
+    run_tag: str
+    headers: dict = field(default_factory=dict)
+    created_ids: List[str] = field(default_factory=list)
+
+    def random_index(self) -> int:
+        return random.randrange(self.customers)
+
+
+@dataclass
+class Scenario:
+    name: str
+    call: Callable
+    # Fraction of --requests to issue; expensive routes run fewer times
+    weight: float = 1.0
+
+
+async def _token(client, ctx, i):
+    return await client.post("/token", data={"username": "test", "password": "test"})
+
+
+async def _create(client, ctx, i):
+    response = await client.post("/api/v1/customers", json=customer_body(ctx.run_tag, i), headers=ctx.headers)
+    if response.status_code == 201:
+        ctx.created_ids.append(response.json()["data"]["id"])
+    return response
+
+
+async def _batch_create(client, ctx, i):
+    body = [customer_body(f"{ctx.run_tag}-batch{i}", j) for j in range(100)]
+    return await client.post("/api/v1/customers:batch", json=body, headers=ctx.headers)
+
+
+async def _list_first_page(client, ctx, i):
+    return await client.get("/api/v1/customers?limit=100", headers=ctx.headers)
+
+
+async def _list_offset_page(client, ctx, i):
+    skip = max(0, ctx.random_index() - 100)
+    return await client.get(f"/api/v1/customers?skip={skip}&limit=100", headers=ctx.headers)
+
+
+async def _list_cursor_page(client, ctx, i):
+    from app.utils.pagination import encode_cursor
+    cursor = encode_cursor(seeded_id(ctx.random_index()))
+    return await client.get(f"/api/v1/customers?limit=100&cursor={cursor}", headers=ctx.headers)
+
+
+async def _search(client, ctx, i):
+    return await client.get(f"/api/v1/customers/search?family_name=Family{ctx.random_index() % 1000}", headers=ctx.headers)
+
+
+async def _get_by_id(client, ctx, i):
+    return await client.get(f"/api/v1/customers/{seeded_id(ctx.random_index())}", headers=ctx.headers)
+
+
+async def _get_by_id_not_modified(client, ctx, i):
+    # A poller holding the current version; "*" takes the same version-only path as its ETag would
+    headers = {**ctx.headers, "If-None-Match": "*"}
+    return await client.get(f"/api/v1/customers/{seeded_id(ctx.random_index())}", headers=headers)
+
+
+async def _batch_get(client, ctx, i):
+    # One page of an order listing: 200 customers resolved in one call
+    body = {"ids": [seeded_id(ctx.random_index()) for _ in range(200)]}
+    return await client.post("/api/v1/customers:batchGet", json=body, headers=ctx.headers)
+
+
+async def _get_by_email(client, ctx, i):
+    return await client.get(f"/api/v1/customers/email/{seeded_email(ctx.random_index())}", headers=ctx.headers)
+
+
+async def _update(client, ctx, i):
+    index = ctx.random_index()
+    body = {
+        "name": {"surname": f"Seed{index}", "family_name": f"Family{index % 1000}"},
+        "email": seeded_email(index),
+        "phone_number": f"{random.randrange(10**10):010d}",
+    }
+    return await client.put(f"/api/v1/customers/{seeded_id(index)}", json=body, headers=ctx.headers)
+
+
+async def _patch(client, ctx, i):
+    body = {"phone_number": f"{random.randrange(10**10):010d}"}
+    return await client.patch(f"/api/v1/customers/{seeded_id(ctx.random_index())}", json=body, headers=ctx.headers)
+
+
+async def _delete(client, ctx, i):
+    customer_id = ctx.created_ids.pop() if ctx.created_ids else str(uuid.uuid4())
+    return await client.delete(f"/api/v1/customers/{customer_id}", headers=ctx.headers)
+
+
+async def _changes(client, ctx, i):
+    return await client.get("/api/v1/customers/changes?since=0&limit=100", headers=ctx.headers)
+
+
+async def _export(client, ctx, i):
+    async with client.stream("GET", "/api/v1/customers/export?format=ndjson", headers=ctx.headers) as response:
+        async for _ in response.aiter_raw():
+            pass
+    return response
+
+
+# Ordered: creates run before deletes, which consume the ids they produced
+SCENARIOS = [
+    Scenario("POST /token", _token),
+    Scenario("POST /customers", _create),
+    Scenario("POST /customers:batch", _batch_create, weight=0.05),
+    Scenario("GET /customers", _list_first_page),
+    Scenario("GET /customers?skip", _list_offset_page),
+    Scenario("GET /customers?cursor", _list_cursor_page),
+    Scenario("GET /customers/search", _search),
+    Scenario("GET /customers/{id}", _get_by_id),
+    Scenario("GET /customers/{id} If-None-Match", _get_by_id_not_modified),
+    Scenario("POST /customers:batchGet", _batch_get, weight=0.05),
+    Scenario("GET /customers/email/{email}", _get_by_email),
+    Scenario("PUT /customers/{id}", _update),
+    Scenario("PATCH /customers/{id}", _patch),
+    Scenario("DELETE /customers/{id}", _delete),
+    Scenario("GET /customers/changes", _changes),
+    Scenario("GET /customers/export", _export, weight=0.01),
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, ctx, scenario, requests, concurrency):
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await scenario.call(client, ctx, i)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+async def drive(client, args, selected):
+    ctx = Context(customers=args.customers, run_tag=f"load{int(time.time())}")
+    token = (await client.post("/token", data={"username": "test", "password": "test"})).json()["access_token"]
+    ctx.headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for scenario in selected:
+        requests = max(1, int(args.requests * scenario.weight))
+        concurrency = min(args.concurrency, requests)
+        results[scenario.name] = await run_scenario(client, ctx, scenario, requests, concurrency)
+        print(format_row(scenario.name, results[scenario.name]))
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(args, selected, env):
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    server = subprocess.Popen(command, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn did not become healthy")
+                await asyncio.sleep(0.2)
+            return await drive(client, args, selected)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def run_inprocess(args, selected):
+    from app.main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        return await drive(client, args, selected)
+
+
+def format_row(name, result):
+    return (f"{name:<32} {result['requests']:>7} req {result['errors']:>5} err {result['rps']:>9.1f} req/s  "
+            f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms")
+
+
+def compare(previous: dict, current: dict, threshold: float) -> bool:
+    # Returns True when any route's p95 or throughput regressed by more than threshold percent
+    regressed = False
+    print(f"\n{'route':<32} {'p95 before':>11} {'p95 now':>9} {'change':>8} {'rps change':>11}")
+    for name, now in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        p95_change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps_change = (now["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        flag = ""
+        if p95_change > threshold or rps_change < -threshold:
+            regressed, flag = True, "  REGRESSION"
+        print(f"{name:<32} {before['p95_ms']:>9.2f}ms {now['p95_ms']:>7.2f}ms {p95_change:>+7.1f}% {rps_change:>+10.1f}%{flag}")
+    return regressed
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1000, help="rows to seed, e.g. 1000, 100000, 1000000")
+    parser.add_argument("--database-url", default="sqlite:///./benchmark.db")
+    parser.add_argument("--reseed", action="store_true", help="reseed even if the table already has --customers rows")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route before weighting")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--routes", help="comma separated substrings selecting routes, e.g. 'GET /customers/{id},token'")
+    parser.add_argument("--tracing", action="store_true", help="keep OpenTelemetry enabled")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    env = {**os.environ, "DATABASE_URL": args.database_url}
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if not args.tracing:
+        env["OTEL_SDK_DISABLED"] = "true"
+    # The in-process app reads its settings at import time
+    os.environ.update(env)
+
+    selected = SCENARIOS
+    if args.routes:
+        wanted = [part.strip() for part in args.routes.split(",") if part.strip()]
+        selected = [scenario for scenario in SCENARIOS if any(w in scenario.name for w in wanted)]
+
+    seed(args.database_url, args.customers, args.reseed)
+    if args.mode == "uvicorn":
+        scenarios = asyncio.run(run_uvicorn(args, selected, env))
+    else:
+        scenarios = asyncio.run(run_inprocess(args, selected))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else None,
+            "customers": args.customers,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "database": args.database_url.split(":", 1)[0],
+        },
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(json.load(f), results, args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-import uvicorn
+from app.server import main
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Production defaults from Settings; pass --reload for a single auto-reloading worker
+    main()
@@ -1,18 +1,116 @@
+import asyncio
 import pytest
+from contextlib import asynccontextmanager
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, async_database_url
+from app.models.pydantic_models import CustomerCreate
 from app.core.auth import create_access_token
+from app.repositories.customer_repository import CustomerRepository
+from app.utils.cache import LRUCache, RedisCache, get_customer_cache
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_customer(email="cache.doe@example.com"):
+    return CustomerCreate(
+        name={"surname": "Doe", "family_name": "Smith"},
+        email=email,
+        phone_number="1234567890"
+    )
+
+
+class FakeRedisServer:
+    # Just enough of the Redis protocol for RedisCache: GET, MGET, SET [EX], DEL, INCR, EXPIRE (ignored),
+    # SELECT, AUTH, and EVAL of RedisCache's set-if-unchanged script only
+    def __init__(self, delay: float = 0):
+        self.data = {}
+        self.server = None
+        self.delay = delay
+        self.connections = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    parts.append((await reader.readexactly(length + 2))[:-2])
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(self._dispatch(parts[0].upper(), parts[1:]))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _dispatch(self, command, args):
+        if command == b"GET":
+            value = self.data.get(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"MGET":
+            values = [self.data.get(key) for key in args]
+            return b"*%d\r\n" % len(values) + b"".join(
+                b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value) for value in values
+            )
+        if command == b"SET":
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum(self.data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % removed
+        if command == b"INCR":
+            value = self.data[args[0]] = b"%d" % (int(self.data.get(args[0], b"0")) + 1)
+            return b":%s\r\n" % value
+        if command == b"EXPIRE":
+            return b":1\r\n"
+        if command == b"EVAL":
+            keys, argv = args[2:2 + int(args[1])], args[2 + int(args[1]):]
+            k, a = 0, 1
+            while k < len(keys):
+                count = int(argv[a + 2])
+                if self.data.get(keys[k], b"") == argv[a]:
+                    for key in keys[k + 1:k + 1 + count]:
+                        self.data[key] = argv[a + 1]
+                k, a = k + 1 + count, a + 3
+            return b":0\r\n"
+        if command in (b"SELECT", b"AUTH"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient may drive requests from different event loops, so don't pool async connections
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 @pytest.fixture(scope="function")
 def db():
     Base.metadata.create_all(bind=engine)
@@ -23,18 +121,40 @@ def db():
         db.close()
         Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="function")
+def customer_repository(db):
+    return CustomerRepository(db)
+
 @pytest.fixture(scope="function")
 def client(db):
-    def override_get_db():
-        try:
-            yield db
-        finally:
-            db.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+    customer_cache = LRUCache(max_entries=100, ttl_seconds=60)
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_customer_cache] = lambda: customer_cache
     yield TestClient(app)
     del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_customer_cache]
 
 @pytest.fixture(scope="function")
 def auth_headers():
     access_token = create_access_token(data={"sub": "testuser"})
-    return {"Authorization": f"Bearer {access_token}"}
\ No newline at end of file
+    return {"Authorization": f"Bearer {access_token}"}
+
+@pytest.fixture(params=["memory", "redis"])
+def open_cache(request):
+    # Opens each customer cache backend inside the test's own event loop; Redis is a FakeRedisServer
+    @asynccontextmanager
+    async def open():
+        if request.param == "memory":
+            yield LRUCache(max_entries=100, ttl_seconds=30)
+            return
+        server = FakeRedisServer()
+        cache = RedisCache(f"redis://127.0.0.1:{await server.start()}/0", ttl_seconds=30)
+        try:
+            yield cache
+        finally:
+            await cache.close()
+            await server.stop()
+    return open
@@ -163,4 +163,351 @@ def test_create_bulk_customers(client, auth_headers):
         assert response.status_code == 200
         retrieved_customer = response.json()["data"]
         assert retrieved_customer["email"] == customer["email"]
-        assert retrieved_customer["name"]["surname"] == f"Doe{i}"
\ No newline at end of file
+        assert retrieved_customer["name"]["surname"] == f"Doe{i}"
+
+def _create_customers(client, auth_headers, count, prefix="page"):
+    created = []
+    for i in range(count):
+        customer_data = {
+            "name": {
+                "prefix": "Mr",
+                "surname": f"Doe{i}",
+                "middle_name": None,
+                "family_name": "Smith",
+                "suffix": None
+            },
+            "email": f"{prefix}.{i}@example.com",
+            "phone_number": f"555000{i:04d}"
+        }
+        response = client.post("/api/v1/customers", json=customer_data, headers=auth_headers)
+        assert response.status_code == 201
+        created.append(response.json()["data"])
+    return created
+
+def test_get_customers_offset_pagination(client, auth_headers):
+    created = _create_customers(client, auth_headers, 5)
+    expected_ids = sorted(customer["id"] for customer in created)
+
+    response = client.get("/api/v1/customers?skip=1&limit=2", headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [customer["id"] for customer in body["data"]] == expected_ids[1:3]
+    assert body["next_cursor"] is not None
+
+def test_get_customers_cursor_pagination(client, auth_headers):
+    created = _create_customers(client, auth_headers, 5)
+    expected_ids = sorted(customer["id"] for customer in created)
+
+    seen_ids = []
+    url = "/api/v1/customers?limit=2"
+    while True:
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        body = response.json()
+        seen_ids.extend(customer["id"] for customer in body["data"])
+        if body["next_cursor"] is None:
+            break
+        url = f"/api/v1/customers?limit=2&cursor={body['next_cursor']}"
+
+    assert seen_ids == expected_ids
+
+def test_get_customers_rejects_oversized_page(client, auth_headers):
+    from app.core.config import settings
+    response = client.get(f"/api/v1/customers?limit={settings.MAX_PAGE_SIZE + 1}", headers=auth_headers)
+    assert response.status_code == 422
+
+def test_get_customers_rejects_invalid_cursor(client, auth_headers):
+    response = client.get("/api/v1/customers?cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+def _batch_item(i, email=None):
+    return {
+        "name": {"surname": f"Batch{i}", "family_name": "Smith"},
+        "email": email or f"batch.{i}@example.com",
+        "phone_number": f"444000{i:04d}"
+    }
+
+def test_batch_create_customers(client, auth_headers):
+    existing = client.post("/api/v1/customers", json=_batch_item(0), headers=auth_headers).json()["data"]
+    body = [
+        _batch_item(0),                                   # conflicts with the existing customer
+        _batch_item(1),
+        _batch_item(2),
+        _batch_item(3, email="batch.1@example.com"),      # duplicate within the batch
+        {"name": {"surname": "Bad"}, "email": "not-an-email", "phone_number": "1"},
+    ]
+    response = client.post("/api/v1/customers:batch", json=body, headers=auth_headers)
+    assert response.status_code == 200
+    result = response.json()["data"]
+    assert (result["created"], result["updated"], result["conflicts"], result["invalid"]) == (2, 0, 2, 1)
+    assert [item["status"] for item in result["items"]] == ["conflict", "created", "created", "conflict", "invalid"]
+    assert result["items"][0]["id"] == existing["id"]
+    # The duplicate points at the customer its first occurrence created
+    assert result["items"][3]["id"] == result["items"][1]["id"]
+    assert result["items"][4]["errors"]
+
+    created_id = result["items"][1]["id"]
+    response = client.get(f"/api/v1/customers/{created_id}", headers=auth_headers)
+    assert response.json()["data"]["email"] == "batch.1@example.com"
+
+def test_batch_upsert_is_idempotent(client, auth_headers):
+    body = [_batch_item(i) for i in range(3)]
+    first = client.post("/api/v1/customers:batch?upsert=true", json=body, headers=auth_headers).json()["data"]
+    assert first["created"] == 3
+
+    body[0]["phone_number"] = "9999999999"
+    second = client.post("/api/v1/customers:batch?upsert=true", json=body, headers=auth_headers).json()["data"]
+    assert (second["created"], second["updated"]) == (0, 3)
+    assert [item["id"] for item in second["items"]] == [item["id"] for item in first["items"]]
+
+    response = client.get(f"/api/v1/customers/{first['items'][0]['id']}", headers=auth_headers)
+    assert response.json()["data"]["phone_number"] == "9999999999"
+
+def test_batch_create_ndjson(client, auth_headers):
+    import json
+    lines = [json.dumps(_batch_item(i)) for i in range(2)] + ["{not json"]
+    response = client.post(
+        "/api/v1/customers:batch",
+        content="\n".join(lines),
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    result = response.json()["data"]
+    assert [item["status"] for item in result["items"]] == ["created", "created", "invalid"]
+
+def test_batch_create_rejects_non_array(client, auth_headers):
+    response = client.post("/api/v1/customers:batch", json={"email": "x"}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_fast_responses_match_default_encoding(client, auth_headers, monkeypatch):
+    from app.core.config import settings
+    from app.main import app
+    created = _create_customers(client, auth_headers, 3, prefix="fast")
+    urls = [
+        "/api/v1/customers?limit=2",
+        f"/api/v1/customers/{created[0]['id']}",
+        f"/api/v1/customers/email/{created[1]['email']}",
+    ]
+    default_bodies = [client.get(url, headers=auth_headers).json() for url in urls]
+    default_schema = app.openapi()
+
+    monkeypatch.setattr(settings, "FAST_RESPONSES", True)
+    for url, expected in zip(urls, default_bodies):
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == expected
+
+    response = client.post("/api/v1/customers", json=_batch_item(99), headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json()["data"]["email"] == "batch.99@example.com"
+    assert app.openapi() == default_schema
+
+def _search_customer(client, auth_headers, i, surname, family_name):
+    response = client.post("/api/v1/customers", json={
+        "name": {"surname": surname, "family_name": family_name},
+        "email": f"search.{i}@example.com",
+        "phone_number": f"555100{i:04d}",
+    }, headers=auth_headers)
+    assert response.status_code == 201
+    return response.json()["data"]
+
+def test_search_customers(client, auth_headers):
+    for i, (surname, family_name) in enumerate([
+        ("Ann", "Smith"), ("bob", "SMITH"), ("Cid", "Smithers"), ("Ann", "Jones"), ("Dee", "Smith"),
+    ]):
+        _search_customer(client, auth_headers, i, surname, family_name)
+
+    response = client.get("/api/v1/customers/search?family_name=smith", headers=auth_headers)
+    assert response.status_code == 200
+    assert [c["name"]["surname"] for c in response.json()["data"]] == ["Ann", "bob", "Dee"]
+
+    response = client.get("/api/v1/customers/search?family_name=Smi&prefix_match=true", headers=auth_headers)
+    assert [c["name"]["surname"] for c in response.json()["data"]] == ["Ann", "bob", "Dee", "Cid"]
+
+    response = client.get("/api/v1/customers/search?surname=ann", headers=auth_headers)
+    assert [c["name"]["family_name"] for c in response.json()["data"]] == ["Jones", "Smith"]
+
+    response = client.get("/api/v1/customers/search?family_name=Smith&surname=Bob", headers=auth_headers)
+    assert [c["email"] for c in response.json()["data"]] == ["search.1@example.com"]
+
+def test_search_customers_follows_updates_and_pages(client, auth_headers):
+    created = [_search_customer(client, auth_headers, i, f"Name{i}", "Paged") for i in range(5)]
+    renamed = dict(created[0], name={"surname": "Name0", "family_name": "Moved"})
+    del renamed["id"]
+    assert client.put(f"/api/v1/customers/{created[0]['id']}", json=renamed, headers=auth_headers).status_code == 200
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/customers/search?family_name=paged&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url, headers=auth_headers).json()
+        seen.extend(c["id"] for c in body["data"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [c["id"] for c in created[1:]]
+
+def test_search_customers_requires_a_name(client, auth_headers):
+    assert client.get("/api/v1/customers/search", headers=auth_headers).status_code == 400
+    response = client.get("/api/v1/customers/search?family_name=x&cursor=bogus", headers=auth_headers)
+    assert response.status_code == 400
+
+def test_email_lookup_and_uniqueness_ignore_case(client, auth_headers):
+    customer_data = {
+        "name": {"surname": "Case", "family_name": "Mixed"},
+        "email": "Mixed.Case@Example.com",
+        "phone_number": "5552000000",
+    }
+    created = client.post("/api/v1/customers", json=customer_data, headers=auth_headers).json()["data"]
+    # EmailStr lowercases the domain; the local part keeps its case
+    assert created["email"] == "Mixed.Case@example.com"
+
+    for email in ("mixed.case@example.com", "MIXED.CASE@EXAMPLE.COM", "Mixed.Case@Example.com"):
+        response = client.get(f"/api/v1/customers/email/{email}", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["data"]["id"] == created["id"]
+
+    duplicate = dict(customer_data, email="MIXED.case@example.COM")
+    response = client.post("/api/v1/customers", json=duplicate, headers=auth_headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Email already in use"
+    response = client.post("/api/v1/customers:batch", json=[duplicate], headers=auth_headers)
+    assert response.json()["data"]["items"][0] == {"index": 0, "status": "conflict", "id": created["id"], "errors": None}
+
+    # A change of case is an update of the same customer; lookups by the old spelling still hit
+    renamed = dict(customer_data, email="mixed.case@example.com")
+    assert client.put(f"/api/v1/customers/{created['id']}", json=renamed, headers=auth_headers).status_code == 200
+    response = client.get("/api/v1/customers/email/Mixed.Case@Example.com", headers=auth_headers)
+    assert response.json()["data"]["email"] == "mixed.case@example.com"
+
+def test_update_to_an_email_in_use_conflicts(client, auth_headers):
+    first = client.post("/api/v1/customers", json={
+        "name": {"surname": "One", "family_name": "Taken"}, "email": "taken.one@example.com", "phone_number": "5553000001"
+    }, headers=auth_headers).json()["data"]
+    second = client.post("/api/v1/customers", json={
+        "name": {"surname": "Two", "family_name": "Taken"}, "email": "taken.two@example.com", "phone_number": "5553000002"
+    }, headers=auth_headers).json()["data"]
+    url = f"/api/v1/customers/{second['id']}"
+
+    response = client.patch(url, json={"email": "Taken.One@example.com"}, headers=auth_headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Email already in use"
+    replaced = {"name": second["name"], "email": first["email"], "phone_number": second["phone_number"]}
+    assert client.put(url, json=replaced, headers=auth_headers).status_code == 409
+    assert client.get(url, headers=auth_headers).json()["data"]["email"] == "taken.two@example.com"
+
+def _patch_target(client, auth_headers):
+    response = client.post("/api/v1/customers", json={
+        "name": {"surname": "Pat", "family_name": "Ching"},
+        "email": "pat.ching@example.com",
+        "phone_number": "5554000000",
+    }, headers=auth_headers)
+    return response.json()["data"]
+
+def test_patch_customer_writes_only_given_fields(client, auth_headers):
+    created = _patch_target(client, auth_headers)
+    assert created["version"] == 1
+
+    response = client.patch(f"/api/v1/customers/{created['id']}", json={"phone_number": "5554000001"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"2"'
+    patched = response.json()["data"]
+    assert patched == dict(created, phone_number="5554000001", version=2)
+
+    response = client.patch(
+        f"/api/v1/customers/{created['id']}",
+        json={"name": {"surname": "Pat", "family_name": "Renamed"}},
+        headers=auth_headers,
+    )
+    assert response.json()["data"]["name"]["family_name"] == "Renamed"
+    assert response.json()["data"]["phone_number"] == "5554000001"
+    search = client.get("/api/v1/customers/search?family_name=renamed", headers=auth_headers).json()["data"]
+    assert [c["id"] for c in search] == [created["id"]]
+
+def test_patch_customer_if_match(client, auth_headers):
+    created = _patch_target(client, auth_headers)
+    url = f"/api/v1/customers/{created['id']}"
+
+    first = client.patch(url, json={"phone_number": "5554000002"}, headers={**auth_headers, "If-Match": '"1"'})
+    assert first.status_code == 200
+    # A second writer still holding version 1 must not overwrite the first
+    second = client.patch(url, json={"phone_number": "5554000003"}, headers={**auth_headers, "If-Match": '"1"'})
+    assert second.status_code == 412
+    assert client.get(url, headers=auth_headers).json()["data"]["phone_number"] == "5554000002"
+
+    retried = client.patch(url, json={"phone_number": "5554000003"}, headers={**auth_headers, "If-Match": first.headers["etag"]})
+    assert retried.status_code == 200
+    assert retried.json()["data"]["version"] == 3
+    assert client.patch(url, json={}, headers={**auth_headers, "If-Match": 'W/"3"'}).status_code == 412
+    assert client.patch(url, json={}, headers={**auth_headers, "If-Match": "*"}).status_code == 200
+
+def test_patch_customer_validation(client, auth_headers):
+    created = _patch_target(client, auth_headers)
+    url = f"/api/v1/customers/{created['id']}"
+    assert client.patch(url, json={"email": None}, headers=auth_headers).status_code == 422
+    assert client.patch(url, json={"phone_number": "123"}, headers=auth_headers).status_code == 422
+    assert client.patch("/api/v1/customers/missing", json={"phone_number": "5554000009"}, headers=auth_headers).status_code == 404
+
+def test_conditional_get_customer(client, auth_headers):
+    created = _patch_target(client, auth_headers)
+    url = f"/api/v1/customers/{created['id']}"
+
+    response = client.get(url, headers=auth_headers)
+    etag = response.headers["etag"]
+    assert etag == '"1"'
+
+    for tag in (etag, f"W/{etag}", '"7", ' + etag, "*"):
+        not_modified = client.get(url, headers={**auth_headers, "If-None-Match": tag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+
+    client.patch(url, json={"phone_number": "5554000005"}, headers=auth_headers)
+    changed = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] == '"2"'
+    assert changed.json()["data"]["phone_number"] == "5554000005"
+
+    by_email = client.get("/api/v1/customers/email/pat.ching@example.com", headers={**auth_headers, "If-None-Match": '"2"'})
+    assert by_email.status_code == 304
+    missing = client.get("/api/v1/customers/missing", headers={**auth_headers, "If-None-Match": "*"})
+    assert missing.status_code == 404
+
+def test_conditional_get_customer_list(client, auth_headers):
+    _create_customers(client, auth_headers, 3, prefix="etag")
+    response = client.get("/api/v1/customers?limit=2", headers=auth_headers)
+    etag = response.headers["etag"]
+    assert client.get("/api/v1/customers?limit=2", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+    # A different page has a different tag
+    assert client.get("/api/v1/customers?limit=3", headers={**auth_headers, "If-None-Match": etag}).status_code == 200
+
+    first_id = response.json()["data"][0]["id"]
+    client.patch(f"/api/v1/customers/{first_id}", json={"phone_number": "5559000000"}, headers=auth_headers)
+    changed = client.get("/api/v1/customers?limit=2", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+def test_batch_get_customers(client, auth_headers):
+    created = _create_customers(client, auth_headers, 3, prefix="batchget")
+    ids = [created[2]["id"], "missing", created[0]["id"], created[2]["id"]]
+    emails = ["BatchGet.1@Example.com", "nobody@example.com"]
+    response = client.post("/api/v1/customers:batchGet", json={"ids": ids, "emails": emails}, headers=auth_headers)
+    assert response.status_code == 200
+    result = response.json()["data"]
+    assert (result["found"], result["not_found"]) == (4, 2)
+    assert [(item["id"], item["email"], item["status"]) for item in result["items"]] == [
+        (ids[0], None, "found"), ("missing", None, "not_found"), (ids[2], None, "found"), (ids[3], None, "found"),
+        (None, emails[0], "found"), (None, emails[1], "not_found"),
+    ]
+    assert [item["data"]["id"] if item["data"] else None for item in result["items"]] == [
+        created[2]["id"], None, created[0]["id"], created[2]["id"], created[1]["id"], None,
+    ]
+
+    empty = client.post("/api/v1/customers:batchGet", json={}, headers=auth_headers).json()["data"]
+    assert empty == {"found": 0, "not_found": 0, "items": []}
+
+def test_batch_get_customers_limit(client, auth_headers, monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "MAX_BATCH_GET_SIZE", 2)
+    response = client.post("/api/v1/customers:batchGet", json={"ids": ["a", "b"], "emails": ["c@example.com"]}, headers=auth_headers)
+    assert response.status_code == 413
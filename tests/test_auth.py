@@ -0,0 +1,71 @@
+import asyncio
+import base64
+import json
+import time
+import pytest
+from fastapi import HTTPException
+from jose import JWTError, jwt
+from app.core import auth
+from app.core.auth import create_access_token, verify_token, SECRET_KEY, ALGORITHM
+
+
+@pytest.fixture(autouse=True)
+def clear_token_caches():
+    auth._verified_tokens.clear()
+    yield
+    auth._verified_tokens.clear()
+
+
+def _verify(token):
+    return asyncio.run(verify_token(token))
+
+
+@pytest.mark.parametrize("decode", [auth._decode_jose, auth._decode_hmac])
+def test_decoders_accept_valid_token(decode):
+    payload = decode(create_access_token(data={"sub": "testuser"}))
+    assert payload["sub"] == "testuser"
+
+
+@pytest.mark.parametrize("decode", [auth._decode_jose, auth._decode_hmac])
+def test_decoders_reject_bad_tokens(decode):
+    token = create_access_token(data={"sub": "testuser"})
+    header, payload, signature = token.split(".")
+    forged_payload = base64.urlsafe_b64encode(json.dumps({"sub": "admin", "exp": time.time() + 60}).encode()).decode().rstrip("=")
+    none_header = base64.urlsafe_b64encode(b'{"alg":"none","typ":"JWT"}').decode().rstrip("=")
+    expired = jwt.encode({"sub": "testuser", "exp": int(time.time()) - 10}, SECRET_KEY, algorithm=ALGORITHM)
+    not_yet_valid = jwt.encode({"sub": "testuser", "nbf": int(time.time()) + 60}, SECRET_KEY, algorithm=ALGORITHM)
+    numeric_subject = jwt.encode({"sub": 42, "exp": int(time.time()) + 60}, SECRET_KEY, algorithm=ALGORITHM)
+    for bad in (
+        f"{header}.{forged_payload}.{signature}", f"{none_header}.{payload}.", expired, not_yet_valid, numeric_subject,
+        "garbage", "a.b.c",
+    ):
+        with pytest.raises(JWTError):
+            decode(bad)
+
+
+def test_verified_token_is_cached():
+    token = create_access_token(data={"sub": "testuser"})
+    assert _verify(token) == "testuser"
+    assert len(auth._verified_tokens) == 1
+    assert _verify(token) == "testuser"
+
+
+def test_cached_token_rejected_once_expired(monkeypatch):
+    now = time.time()
+    token = jwt.encode({"sub": "testuser", "exp": int(now) + 5}, SECRET_KEY, algorithm=ALGORITHM)
+    monkeypatch.setattr(auth, "_decode", auth._decode_hmac)
+    assert _verify(token) == "testuser"
+    assert len(auth._verified_tokens) == 1
+
+    monkeypatch.setattr(auth.time, "time", lambda: now + 10)
+    with pytest.raises(HTTPException) as exc_info:
+        _verify(token)
+    assert exc_info.value.status_code == 401
+    assert not auth._verified_tokens
+
+
+def test_token_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth.settings, "AUTH_CACHE_MAX_ENTRIES", 2)
+    for user in ("a", "b", "c"):
+        _verify(create_access_token(data={"sub": user}))
+    assert [username for username, _ in auth._verified_tokens.values()] == ["b", "c"]
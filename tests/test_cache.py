@@ -0,0 +1,164 @@
+import asyncio
+import pytest
+from app.repositories.cached_customer_repository import CachedCustomerRepository
+from app.repositories.customer_repository import AsyncCustomerRepository
+from app.utils.cache import LRUCache, RedisCache
+from tests.conftest import FakeClock, FakeRedisServer, TestingAsyncSessionLocal, make_customer
+
+
+def test_lru_cache_ttl_and_eviction():
+    async def scenario():
+        clock = FakeClock()
+        cache = LRUCache(max_entries=2, ttl_seconds=10, clock=clock)
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        assert await cache.get("a") == "1"  # "b" is now least recently used
+        await cache.set("c", "3")
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "1"
+        clock.now = 11
+        assert await cache.get("a") is None
+        assert len(cache) == 1
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache_against_fake_server():
+    async def scenario():
+        server = FakeRedisServer()
+        port = await server.start()
+        cache = RedisCache(f"redis://127.0.0.1:{port}/1", ttl_seconds=30)
+        try:
+            assert await cache.get("missing") is None
+            await cache.set("customer:id:1", '{"id": "1"}')
+            assert await cache.get("customer:id:1") == '{"id": "1"}'
+            await cache.delete("customer:id:1")
+            assert await cache.get("customer:id:1") is None
+        finally:
+            await cache.close()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache_runs_concurrent_calls_on_pooled_connections():
+    async def scenario():
+        server = FakeRedisServer(delay=0.05)
+        port = await server.start()
+        cache = RedisCache(f"redis://127.0.0.1:{port}/0", ttl_seconds=30, max_connections=2)
+        try:
+            await cache.set("customer:id:1", "value")
+            started = asyncio.get_running_loop().time()
+            assert await asyncio.gather(*[cache.get("customer:id:1") for _ in range(4)]) == ["value"] * 4
+            # Two round trips on each of two connections, not four in a row on one
+            assert asyncio.get_running_loop().time() - started < 0.19
+            assert server.connections == 2
+        finally:
+            await cache.close()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache_unavailable_is_a_miss():
+    async def scenario():
+        server = FakeRedisServer()
+        port = await server.start()
+        await server.stop()
+        cache = RedisCache(f"redis://127.0.0.1:{port}/0", ttl_seconds=30)
+        assert await cache.get("customer:id:1") is None
+        await cache.set("customer:id:1", "value")
+
+    asyncio.run(scenario())
+
+
+def test_cached_repository_invalidates_on_write(db, open_cache):
+    async def scenario():
+        async with open_cache() as cache, TestingAsyncSessionLocal() as session:
+            repo = CachedCustomerRepository(AsyncCustomerRepository(session), cache)
+            created = await repo.create(make_customer("old.doe@example.com"))
+
+            assert (await repo.get_by_email("old.doe@example.com")).id == created.id
+            assert await cache.get(f"customer:id:{created.id}") is not None
+
+            # The email key can outlive an evicted id key; the write still finds and drops it
+            await cache.delete(f"customer:id:{created.id}")
+            await repo.update(created.id, make_customer("new.doe@example.com"))
+            assert await cache.get("customer:email:old.doe@example.com") is None
+            assert await repo.get_by_email("old.doe@example.com") is None
+            assert (await repo.get_by_id(created.id)).email == "new.doe@example.com"
+
+            await repo.delete(created.id)
+            assert await repo.get_by_id(created.id) is None
+            assert await repo.get_by_email("new.doe@example.com") is None
+
+    asyncio.run(scenario())
+
+
+def test_read_racing_a_write_does_not_cache_the_old_row(db, open_cache):
+    class SlowReadRepository(AsyncCustomerRepository):
+        # Holds on to the row it read until the write has finished
+        async def get_by_id(self, customer_id):
+            customer = await super().get_by_id(customer_id)
+            read.set()
+            await write_done.wait()
+            return customer
+
+    read, write_done = asyncio.Event(), asyncio.Event()
+
+    async def scenario():
+        async with open_cache() as cache, TestingAsyncSessionLocal() as reader, TestingAsyncSessionLocal() as writer:
+            writes = CachedCustomerRepository(AsyncCustomerRepository(writer), cache)
+            created = await writes.create(make_customer("racing.read@example.com"))
+            slow = asyncio.create_task(CachedCustomerRepository(SlowReadRepository(reader), cache).get_by_id(created.id))
+            await read.wait()
+            await writes.patch(created.id, {"phone_number": "2222222222"})
+            write_done.set()
+            assert (await slow).phone_number == "1234567890"
+
+            assert await cache.get(f"customer:id:{created.id}") is None
+            assert (await writes.get_by_id(created.id)).phone_number == "2222222222"
+            assert await cache.get(f"customer:id:{created.id}") is not None
+
+    asyncio.run(scenario())
+
+
+def test_cached_repository_batch_lookups(db, open_cache):
+    async def scenario():
+        async with open_cache() as cache, TestingAsyncSessionLocal() as session:
+            repo = CachedCustomerRepository(AsyncCustomerRepository(session), cache)
+            first = await repo.create(make_customer("batch.one@example.com"))
+            second = await repo.create(make_customer("batch.two@example.com"))
+            await repo.get_by_id(first.id)
+
+            loaded = []
+            load = repo.repo.get_by_ids
+            async def counting_load(ids, chunk_size):
+                loaded.append(list(ids))
+                return await load(ids, chunk_size=chunk_size)
+            repo.repo.get_by_ids = counting_load
+
+            ids = [second.id, "missing", first.id, second.id]
+            found = await repo.get_by_ids(ids)
+            assert [c.id if c else None for c in found] == [second.id, None, first.id, second.id]
+            # Only the cache misses reach the database, once each
+            assert loaded == [[second.id, "missing"]]
+            assert (await repo.get_by_ids(ids))[0].id == second.id
+            assert loaded[1:] == [["missing"]]
+            # Batch loads fill the email keys too
+            assert await cache.get("customer:email:batch.two@example.com") is not None
+            assert [c.id if c else None for c in await repo.get_by_emails(["Batch.Two@example.com", "no@example.com"])] == [second.id, None]
+
+    asyncio.run(scenario())
+
+
+def test_cache_metrics_exposed(client, auth_headers):
+    response = client.post("/api/v1/customers", json=make_customer().model_dump(), headers=auth_headers)
+    customer_id = response.json()["data"]["id"]
+    client.get(f"/api/v1/customers/{customer_id}", headers=auth_headers)
+    client.get(f"/api/v1/customers/{customer_id}", headers=auth_headers)
+
+    metrics = client.get("/metrics").text
+    assert 'customer_cache_hits_total{cache="memory"}' in metrics
+    assert 'customer_cache_misses_total{cache="memory"}' in metrics
+    assert "customer_cache_evictions_total" in metrics
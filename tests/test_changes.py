@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+import httpx
+from app.main import app
+from app.api.customers import _change_events
+from app.repositories.customer_repository import AsyncCustomerRepository
+from tests.conftest import TestingAsyncSessionLocal
+
+
+def _customer(i):
+    return {"name": {"surname": f"Feed{i}", "family_name": "Changes"}, "email": f"feed.{i}@example.com", "phone_number": f"555600{i:04d}"}
+
+
+def test_change_feed(client, auth_headers):
+    first = client.post("/api/v1/customers", json=_customer(1), headers=auth_headers).json()["data"]
+    second = client.post("/api/v1/customers", json=_customer(2), headers=auth_headers).json()["data"]
+    client.patch(f"/api/v1/customers/{first['id']}", json={"phone_number": "5556009999"}, headers=auth_headers)
+    client.delete(f"/api/v1/customers/{second['id']}", headers=auth_headers)
+    client.delete(f"/api/v1/customers/{second['id']}", headers=auth_headers)  # 404, not logged
+
+    page = client.get("/api/v1/customers/changes?since=0&limit=3", headers=auth_headers).json()["data"]
+    assert [(c["customer_id"], c["operation"], c["version"]) for c in page["changes"]] == [
+        (first["id"], "create", 1), (second["id"], "create", 1), (first["id"], "update", 2),
+    ]
+    # Entries carry the customer as it is now
+    assert page["changes"][0]["data"]["phone_number"] == "5556009999"
+    assert page["changes"][1]["data"] is None
+
+    rest = client.get(f"/api/v1/customers/changes?since={page['next_since']}", headers=auth_headers).json()["data"]
+    assert [(c["customer_id"], c["operation"], c["version"], c["data"]) for c in rest["changes"]] == [
+        (second["id"], "delete", None, None),
+    ]
+    empty = client.get(f"/api/v1/customers/changes?since={rest['next_since']}", headers=auth_headers).json()["data"]
+    assert empty == {"changes": [], "next_since": rest["next_since"]}
+
+
+def test_change_feed_batch_writes(client, auth_headers):
+    client.post("/api/v1/customers:batch", json=[_customer(i) for i in range(3)], headers=auth_headers)
+    client.post("/api/v1/customers:batch?upsert=true", json=[_customer(0)], headers=auth_headers)
+    changes = client.get("/api/v1/customers/changes", headers=auth_headers).json()["data"]["changes"]
+    assert [(c["operation"], c["version"]) for c in changes] == [("create", 1)] * 3 + [("update", 2)]
+    assert [c["seq"] for c in changes] == sorted(c["seq"] for c in changes)
+
+
+def test_change_feed_long_poll_wakes_on_write(client, auth_headers):
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as async_client:
+            poll = asyncio.create_task(async_client.get("/api/v1/customers/changes?since=0&wait=10", headers=auth_headers))
+            await asyncio.sleep(0.2)
+            assert not poll.done()
+            started = time.monotonic()
+            await async_client.post("/api/v1/customers", json=_customer(7), headers=auth_headers)
+            response = await poll
+            return response, time.monotonic() - started
+
+    response, waited = asyncio.run(scenario())
+    assert [c["operation"] for c in response.json()["data"]["changes"]] == ["create"]
+    assert waited < 2
+
+
+def test_change_events_stream(client, auth_headers):
+    for i in range(2):
+        client.post("/api/v1/customers", json=_customer(i), headers=auth_headers)
+
+    class ConnectedRequest:
+        async def is_disconnected(self):
+            return False
+
+    async def first_chunk():
+        async with TestingAsyncSessionLocal() as session:
+            events = _change_events(ConnectedRequest(), AsyncCustomerRepository(session), 1, 100)
+            try:
+                return (await events.__anext__()).decode()
+            finally:
+                await events.aclose()
+
+    chunk = asyncio.run(first_chunk())
+    event = chunk.strip().split("\n")
+    assert event[:2] == ["id: 2", "event: create"]
+    assert json.loads(event[2].removeprefix("data: "))["data"]["email"] == "feed.1@example.com"
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from sqlalchemy import inspect, text
+from app.database import create_db_engine, create_async_db_engine, async_database_url
+from app.migrations import run_migrations
+from app.utils.telemetry import DB_POOL_CHECKOUT_SECONDS, DB_POOL_CONNECTIONS_IN_USE
+
+
+def _sample(metric, suffix, pool):
+    for collected in metric.collect():
+        for sample in collected.samples:
+            if sample.name.endswith(suffix) and sample.labels.get("pool") == pool:
+                return sample.value
+    return 0
+
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///./customer_service.db") == "sqlite+aiosqlite:///./customer_service.db"
+    assert async_database_url("postgresql://u:p@db/customers") == "postgresql+asyncpg://u:p@db/customers"
+    assert async_database_url("postgres://u:p@db/customers") == "postgresql+asyncpg://u:p@db/customers"
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pragmas.db'}", pool_name="test_pragmas")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+
+def test_async_sqlite_pragmas_applied(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'pragmas.db'}", pool_name="test_async_pragmas")
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_pool_metrics(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'metrics.db'}", pool_name="test_metrics")
+    checkouts_before = _sample(DB_POOL_CHECKOUT_SECONDS, "_count", "test_metrics")
+
+    with engine.connect():
+        assert _sample(DB_POOL_CONNECTIONS_IN_USE, "", "test_metrics") == 1
+    assert _sample(DB_POOL_CONNECTIONS_IN_USE, "", "test_metrics") == 0
+    assert _sample(DB_POOL_CHECKOUT_SECONDS, "_count", "test_metrics") == checkouts_before + 1
+    engine.dispose()
+
+
+def test_migrations_add_and_backfill_columns(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    db_engine = create_db_engine(url, pool_name="legacy")
+    with db_engine.begin() as conn:
+        # The customers table as it was before the search columns existed
+        conn.execute(text("CREATE TABLE customers (id VARCHAR PRIMARY KEY, name JSON NOT NULL, email VARCHAR UNIQUE NOT NULL, phone_number VARCHAR NOT NULL)"))
+        for i in range(5):
+            conn.execute(
+                text("INSERT INTO customers VALUES (:id, :name, :email, '5550000000')"),
+                {"id": f"id{i}", "name": json.dumps({"surname": f"Ann{i}", "family_name": " Smith "}), "email": f"User{i}@Example.com"},
+            )
+
+    run_migrations(db_engine, batch_size=2)
+    run_migrations(db_engine, batch_size=2)
+
+    with db_engine.connect() as conn:
+        rows = conn.execute(text("SELECT family_name_key, surname_key, email_normalized, version FROM customers ORDER BY id")).all()
+        indexes = {index["name"] for index in inspect(conn).get_indexes("customers")}
+    assert rows == [("smith", f"ann{i}", f"user{i}@example.com", 1) for i in range(5)]
+    assert {"ix_customers_family_name_surname", "ix_customers_email_normalized"} <= indexes
+    db_engine.dispose()
+
+
+def test_migrations_skip_unique_email_index_on_case_duplicates(tmp_path):
+    db_engine = create_db_engine(f"sqlite:///{tmp_path / 'dupes.db'}", pool_name="dupes")
+    with db_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE customers (id VARCHAR PRIMARY KEY, name JSON NOT NULL, email VARCHAR UNIQUE NOT NULL, phone_number VARCHAR NOT NULL)"))
+        for i, email in enumerate(["dup@example.com", "DUP@example.com"]):
+            conn.execute(
+                text("INSERT INTO customers VALUES (:id, :name, :email, '5550000000')"),
+                {"id": f"id{i}", "name": json.dumps({"surname": "A", "family_name": "B"}), "email": email},
+            )
+
+    run_migrations(db_engine)
+
+    with db_engine.connect() as conn:
+        indexes = {index["name"] for index in inspect(conn).get_indexes("customers")}
+    assert "ix_customers_email_normalized" not in indexes
+    assert "ix_customers_family_name_surname" in indexes
+    db_engine.dispose()
@@ -0,0 +1,72 @@
+import asyncio
+import csv
+import io
+import json
+import tracemalloc
+from sqlalchemy import delete
+from app.models.database import CustomerModel
+from app.models.pydantic_models import CustomerCreate
+from app.repositories.customer_repository import AsyncCustomerRepository
+from app.utils.export import serialize_ndjson
+from tests.conftest import TestingAsyncSessionLocal
+
+
+def _seed(customer_repository, count):
+    customer_repository.db.execute(delete(CustomerModel))
+    customer_repository.db.commit()
+    customer_repository.bulk_create([
+        CustomerCreate(name={"surname": f"Export{i}", "family_name": "Smith"}, email=f"export.{i}@example.com", phone_number=f"{i:010d}")
+        for i in range(count)
+    ], chunk_size=1000)
+
+
+def test_export_ndjson(client, auth_headers, customer_repository):
+    _seed(customer_repository, 25)
+    response = client.get("/api/v1/customers/export?format=ndjson", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 25
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert rows[0]["name"]["family_name"] == "Smith"
+
+
+def test_export_csv(client, auth_headers, customer_repository):
+    _seed(customer_repository, 3)
+    response = client.get("/api/v1/customers/export?format=csv", headers=auth_headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 3
+    assert {row["email"] for row in rows} == {f"export.{i}@example.com" for i in range(3)}
+    assert rows[0]["family_name"] == "Smith"
+
+
+def test_export_rejects_unknown_format(client, auth_headers):
+    response = client.get("/api/v1/customers/export?format=xml", headers=auth_headers)
+    assert response.status_code == 422
+
+
+def test_export_memory_bounded_by_chunk_size(customer_repository):
+    async def export(chunk_size):
+        exported = 0
+        async with TestingAsyncSessionLocal() as session:
+            async for chunk in serialize_ndjson(AsyncCustomerRepository(session).stream_all(chunk_size)):
+                exported += len(chunk)
+        return exported
+
+    def measure(count):
+        _seed(customer_repository, count)
+        asyncio.run(export(100))  # warm up statement caches before measuring
+        tracemalloc.start()
+        try:
+            exported = asyncio.run(export(100))
+            return exported, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small_bytes, small_peak = measure(1000)
+    large_bytes, large_peak = measure(10000)
+    assert large_bytes > 9 * small_bytes
+    # Ten times the rows must not mean noticeably more memory
+    assert large_peak < small_peak * 1.5
+    assert large_peak < large_bytes / 4
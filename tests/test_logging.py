@@ -0,0 +1,84 @@
+import logging
+import queue
+from logging.handlers import QueueListener
+from app.core.logging import DeferredQueueHandler, PrivacyAwareLogger, PrivacyMessage, mask_sensitive_data
+
+
+class CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _logger(name, level, handler):
+    std_logger = logging.getLogger(name)
+    std_logger.handlers = [handler]
+    std_logger.propagate = False
+    std_logger.setLevel(level)
+    return PrivacyAwareLogger(std_logger)
+
+
+def test_mask_sensitive_data():
+    masked = mask_sensitive_data({"email": "jane@example.com", "contact": ["call 1234567890"], "id": 7})
+    assert masked == {"email": "****@****", "contact": ["call **********"], "id": 7}
+
+
+def test_message_rendered_once_and_masked():
+    message = PrivacyMessage("Fetching customer", "MEDIUM", {"email": "jane@example.com"})
+    assert str(message) == "Fetching customer [Privacy: MEDIUM] {'email': '****@****'}"
+    message.kwargs["email"] = "changed@example.com"
+    assert str(message) == "Fetching customer [Privacy: MEDIUM] {'email': '****@****'}"
+
+
+def test_disabled_level_skips_masking(monkeypatch):
+    calls = []
+    monkeypatch.setattr("app.core.logging.mask_sensitive_data", lambda data: calls.append(data) or data)
+    handler = CaptureHandler()
+    privacy_logger = _logger("test.disabled", logging.WARNING, handler)
+    privacy_logger.info("Fetching customer", privacy_level="MEDIUM", email="jane@example.com")
+    assert handler.messages == []
+    assert calls == []
+
+
+def test_queue_handler_defers_rendering_to_listener():
+    log_queue = queue.SimpleQueue()
+    handler = CaptureHandler()
+    listener = QueueListener(log_queue, handler)
+    privacy_logger = _logger("test.queue", logging.INFO, DeferredQueueHandler(log_queue))
+    listener.start()
+    try:
+        privacy_logger.warning("Customer not found", privacy_level="MEDIUM", email="jane@example.com")
+    finally:
+        listener.stop()
+    assert handler.messages == ["Customer not found [Privacy: MEDIUM] {'email': '****@****'}"]
+
+
+def test_json_formatter_emits_structured_masked_fields():
+    import json
+    from opentelemetry.sdk.trace import TracerProvider
+    from app.core.logging import JsonFormatter, TraceContextFilter
+
+    handler = CaptureHandler()
+    handler.addFilter(TraceContextFilter())
+    handler.setFormatter(JsonFormatter())
+    handler.emit = lambda record: handler.messages.append(handler.format(record))
+    privacy_logger = _logger("test.json", logging.INFO, handler)
+
+    tracer = TracerProvider().get_tracer(__name__)
+    with tracer.start_as_current_span("get_customer") as span:
+        privacy_logger.info("Fetching customer by email", privacy_level="MEDIUM", email="jane@example.com", attempt=2)
+    privacy_logger.info("Health check endpoint accessed")
+
+    entry = json.loads(handler.messages[0])
+    assert entry["message"] == "Fetching customer by email"
+    assert entry["level"] == "INFO"
+    assert entry["privacy_level"] == "MEDIUM"
+    assert entry["fields"] == {"email": "****@****", "attempt": 2}
+    assert entry["trace_id"] == format(span.get_span_context().trace_id, "032x")
+    assert entry["span_id"] == format(span.get_span_context().span_id, "016x")
+
+    entry = json.loads(handler.messages[1])
+    assert "fields" not in entry and "trace_id" not in entry
@@ -0,0 +1,44 @@
+import logging
+import pytest
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from app.core.config import Settings
+from app.main import create_app
+
+
+def test_import_has_no_side_effects():
+    script = (
+        "import logging, sys\n"
+        "import app.main, app.api.main\n"
+        "print(len(logging.getLogger().handlers), 'grpc' in sys.modules)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True,
+        env={"OTEL_TRACES_ENABLED": "false", "PATH": ""},
+    )
+    assert result.stdout.split() == ["0", "False"]
+
+
+def test_create_app_initializes_in_lifespan(monkeypatch):
+    calls = []
+    monkeypatch.setattr("app.main.init_db", lambda: calls.append("init_db"))
+    app = create_app(Settings(OTEL_TRACES_ENABLED=False, PROJECT_VERSION="9.9.9"))
+    assert calls == []
+
+    handlers_before = len(logging.getLogger().handlers)
+    with TestClient(app) as client:
+        assert calls == ["init_db"]
+        assert client.get("/").json()["version"] == "9.9.9"
+        assert client.get("/health").status_code == 200
+    assert len(logging.getLogger().handlers) == handlers_before
+
+    # A second app in the same process must not stack another set of handlers
+    with TestClient(create_app(Settings(OTEL_TRACES_ENABLED=False))):
+        with TestClient(create_app(Settings(OTEL_TRACES_ENABLED=False))):
+            assert len(logging.getLogger().handlers) == handlers_before + 1
+
+
+def test_create_app_rejects_settings_it_cannot_apply():
+    with pytest.raises(ValueError, match="DATABASE_URL, SECRET_KEY"):
+        create_app(Settings(DATABASE_URL="sqlite:///./other.db", SECRET_KEY="other", LOG_LEVEL="DEBUG"))
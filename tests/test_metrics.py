@@ -0,0 +1,38 @@
+from prometheus_client import REGISTRY
+from app.core.config import settings
+from app.utils.telemetry import RepositoryTimer, repository_timer
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _customer(email="stage.metrics@example.com"):
+    return {"name": {"surname": "Stage", "family_name": "Metrics"}, "email": email, "phone_number": "5557001234"}
+
+
+def test_stage_metrics_use_route_templates(client, auth_headers):
+    before = _sample("customer_repository_stage_seconds_count", method="get_by_email", stage="convert")
+    client.post("/api/v1/customers", json=_customer(), headers=auth_headers)
+    client.get("/api/v1/customers/email/stage.metrics@example.com", headers=auth_headers)
+
+    assert _sample("customer_repository_stage_seconds_count", method="get_by_email", stage="db") >= 1
+    assert _sample("customer_repository_stage_seconds_count", method="get_by_email", stage="convert") == before + 1
+    assert _sample("customer_response_encode_seconds_count", method="GET", route="/customers/email/{email}") >= 1
+    metrics = client.get("/metrics").text
+    assert 'handler="/api/v1/customers/email/{email}"' in metrics
+    assert "stage.metrics@example.com" not in metrics
+
+
+def test_calls_without_conversion_are_database_time(customer_repository):
+    db_before = _sample("customer_repository_stage_seconds_count", method="get_version", stage="db")
+    convert_before = _sample("customer_repository_stage_seconds_count", method="get_version", stage="convert")
+    customer_repository.get_version("missing")
+    assert _sample("customer_repository_stage_seconds_count", method="get_version", stage="db") == db_before + 1
+    assert _sample("customer_repository_stage_seconds_count", method="get_version", stage="convert") == convert_before
+
+
+def test_stage_timing_can_be_disabled(monkeypatch):
+    assert isinstance(repository_timer("get_by_id"), RepositoryTimer)
+    monkeypatch.setattr(settings, "METRICS_STAGE_TIMING", False)
+    assert not isinstance(repository_timer("get_by_id"), RepositoryTimer)
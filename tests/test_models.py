@@ -64,4 +64,14 @@ def test_customer_model():
     customer = Customer(**customer_data)
     assert customer.id == customer_data["id"]
     assert customer.email == customer_data["email"]
-    assert customer.name.surname == customer_data["name"]["surname"]
\ No newline at end of file
+    assert customer.name.surname == customer_data["name"]["surname"]
+
+def test_customer_construct_trusted_matches_validated():
+    customer_data = {
+        "id": "12345",
+        "name": {"surname": "Doe", "family_name": "Smith"},
+        "email": "john.doe@example.com",
+        "phone_number": "1234567890"
+    }
+    trusted = Customer.construct_trusted(**customer_data)
+    assert trusted.model_dump_json() == Customer(**customer_data).model_dump_json()
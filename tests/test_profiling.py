@@ -0,0 +1,84 @@
+import threading
+import time
+from app.core.config import settings
+from app.utils.profiling import StackSampler
+
+
+def _busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampler_collapsed_and_speedscope():
+    sampler = StackSampler(0.001, thread_id=threading.get_ident())
+    sampler.start()
+    _busy_wait(0.1)
+    sampler.stop()
+
+    lines = sampler.collapsed().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("MainThread;") and "_busy_wait (tests/test_profiling.py:" in line for line in lines)
+
+    profile = sampler.speedscope("test")
+    frames = profile["shared"]["frames"]
+    [thread] = profile["profiles"]
+    assert thread["type"] == "sampled" and thread["name"] == "MainThread"
+    assert len(thread["samples"]) == len(thread["weights"]) == len(lines)
+    assert all(0 <= i < len(frames) for sample in thread["samples"] for i in sample)
+
+
+def test_profile_endpoint_requires_admin(client, auth_headers, monkeypatch):
+    assert client.get("/admin/profile?seconds=0.05").status_code == 401
+    assert client.get("/admin/profile?seconds=0.05", headers=auth_headers).status_code == 403
+
+    monkeypatch.setattr(settings, "ADMIN_USERS", ["testuser"])
+    response = client.get("/admin/profile?seconds=0.1&interval_ms=1", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Every thread of the process, the test's own included
+    assert any(line.startswith("MainThread;") for line in response.text.splitlines())
+
+    response = client.get("/admin/profile?seconds=0.1&format=speedscope", headers=auth_headers)
+    assert response.json()["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    assert client.get(f"/admin/profile?seconds={settings.PROFILE_MAX_SECONDS + 1}", headers=auth_headers).status_code == 422
+
+
+def test_request_profile_header(client, auth_headers, monkeypatch):
+    # Ignored for non-admins
+    response = client.get("/api/v1/customers", headers={**auth_headers, "X-Profile": "1"})
+    assert response.status_code == 200 and "x-profile-id" not in response.headers
+
+    monkeypatch.setattr(settings, "ADMIN_USERS", ["testuser"])
+    response = client.get("/api/v1/customers", headers={**auth_headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+
+    profile = client.get(f"/admin/profiles/{profile_id}", headers=auth_headers)
+    assert profile.json()["name"] == "GET /api/v1/customers"
+    collapsed = client.get(f"/admin/profiles/{profile_id}?format=collapsed", headers=auth_headers)
+    assert collapsed.status_code == 200
+    assert client.get("/admin/profiles/missing", headers=auth_headers).status_code == 404
+
+
+def test_request_profile_is_stored_before_the_response_starts(auth_headers, monkeypatch):
+    import asyncio
+    from app.utils.profiling import RequestProfileMiddleware, recent_profiles
+    monkeypatch.setattr(settings, "ADMIN_USERS", ["testuser"])
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await asyncio.sleep(0.05)  # e.g. dependency cleanup after the body
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    seen = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            profile_id = dict(message["headers"])[b"x-profile-id"].decode()
+            seen.append(recent_profiles.get(profile_id))
+
+    headers = [(b"x-profile", b"1"), (b"authorization", auth_headers["Authorization"].encode())]
+    scope = {"type": "http", "method": "GET", "path": "/slow", "headers": headers}
+    asyncio.run(RequestProfileMiddleware(endpoint)(scope, None, send))
+    assert seen[0] is not None and seen[0][0] == "GET /slow"
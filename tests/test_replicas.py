@@ -0,0 +1,205 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app import database
+from app.database import Base, Replica, ReplicaPool
+from app.models.database import CustomerModel
+from app.repositories.cached_customer_repository import CachedCustomerRepository
+from app.repositories.customer_repository import AsyncCustomerRepository, CustomerRepository
+from app.utils.cache import LRUCache
+from tests.conftest import FakeClock, TestingAsyncSessionLocal, make_customer
+
+
+@pytest.fixture
+def replica_url(tmp_path):
+    # A second SQLite file with the schema but none of the primary's rows
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_engine = create_engine(url)
+    Base.metadata.create_all(bind=replica_engine)
+    yield url
+    replica_engine.dispose()
+
+
+def _pool(*urls, clock=None):
+    return ReplicaPool([Replica(url, f"test_replica{i}") for i, url in enumerate(urls)], eject_seconds=30, clock=clock or FakeClock())
+
+
+def test_replica_pool_round_robin_and_ejection(tmp_path):
+    clock = FakeClock()
+    pool = _pool(f"sqlite:///{tmp_path / 'a.db'}", f"sqlite:///{tmp_path / 'b.db'}", clock=clock)
+    first, second = pool.replicas
+    assert [pool.choose() for _ in range(4)] == [first, second, first, second]
+    pool.eject(first)
+    assert [pool.choose() for _ in range(3)] == [second] * 3
+    pool.eject(second)
+    assert pool.choose() is None
+    clock.now = 31
+    assert {pool.choose(), pool.choose()} == {first, second}
+    assert _pool().choose() is None
+
+
+def test_reads_use_replica_until_the_request_writes(db, replica_url):
+    pool = _pool(replica_url)
+    replica = pool.replicas[0]
+    seed_engine = create_engine(replica_url)
+    with Session(seed_engine) as replica_session:
+        on_replica = CustomerRepository(replica_session).create(make_customer("only.on.replica@example.com"))
+    seed_engine.dispose()
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as primary, replica.sessionmaker() as read_db:
+            repo = AsyncCustomerRepository(primary, read_db)
+            assert (await repo.get_by_id(on_replica.id)).email == "only.on.replica@example.com"
+            assert [c.id for c in await repo.get_all()] == [on_replica.id]
+            created = await repo.create(make_customer("on.primary@example.com"))
+            # Read-your-writes: the rest of this request reads the primary
+            assert await repo.get_by_id(on_replica.id) is None
+            assert (await repo.get_by_id(created.id)).id == created.id
+        await replica.engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_failed_replica_read_falls_back_and_ejects(db, tmp_path):
+    # No schema on this replica: every read fails
+    pool = _pool(f"sqlite:///{tmp_path / 'broken.db'}")
+    replica = pool.replicas[0]
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as primary:
+            created = await AsyncCustomerRepository(primary).create(make_customer("fallback@example.com"))
+        async with TestingAsyncSessionLocal() as primary, replica.sessionmaker() as read_db:
+            repo = AsyncCustomerRepository(primary, read_db)
+            assert (await repo.get_by_id(created.id)).id == created.id
+            assert repo.read_db is primary
+        await replica.engine.dispose()
+
+    asyncio.run(scenario())
+    assert pool.choose() is None
+
+
+def test_read_consistency_header(client, auth_headers, replica_url, monkeypatch):
+    pool = _pool(replica_url)
+    monkeypatch.setattr(database, "read_replicas", pool)
+    created = client.post("/api/v1/customers", json=make_customer("lagging@example.com").model_dump(), headers=auth_headers).json()["data"]
+
+    # The replica has not seen the write yet
+    assert client.get(f"/api/v1/customers/{created['id']}", headers=auth_headers).status_code == 404
+    primary = client.get(f"/api/v1/customers/{created['id']}", headers={**auth_headers, "X-Read-Consistency": "primary"})
+    assert primary.status_code == 200
+    asyncio.run(pool.replicas[0].engine.dispose())
+
+
+def test_stale_replica_reads_are_not_cached(client, db, auth_headers, replica_url, monkeypatch):
+    pool = _pool(replica_url)
+    monkeypatch.setattr(database, "read_replicas", pool)
+    created = client.post("/api/v1/customers", json=make_customer("cached.lag@example.com").model_dump(), headers=auth_headers).json()["data"]
+    row = db.get(CustomerModel, created["id"])
+    seed_engine = create_engine(replica_url)
+    with Session(seed_engine) as replica_session:
+        replica_session.add(CustomerModel(**{column.key: getattr(row, column.key) for column in CustomerModel.__table__.columns}))
+        replica_session.commit()
+    seed_engine.dispose()
+
+    url = f"/api/v1/customers/{created['id']}"
+    assert client.patch(url, json={"phone_number": "5550009999"}, headers=auth_headers).status_code == 200
+    # The replica still has the pre-write row; it must not end up in the cache
+    assert client.get(url, headers=auth_headers).json()["data"]["phone_number"] == "1234567890"
+    primary = client.get(url, headers={**auth_headers, "X-Read-Consistency": "primary"})
+    assert primary.json()["data"]["phone_number"] == "5550009999"
+    asyncio.run(pool.replicas[0].engine.dispose())
+
+
+def test_replica_reads_skip_the_cache(db, replica_url):
+    class CountingCache(LRUCache):
+        reads = 0
+
+        async def get(self, key):
+            self.reads += 1
+            return await super().get(key)
+
+        async def get_many(self, keys):
+            self.reads += 1
+            return await super().get_many(keys)
+
+    pool = _pool(replica_url)
+    replica = pool.replicas[0]
+    cache = CountingCache(max_entries=100, ttl_seconds=30)
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as primary:
+            created = await AsyncCustomerRepository(primary).create(make_customer("skip.cache@example.com"))
+        async with TestingAsyncSessionLocal() as primary, replica.sessionmaker() as read_db:
+            repo = CachedCustomerRepository(AsyncCustomerRepository(primary, read_db), cache)
+            assert await repo.get_by_id(created.id) is None
+            assert await repo.get_by_email("skip.cache@example.com") is None
+            assert await repo.get_by_ids([created.id]) == [None]
+            assert cache.reads == 0
+            # After a write the request reads the primary, and the cache with it
+            await repo.patch(created.id, {"phone_number": "5550001111"})
+            assert (await repo.get_by_id(created.id)).phone_number == "5550001111"
+            assert cache.reads == 1
+        await replica.engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_primary_consistency_writes_still_invalidate(client, auth_headers):
+    created = client.post("/api/v1/customers", json=make_customer("header.write@example.com").model_dump(), headers=auth_headers).json()["data"]
+    url = f"/api/v1/customers/{created['id']}"
+    assert client.get(url, headers=auth_headers).json()["data"]["phone_number"] == "1234567890"
+    primary = {**auth_headers, "X-Read-Consistency": "primary"}
+    assert client.patch(url, json={"phone_number": "5550002222"}, headers=primary).status_code == 200
+    assert client.get(url, headers=auth_headers).json()["data"]["phone_number"] == "5550002222"
+
+
+def test_tracing_instruments_every_replica_engine(replica_url, monkeypatch):
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    from app.core.config import Settings
+    from app.utils import telemetry
+    pool = _pool(replica_url, replica_url)
+    monkeypatch.setattr(database, "read_replicas", pool)
+    monkeypatch.setattr(telemetry.trace, "set_tracer_provider", lambda provider: None)
+    instrumented = []
+    monkeypatch.setattr(SQLAlchemyInstrumentor, "instrument", lambda self, engines: instrumented.extend(engines))
+    provider = telemetry.start_tracing(Settings(OTEL_TRACES_ENABLED=True, OTEL_INSTRUMENT_SQLALCHEMY=True))
+    telemetry.stop_tracing(provider)
+
+    replica_engines = [replica.engine.sync_engine for replica in pool.replicas]
+    assert instrumented == [database.engine, database.async_engine.sync_engine, *replica_engines]
+
+
+def test_export_falls_back_to_the_primary_mid_stream(db, replica_url):
+    from sqlalchemy import insert, select
+    from sqlalchemy.exc import OperationalError
+    pool = _pool(replica_url)
+    replica = pool.replicas[0]
+    for i in range(4):
+        CustomerRepository(db).create(make_customer(f"export.{i}@example.com"))
+    # A replica that is up to date with the primary
+    rows = db.execute(select(CustomerModel.__table__)).mappings().all()
+    seed_engine = create_engine(replica_url)
+    with seed_engine.begin() as conn:
+        conn.execute(insert(CustomerModel.__table__), [dict(row) for row in rows])
+    seed_engine.dispose()
+
+    class FailingReplicaRepository(AsyncCustomerRepository):
+        async def _stream(self, session, chunk_size, after=None):
+            async for partition in super()._stream(session, chunk_size, after):
+                yield partition
+                if session is self.read_db and self.read_db is not self.db:
+                    raise OperationalError("SELECT", {}, Exception("replica went away"))
+
+    async def scenario():
+        async with TestingAsyncSessionLocal() as primary, replica.sessionmaker() as read_db:
+            repo = FailingReplicaRepository(primary, read_db)
+            partitions = [[row["email"] for row in partition] async for partition in repo.stream_all(chunk_size=2)]
+            assert repo.read_db is primary
+        await replica.engine.dispose()
+        return partitions
+
+    partitions = asyncio.run(scenario())
+    assert len(partitions[0]) == 2
+    assert sorted(email for partition in partitions for email in partition) == [f"export.{i}@example.com" for i in range(4)]
+    assert pool.choose() is None
@@ -1,5 +1,8 @@
+import asyncio
 import pytest
 from app.models.pydantic_models import CustomerCreate
+from app.repositories.customer_repository import AsyncCustomerRepository
+from tests.conftest import TestingAsyncSessionLocal
 
 
 def test_create_customer(customer_repository):
@@ -104,4 +107,238 @@ def test_get_customer_by_email(customer_repository):
     retrieved_customer = customer_repository.get_by_email(customer_data.email)
     assert retrieved_customer is not None
     assert retrieved_customer.email == customer_data.email
-    assert retrieved_customer.name.middle_name == customer_data.name.middle_name
\ No newline at end of file
+    assert retrieved_customer.name.middle_name == customer_data.name.middle_name
+
+def test_get_all_pagination(customer_repository):
+    for i in range(5):
+        customer_repository.create(CustomerCreate(
+            name={"surname": f"Doe{i}", "family_name": "Smith"},
+            email=f"page.{i}@example.com",
+            phone_number=f"555000{i:04d}"
+        ))
+    all_ids = [c.id for c in customer_repository.get_all()]
+    assert all_ids == sorted(all_ids)
+
+    assert [c.id for c in customer_repository.get_all(skip=1, limit=2)] == all_ids[1:3]
+    assert [c.id for c in customer_repository.get_all(limit=2, after_id=all_ids[2])] == all_ids[3:5]
+
+
+def test_async_repository_round_trip(db):
+    async def scenario():
+        async with TestingAsyncSessionLocal() as session:
+            repo = AsyncCustomerRepository(session)
+            created = await repo.create(CustomerCreate(
+                name={"surname": "Doe", "family_name": "Smith"},
+                email="async.doe@example.com",
+                phone_number="1234567890"
+            ))
+            assert (await repo.get_by_id(created.id)).email == "async.doe@example.com"
+            assert (await repo.get_by_email("async.doe@example.com")).id == created.id
+            assert [c.id for c in await repo.get_all()] == [created.id]
+            assert await repo.delete(created.id) is True
+            assert await repo.get_by_id(created.id) is None
+
+    asyncio.run(scenario())
+
+
+def test_bulk_create_chunks_and_upserts(customer_repository):
+    customers = [
+        CustomerCreate(name={"surname": f"Bulk{i}", "family_name": "Smith"}, email=f"bulk.{i}@example.com", phone_number=f"333000{i:04d}")
+        for i in range(7)
+    ]
+    results = customer_repository.bulk_create(customers, chunk_size=3)
+    assert [status for status, _ in results] == ["created"] * 7
+    assert len(customer_repository.get_all()) == 7
+
+    results = customer_repository.bulk_create(customers[:2], chunk_size=3)
+    assert [status for status, _ in results] == ["conflict", "conflict"]
+
+    results = customer_repository.bulk_create(customers[:2], upsert=True, chunk_size=3)
+    assert [status for status, _ in results] == ["updated", "updated"]
+    assert len(customer_repository.get_all()) == 7
+
+
+def test_bulk_create_repeats_point_at_the_first_occurrence(customer_repository):
+    existing = customer_repository.create(CustomerCreate(
+        name={"surname": "Repeat", "family_name": "Smith"}, email="repeat.0@example.com", phone_number="3331000000",
+    ))
+    customers = [
+        CustomerCreate(name={"surname": f"Repeat{i}", "family_name": "Smith"}, email=email, phone_number=f"333100{i:04d}")
+        for i, email in enumerate(["repeat.0@example.com", "repeat.1@example.com", "x@example.com", "REPEAT.1@example.com", "Repeat.0@example.com"])
+    ]
+    # The repeats land in a later chunk than their first occurrence
+    results = customer_repository.bulk_create(customers, chunk_size=2)
+    assert [status for status, _ in results] == ["conflict", "created", "created", "conflict", "conflict"]
+    assert results[3][1] == results[1][1]
+    assert results[4][1] == results[0][1] == existing.id
+
+
+@pytest.mark.parametrize("returning", [True, False])
+def test_single_statement_writes(customer_repository, monkeypatch, returning):
+    from sqlalchemy import event
+    db_engine = customer_repository.db.get_bind()
+    monkeypatch.setattr(db_engine.dialect, "update_returning", returning)
+    created = customer_repository.create(CustomerCreate(
+        name={"surname": "Write", "family_name": "Path"}, email="write.path@example.com", phone_number="5553000000",
+    ))
+    update_data = CustomerCreate(
+        name={"surname": "Written", "family_name": "Path"}, email="written.path@example.com", phone_number="5553000001",
+    )
+
+    statements, change_log = [], []
+    def record(conn, cursor, statement, *args):
+        (change_log if "customer_changes" in statement else statements).append(statement.split()[0])
+    event.listen(db_engine, "before_cursor_execute", record)
+    try:
+        updated = customer_repository.update(created.id, update_data)
+        missing_update = customer_repository.update("missing", update_data)
+        deleted = customer_repository.delete(created.id)
+        missing_delete = customer_repository.delete(created.id)
+    finally:
+        event.remove(db_engine, "before_cursor_execute", record)
+
+    assert updated.id == created.id
+    assert updated.name.surname == "Written"
+    assert updated.email == "written.path@example.com"
+    assert missing_update is None
+    assert (deleted, missing_delete) == (True, False)
+    expected_updates = ["UPDATE"] * 2 if returning else ["UPDATE", "SELECT", "UPDATE"]
+    assert statements == expected_updates + ["DELETE", "DELETE"]
+    # Only writes that found their row are logged
+    assert change_log == ["INSERT", "INSERT"]
+
+
+def test_writes_report_the_previous_email(customer_repository):
+    created = customer_repository.create(CustomerCreate(
+        name={"surname": "Before", "family_name": "Write"}, email="before.write@example.com", phone_number="5554000000",
+    ))
+    renamed = CustomerCreate(name={"surname": "After", "family_name": "Write"}, email="after.write@example.com", phone_number="5554000001")
+    updated, previous_email = customer_repository.update_with_previous_email(created.id, renamed)
+    assert (updated.email, previous_email) == ("after.write@example.com", "before.write@example.com")
+    patched, previous_email = customer_repository.patch_with_previous_email(created.id, {"email": "patched.write@example.com"})
+    assert (patched.email, previous_email) == ("patched.write@example.com", "after.write@example.com")
+    assert customer_repository.update_with_previous_email("missing", renamed) == (None, None)
+    assert customer_repository.delete_returning_email(created.id) == "patched.write@example.com"
+    assert customer_repository.delete_returning_email(created.id) is None
+
+
+@pytest.mark.parametrize("write", ["update", "patch", "delete"])
+def test_previous_email_is_read_under_the_write_lock(customer_repository, monkeypatch, write):
+    import sqlite3
+    from sqlalchemy import event
+    created = customer_repository.create(CustomerCreate(
+        name={"surname": "Locked", "family_name": "Read"}, email="locked.read@example.com", phone_number="5554100000",
+    ))
+    db_engine = customer_repository.db.get_bind()
+    # Take the fallback delete path, which reads the email first too
+    monkeypatch.setattr(db_engine.dialect, "delete_returning", False)
+    statements, other_writer = [], []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0])
+        if statement.startswith("SELECT customers.email"):
+            # Another connection trying to write between the read and the write
+            other = sqlite3.connect("./test.db", timeout=0)
+            try:
+                other.execute("UPDATE customers SET email = 'other.writer@example.com'")
+                other.commit()
+                other_writer.append("wrote")
+            except sqlite3.OperationalError as exc:
+                other_writer.append(str(exc))
+            finally:
+                other.close()
+    event.listen(db_engine, "before_cursor_execute", record)
+    try:
+        if write == "update":
+            renamed = CustomerCreate(name={"surname": "Locked", "family_name": "Read"}, email="relocked.read@example.com", phone_number="5554100001")
+            previous_email = customer_repository.update_with_previous_email(created.id, renamed)[1]
+        elif write == "patch":
+            previous_email = customer_repository.patch_with_previous_email(created.id, {"email": "relocked.read@example.com"})[1]
+        else:
+            previous_email = customer_repository.delete_returning_email(created.id)
+    finally:
+        event.remove(db_engine, "before_cursor_execute", record)
+
+    assert previous_email == "locked.read@example.com"
+    assert statements[:3] == ["BEGIN", "SELECT", "UPDATE" if write != "delete" else "DELETE"]
+    assert other_writer == ["database is locked"]
+
+
+def test_patch_writes_only_changed_columns(customer_repository):
+    from sqlalchemy import event
+    from app.repositories.customer_repository import StaleVersionError
+    created = customer_repository.create(CustomerCreate(
+        name={"surname": "Partial", "family_name": "Write"}, email="partial.write@example.com", phone_number="5555000000",
+    ))
+    db_engine = customer_repository.db.get_bind()
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db_engine, "before_cursor_execute", record)
+    try:
+        patched = customer_repository.patch(created.id, {"phone_number": "5555000001"}, expected_versions=[1])
+    finally:
+        event.remove(db_engine, "before_cursor_execute", record)
+
+    assert (patched.phone_number, patched.version, patched.name) == ("5555000001", 2, created.name)
+    set_clause = statements[0].split(" SET ")[1].split(" WHERE ")[0]
+    assert set_clause == "phone_number=?, version=(customers.version + ?)"
+    with pytest.raises(StaleVersionError):
+        customer_repository.patch(created.id, {"phone_number": "5555000002"}, expected_versions=[1])
+    assert customer_repository.patch("missing", {"phone_number": "5555000002"}, expected_versions=[1]) is None
+
+
+def test_concurrent_lookups_share_one_query(customer_repository):
+    from sqlalchemy import event
+    from tests.conftest import async_engine
+    from app.utils.telemetry import LOOKUPS_COALESCED
+    created = customer_repository.create(CustomerCreate(
+        name={"surname": "Popular", "family_name": "Record"}, email="popular.record@example.com", phone_number="5557000000",
+    ))
+    coalesced_before = LOOKUPS_COALESCED.labels(lookup="id")._value.get()
+    selects = []
+    def record(conn, cursor, statement, *args):
+        if statement.startswith("SELECT"):
+            selects.append(statement)
+
+    async def lookup():
+        # One session per simulated request
+        async with TestingAsyncSessionLocal() as session:
+            return await AsyncCustomerRepository(session).get_by_id(created.id)
+
+    async def scenario():
+        return await asyncio.gather(*(lookup() for _ in range(10)))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert [customer.id for customer in results] == [created.id] * 10
+    assert len(selects) == 1
+    assert LOOKUPS_COALESCED.labels(lookup="id")._value.get() - coalesced_before == 9
+
+
+def test_get_by_ids_chunks_in_queries(customer_repository):
+    from sqlalchemy import event
+    created = [
+        customer_repository.create(CustomerCreate(
+            name={"surname": f"Many{i}", "family_name": "Lookup"}, email=f"many.{i}@example.com", phone_number="5558000000",
+        ))
+        for i in range(5)
+    ]
+    db_engine = customer_repository.db.get_bind()
+    selects = []
+    def record(conn, cursor, statement, parameters, *args):
+        selects.append(len(parameters))
+    event.listen(db_engine, "before_cursor_execute", record)
+    try:
+        ids = [c.id for c in reversed(created)] + ["missing", created[0].id]
+        found = customer_repository.get_by_ids(ids, chunk_size=2)
+    finally:
+        event.remove(db_engine, "before_cursor_execute", record)
+
+    assert [c.id if c else None for c in found] == ids[:5] + [None, created[0].id]
+    # 6 distinct ids, at most 2 bound per query
+    assert selects == [2, 2, 2]
+    by_email = customer_repository.get_by_emails(["MANY.3@example.com", "none@example.com"])
+    assert [c.id if c else None for c in by_email] == [created[3].id, None]
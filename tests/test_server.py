@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+from app.core.config import Settings
+from app.server import cpu_limit, disable_per_process_cache, prepare_multiprocess_metrics, server_options, worker_count
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def test_cpu_limit_reads_cgroup_v2_quota(tmp_path):
+    _write(tmp_path / "cpu.max", "150000 100000\n")
+    assert cpu_limit(str(tmp_path)) == min(1.5, len(os.sched_getaffinity(0)))
+
+
+def test_cpu_limit_reads_cgroup_v1_quota(tmp_path):
+    _write(tmp_path / "cpu" / "cpu.cfs_quota_us", "100000\n")
+    _write(tmp_path / "cpu" / "cpu.cfs_period_us", "100000\n")
+    assert cpu_limit(str(tmp_path)) == 1.0
+
+
+def test_cpu_limit_without_quota_uses_available_cpus(tmp_path):
+    _write(tmp_path / "cpu.max", "max 100000\n")
+    assert cpu_limit(str(tmp_path)) == len(os.sched_getaffinity(0))
+    assert cpu_limit(str(tmp_path / "missing")) == len(os.sched_getaffinity(0))
+
+
+def test_worker_count():
+    assert worker_count(Settings(), cpus=1.5) == 2
+    assert worker_count(Settings(), cpus=0.25) == 1
+    assert worker_count(Settings(SERVER_WORKERS_PER_CPU=2), cpus=4) == 8
+    assert worker_count(Settings(SERVER_MAX_WORKERS=4), cpus=64) == 4
+    assert worker_count(Settings(SERVER_WORKERS=3), cpus=64) == 3
+
+
+def test_server_options_from_settings():
+    options = server_options(Settings(SERVER_LOOP="asyncio", SERVER_HTTP="h11", SERVER_KEEPALIVE_SECONDS=90), workers=2)
+    assert options["workers"] == 2
+    assert options["loop"] == "asyncio"
+    assert options["http"] == "h11"
+    assert options["timeout_keep_alive"] == 90
+    assert options["timeout_graceful_shutdown"] == 30
+
+
+def test_prepare_multiprocess_metrics_clears_stale_files(tmp_path, monkeypatch):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    (tmp_path / "counter_123.db").write_bytes(b"stale")
+    path = prepare_multiprocess_metrics(Settings(PROMETHEUS_MULTIPROC_DIR=str(tmp_path)))
+    assert path == str(tmp_path)
+    assert os.environ["PROMETHEUS_MULTIPROC_DIR"] == str(tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_several_workers_do_not_use_the_memory_cache(monkeypatch):
+    monkeypatch.delenv("CACHE_BACKEND", raising=False)
+    assert not disable_per_process_cache(Settings(CACHE_BACKEND="redis"))
+    assert "CACHE_BACKEND" not in os.environ
+    assert disable_per_process_cache(Settings(CACHE_BACKEND="memory"))
+    assert os.environ["CACHE_BACKEND"] == "none"
+
+
+def test_metrics_aggregate_across_workers(tmp_path):
+    # Two "workers" write to the same directory; /metrics in either one reports the sum
+    script = (
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "from app.utils.telemetry import CUSTOMER_CREATED, DB_POOL_CONNECTIONS_IN_USE, release_metrics\n"
+        "import sys\n"
+        "CUSTOMER_CREATED.inc()\n"
+        "DB_POOL_CONNECTIONS_IN_USE.labels(pool='test').inc()\n"
+        "if sys.argv[1] == 'report':\n"
+        "    print(TestClient(app).get('/metrics').text)\n"
+        "else:\n"
+        "    release_metrics()\n"
+    )
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), OTEL_TRACES_ENABLED="false")
+    subprocess.run([sys.executable, "-c", script, "write"], env=env, check=True)
+    result = subprocess.run([sys.executable, "-c", script, "report"], env=env, check=True, capture_output=True, text=True)
+    assert "customer_created_total 2.0" in result.stdout
+    # Counters survive a worker exiting; its live gauge is dropped by release_metrics()
+    assert 'db_pool_connections_in_use{pool="test"} 1.0' in result.stdout
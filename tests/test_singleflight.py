@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from app.utils.singleflight import SingleFlight
+from app.utils.telemetry import LOOKUPS_COALESCED
+
+
+def _coalesced(name):
+    return LOOKUPS_COALESCED.labels(lookup=name)._value.get()
+
+
+def test_concurrent_calls_share_one_call():
+    flight = SingleFlight("test_share")
+    calls = []
+
+    async def fetch(tag):
+        calls.append(tag)
+        await asyncio.sleep(0.01)
+        return {"fetched_by": tag}
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", lambda i=i: fetch(i)) for i in range(5)))
+
+    results = asyncio.run(scenario())
+    assert calls == [0]
+    assert all(result is results[0] for result in results)
+    assert _coalesced("test_share") == 4
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight("test_error")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(scenario())] == [RuntimeError] * 3
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    flight = SingleFlight("test_cancel")
+    calls = []
+
+    async def fetch(tag):
+        calls.append(tag)
+        await asyncio.sleep(0.05)
+        return tag
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do("key", lambda: fetch("leader")))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", lambda: fetch("follower")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "follower"
+    assert calls == ["leader", "follower"]
+
+
+def test_forget_starts_a_fresh_call():
+    flight = SingleFlight("test_forget")
+    calls = []
+
+    async def fetch(tag):
+        calls.append(tag)
+        await asyncio.sleep(0.01)
+        return tag
+
+    async def scenario():
+        before = asyncio.create_task(flight.do("key", lambda: fetch("before write")))
+        await asyncio.sleep(0)
+        flight.forget()
+        after = asyncio.create_task(flight.do("key", lambda: fetch("after write")))
+        return await before, await after
+
+    assert asyncio.run(scenario()) == ("before write", "after write")
@@ -0,0 +1,61 @@
+import time
+from contextlib import nullcontext
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Status, StatusCode
+from app.core.config import Settings, settings
+from app.utils.telemetry import build_tracer_provider, route_span
+
+
+def _run_traces(config, *requests):
+    # Each request is a root span with one child; returns the names of exported spans
+    exporter = InMemorySpanExporter()
+    provider = build_tracer_provider(config, exporter)
+    tracer = provider.get_tracer(__name__)
+    for name, error, seconds in requests:
+        with tracer.start_as_current_span(name) as root:
+            with tracer.start_as_current_span(f"{name}.db"):
+                time.sleep(seconds)
+            if error:
+                root.set_status(Status(StatusCode.ERROR))
+    provider.force_flush()
+    exported = [span.name for span in exporter.get_finished_spans()]
+    provider.shutdown()
+    return exported
+
+
+def test_ratio_sampling():
+    assert _run_traces(Settings(OTEL_TRACES_SAMPLER_RATIO=1.0), ("a", False, 0)) == ["a.db", "a"]
+    assert _run_traces(Settings(OTEL_TRACES_SAMPLER_RATIO=0.0), ("a", False, 0), ("b", True, 0)) == []
+
+
+def test_tail_sampling_keeps_errors_and_slow_traces():
+    config = Settings(OTEL_TRACES_SAMPLER_RATIO=0.0, OTEL_TRACES_KEEP_ERRORS=True, OTEL_TRACES_KEEP_SLOW_MS=50)
+    exported = _run_traces(config, ("ok", False, 0), ("failed", True, 0), ("slow", False, 0.06))
+    assert exported == ["failed.db", "failed", "slow.db", "slow"]
+
+
+def test_tail_sampling_still_applies_ratio():
+    config = Settings(OTEL_TRACES_SAMPLER_RATIO=1.0, OTEL_TRACES_KEEP_ERRORS=True)
+    assert _run_traces(config, ("ok", False, 0)) == ["ok.db", "ok"]
+
+
+def test_tail_sampling_keeps_traces_sampled_upstream():
+    from opentelemetry.propagate import extract
+    config = Settings(OTEL_TRACES_SAMPLER_RATIO=0.0, OTEL_TRACES_KEEP_ERRORS=True)
+    exporter = InMemorySpanExporter()
+    provider = build_tracer_provider(config, exporter)
+    tracer = provider.get_tracer(__name__)
+    for flags, name in (("01", "sampled"), ("00", "not_sampled")):
+        context = extract({"traceparent": f"00-4bf92f3577b34da6a3ce929d0e0e47{flags}-00f067aa0ba902b7-{flags}"})
+        with tracer.start_as_current_span(name, context=context):
+            pass
+    with tracer.start_as_current_span("local"):
+        pass
+    provider.force_flush()
+    assert [span.name for span in exporter.get_finished_spans()] == ["sampled"]
+    provider.shutdown()
+
+
+def test_manual_route_spans_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "OTEL_MANUAL_SPANS", False)
+    assert isinstance(route_span("get_customer"), nullcontext)